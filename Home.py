@@ -1,5 +1,6 @@
 import streamlit as st
-from PIL import Image
+
+from utils.assets import LOGO_WIDTH, logo
 
 st.set_page_config(
     page_title="Home",
@@ -7,8 +8,7 @@ st.set_page_config(
 )
 
 #image_path = r'C:\Users\Ricardo\Documents\data_science\repos\ftc\logo.png'
-image = Image.open( 'logo.png' )
-st.sidebar.image(image, width=120)
+st.sidebar.image( logo(), width=LOGO_WIDTH )
 
 st.sidebar.markdown('# Cury Company')
 st.sidebar.markdown('## Fastest Delivery in Town')
@@ -0,0 +1,153 @@
+# Libraries
+import argparse
+import os
+
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# Gerador de pedidos sintéticos no formato do dataset/train.csv
+# ==========================================
+
+SCALES = { '45k': 45_000, '1M': 1_000_000, '10M': 10_000_000, '50M': 50_000_000 }
+
+# Linhas geradas (e gravadas) por vez: limita a memória do gerador
+BLOCK_ROWS = 1_000_000
+
+NA = 'NaN '
+
+# Códigos de cidade dos IDs de entregadores e o centro aproximado de cada uma
+CITY_CODES = { 'INDO': (22.72, 75.86), 'BANG': (12.97, 77.59), 'COIMB': (11.02, 76.96), 'CHEN': (13.08, 80.27),
+               'HYD': (17.39, 78.49), 'RANCHI': (23.34, 85.31), 'MYS': (12.30, 76.64), 'DEH': (30.32, 78.03),
+               'KOC': (9.93, 76.27), 'PUNE': (18.52, 73.86), 'LUDH': (30.90, 75.86), 'KNP': (26.45, 80.33),
+               'MUM': (19.08, 72.88), 'KOL': (22.57, 88.36), 'JAP': (26.91, 75.79), 'SUR': (21.17, 72.83),
+               'GOA': (15.50, 73.83), 'AGR': (27.18, 78.01), 'VAD': (22.31, 73.18), 'ALH': (25.44, 81.85),
+               'BHP': (23.26, 77.41), 'AURG': (19.88, 75.34) }
+
+CITIES = ['Metropolitian ', 'Urban ', 'Semi-Urban ']
+CITY_P = [0.75, 0.22, 0.03]
+TRAFFIC = ['Low ', 'Jam ', 'Medium ', 'High ']
+TRAFFIC_P = [0.34, 0.31, 0.24, 0.11]
+WEATHER = ['conditions Fog', 'conditions Stormy', 'conditions Cloudy', 'conditions Sandstorms',
+           'conditions Windy', 'conditions Sunny', 'conditions NaN']
+WEATHER_P = [0.168, 0.166, 0.166, 0.164, 0.164, 0.160, 0.012]
+ORDERS = ['Snack ', 'Meal ', 'Drinks ', 'Buffet ']
+VEHICLES = ['motorcycle ', 'scooter ', 'electric_scooter ', 'bicycle ']
+VEHICLES_P = [0.58, 0.33, 0.08, 0.01]
+FESTIVAL = ['No ', 'Yes ']
+FESTIVAL_P = [0.98, 0.02]
+
+# Proporção aproximada de 'NaN ' em cada coluna no dataset original
+NA_RATE = { 'Delivery_person_Age': 0.04, 'Delivery_person_Ratings': 0.04, 'Time_Orderd': 0.04,
+            'Road_traffic_density': 0.013, 'multiple_deliveries': 0.022, 'Festival': 0.005, 'City': 0.026 }
+
+# Um entregador a cada ~35 pedidos, como no dataset original
+ORDERS_PER_COURIER = 35
+RESTAURANTS_PER_CITY = 20
+
+FIRST_DATE = pd.Timestamp( 2022, 2, 11 )
+DAYS = 55
+
+
+def courier_ids( rows ):
+    # IDs no formato 'INDORES13DEL02 ' (cidade, restaurante, entregador)
+    n_couriers = max( len( CITY_CODES ) * RESTAURANTS_PER_CITY * 3, rows // ORDERS_PER_COURIER )
+    per_city = -( -n_couriers // len( CITY_CODES ) )
+    ids = [ '{}RES{:02d}DEL{:02d} '.format( city, i % RESTAURANTS_PER_CITY + 1, i // RESTAURANTS_PER_CITY + 1 )
+            for city in CITY_CODES for i in range( per_city ) ]
+    return np.array( ids, dtype=object ), per_city
+
+
+
+def generate_orders( rows, seed=0, start_id=0 ):
+
+    """ Gera `rows` pedidos com as mesmas colunas, sentinelas 'NaN ' e
+        formatos do dataset/train.csv.
+
+        Input: número de linhas, semente e número do primeiro pedido
+        Output: Dataframe com os valores em texto, como no csv original
+    """
+    rng = np.random.default_rng( seed )
+    couriers, per_city = courier_ids( max( rows, SCALES['45k'] ) )
+
+    courier = rng.integers( 0, len( couriers ), rows )
+    city_code = courier // per_city
+    restaurant = courier % RESTAURANTS_PER_CITY
+
+    # Restaurantes fixos em volta do centro da cidade; entrega a poucos km do restaurante
+    centers = np.array( list( CITY_CODES.values() ) )
+    offsets = np.random.default_rng( 1 ).uniform( -0.08, 0.08, ( len( CITY_CODES ), RESTAURANTS_PER_CITY, 2 ) )
+    rest = centers[city_code] + offsets[city_code, restaurant]
+    rest = np.round( rest, 6 )
+    delivery = np.round( rest + rng.uniform( -0.12, 0.12, ( rows, 2 ) ), 6 )
+
+    def pick( values, p=None ):
+        return np.asarray( values, dtype=object )[rng.choice( len( values ), rows, p=p )]
+
+    def with_na( values, col ):
+        values = np.asarray( values, dtype=object )
+        values[rng.random( rows ) < NA_RATE[col]] = NA
+        return values
+
+    dates = ( FIRST_DATE + pd.to_timedelta( rng.integers( 0, DAYS, rows ), unit='D' ) ).strftime( '%d-%m-%Y' )
+    minutes = rng.integers( 10, 55, rows )
+    hours = rng.integers( 8, 24, rows )
+    ordered = pd.Series( hours ).astype( str ).str.zfill( 2 ) + ':' + pd.Series( rng.choice( [0, 15, 30, 45], rows ) ).astype( str ).str.zfill( 2 ) + ':00'
+
+    df = pd.DataFrame( {
+        'ID': pd.Series( np.arange( start_id, start_id + rows ) ).map( '0x{:04x} '.format ).values,
+        'Delivery_person_ID': couriers[courier],
+        'Delivery_person_Age': with_na( rng.integers( 20, 40, rows ).astype( str ), 'Delivery_person_Age' ),
+        'Delivery_person_Ratings': with_na( np.round( np.clip( rng.normal( 4.63, 0.33, rows ), 2.5, 5.0 ), 1 ).astype( str ), 'Delivery_person_Ratings' ),
+        'Restaurant_latitude': rest[:, 0],
+        'Restaurant_longitude': rest[:, 1],
+        'Delivery_location_latitude': delivery[:, 0],
+        'Delivery_location_longitude': delivery[:, 1],
+        'Order_Date': dates,
+        'Time_Orderd': with_na( ordered.values, 'Time_Orderd' ),
+        'Time_Order_picked': ordered.values,
+        'Weatherconditions': pick( WEATHER, WEATHER_P ),
+        'Road_traffic_density': with_na( pick( TRAFFIC, TRAFFIC_P ), 'Road_traffic_density' ),
+        'Vehicle_condition': rng.integers( 0, 4, rows ),
+        'Type_of_order': pick( ORDERS ),
+        'Type_of_vehicle': pick( VEHICLES, VEHICLES_P ),
+        'multiple_deliveries': with_na( rng.choice( [0, 1, 2, 3], rows, p=[0.31, 0.62, 0.05, 0.02] ).astype( str ), 'multiple_deliveries' ),
+        'Festival': with_na( pick( FESTIVAL, FESTIVAL_P ), 'Festival' ),
+        'City': with_na( pick( CITIES, CITY_P ), 'City' ),
+        'Time_taken(min)': pd.Series( minutes ).map( '(min) {}'.format ).values,
+    } )
+
+    return df
+
+
+
+def write_orders_csv( path, rows, seed=0, block_rows=BLOCK_ROWS ):
+
+    """ Grava `rows` pedidos sintéticos em csv, em blocos de block_rows linhas. """
+    os.makedirs( os.path.dirname( os.path.abspath( path ) ), exist_ok=True )
+    tmp = path + '.tmp'
+
+    written = 0
+    block = 0
+    while written < rows:
+        n = min( block_rows, rows - written )
+        df = generate_orders( n, seed=seed + block, start_id=written )
+        df.to_csv( tmp, index=False, mode='w' if written == 0 else 'a', header=written == 0 )
+        written += n
+        block += 1
+
+    os.replace( tmp, path )
+    return path
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser( description='Gera pedidos sintéticos no formato do train.csv' )
+    parser.add_argument( 'scale', help='número de linhas ou uma das escalas: ' + ', '.join( SCALES ) )
+    parser.add_argument( 'output', help='caminho do csv gerado' )
+    parser.add_argument( '--seed', type=int, default=0 )
+    args = parser.parse_args()
+
+    rows = SCALES[args.scale] if args.scale in SCALES else int( args.scale )
+    write_orders_csv( args.output, rows, seed=args.seed )
@@ -0,0 +1,357 @@
+# Libraries
+import argparse
+import collections
+import datetime
+import gc
+import json
+import logging
+import math
+import os
+import random
+import resource
+import runpy
+import sys
+import threading
+import time
+import warnings
+
+# ==========================================
+# Teste de carga: sessões simultâneas nas páginas do dashboard
+# ==========================================
+#
+# Uso (na raiz do repositório):
+#
+#     python -m benchmarks.loadtest --scale 45k --sessions 1 10 50 --duration 60
+#
+# Cada sessão simulada roda numa thread, como o servidor do streamlit faz com
+# cada aba do navegador: executa a página (rerun), espera um tempo de leitura
+# (--think, distribuição log-normal) e interage de novo — move o slider de
+# data, liga/desliga uma condição de trânsito, troca de aba ou de página. Os
+# widgets de cada sessão e o st.session_state são próprios da sessão; os
+# caches do processo (dados, cubo, mapas, ...) são compartilhados, como no
+# servidor.
+#
+# Para cada número de sessões o relatório mostra a latência de cada rerun
+# (percentis por página), a vazão (reruns por segundo) e a memória do
+# processo (RSS) antes, no pico e ao final, com o crescimento por sessão.
+# Rodar o mesmo comando antes e depois de uma mudança mostra o seu efeito;
+# os caches do processo continuam quentes de uma rodada para a seguinte.
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from benchmarks.run import PAGES, ROOT, prepare  # noqa: E402
+
+# Probabilidade de cada interação depois do tempo de leitura
+ACTIONS = { 'date': 0.4, 'traffic': 0.3, 'tab': 0.2, 'page': 0.1 }
+
+# Dispersão do tempo de leitura (sigma da log-normal)
+THINK_SIGMA = 0.8
+
+# Intervalo entre as leituras de memória durante a rodada (segundos)
+MEMORY_INTERVAL = 0.2
+
+QUANTILES = [0.5, 0.9, 0.99]
+
+# Sessão simulada da thread atual (None fora das sessões)
+_current = threading.local()
+
+
+def rss_mb():
+    # Memória residente do processo; sem /proc, o pico informado pelo sistema
+    try:
+        with open( '/proc/self/status' ) as f:
+            for line in f:
+                if line.startswith( 'VmRSS:' ):
+                    return int( line.split()[1] ) / 1024
+    except OSError:
+        pass
+    return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss / 1024
+
+
+
+def think_time( rng, mean ):
+    # Log-normal com a média pedida
+    if mean <= 0:
+        return 0.0
+    mu = math.log( mean ) - THINK_SIGMA ** 2 / 2
+    return rng.lognormvariate( mu, THINK_SIGMA )
+
+
+
+class SimulatedSession:
+
+    """ Widgets, st.session_state e página atual de uma sessão.
+
+        Os widgets devolvem o valor escolhido pela sessão (ou o padrão da
+        página) e guardam as opções de cada um, usadas nas interações.
+    """
+
+    def __init__( self, number, rng, pages=PAGES ):
+        self.number = number
+        self.rng = rng
+        self.pages = pages
+        self.page = rng.choice( pages )
+        self.state = {}
+        self.values = {}
+        self.specs = {}
+
+
+    def slider( self, label, min_value=None, max_value=None, value=None, **kwargs ):
+        self.specs[label] = ( 'slider', min_value, max_value )
+        return self.values.get( label, value )
+
+
+    def multiselect( self, label, options, default=None, **kwargs ):
+        self.specs[label] = ( 'multiselect', list( options ) )
+        return list( self.values.get( label, default or [] ) )
+
+
+    def radio( self, label, options, index=0, **kwargs ):
+        options = list( options )
+        self.specs[label] = ( 'radio', options )
+        return options[self.values.get( label, index ) % len( options )]
+
+
+    def interact( self ):
+
+        """ Escolhe e aplica a próxima interação; devolve o nome dela. """
+        action = self.rng.choices( list( ACTIONS ), weights=list( ACTIONS.values() ) )[0]
+        specs = { kind: [ ( label, spec ) for label, spec in self.specs.items() if spec[0] == kind ]
+                  for kind in ( 'slider', 'multiselect', 'radio' ) }
+
+        if action == 'date' and specs['slider']:
+            label, ( _, low, high ) = self.rng.choice( specs['slider'] )
+            days = ( high - low ).days
+            self.values[label] = low + datetime.timedelta( days=self.rng.randint( 0, days ) )
+
+        elif action == 'traffic' and specs['multiselect']:
+            label, ( _, options ) = self.rng.choice( specs['multiselect'] )
+            current = self.multiselect( label, options, self.values.get( label, options ) )
+            option = self.rng.choice( options )
+            if option in current and len( current ) > 1:
+                current.remove( option )
+            elif option not in current:
+                current.append( option )
+            self.values[label] = current
+
+        elif action == 'tab' and specs['radio']:
+            label, ( _, options ) = self.rng.choice( specs['radio'] )
+            self.values[label] = self.rng.randrange( len( options ) )
+
+        else:
+            # Na troca de página o streamlit descarta os widgets da anterior
+            action = 'page'
+            self.page = self.rng.choice( self.pages )
+            self.values = {}
+            self.specs = {}
+
+        return action
+
+
+
+class _SessionState:
+    # st.session_state da sessão da thread atual
+
+    def __init__( self, original ):
+        self._original = original
+
+    def _target( self ):
+        session = getattr( _current, 'session', None )
+        return self._original if session is None else session.state
+
+    def __getattr__( self, name ):
+        return getattr( self._target(), name )
+
+    def __getitem__( self, key ):
+        return self._target()[key]
+
+    def __setitem__( self, key, value ):
+        self._target()[key] = value
+
+    def __contains__( self, key ):
+        return key in self._target()
+
+
+
+def install_widgets():
+
+    """ Troca os widgets usados pelas páginas (e o st.session_state) por
+        versões que consultam a sessão simulada da thread atual.
+    """
+    import streamlit as st
+    from streamlit.delta_generator import DeltaGenerator
+
+    def dispatch( name, original ):
+        def widget( *args, **kwargs ):
+            session = getattr( _current, 'session', None )
+            if session is None:
+                return original( *args, **kwargs )
+            # Métodos do DeltaGenerator recebem o próprio DeltaGenerator
+            if args and isinstance( args[0], DeltaGenerator ):
+                args = args[1:]
+            return getattr( session, name )( *args, **kwargs )
+        return widget
+
+    for name in ( 'slider', 'multiselect', 'radio' ):
+        setattr( DeltaGenerator, name, dispatch( name, getattr( DeltaGenerator, name ) ) )
+    # st.radio é um método já ligado ao DeltaGenerator principal
+    st.radio = dispatch( 'radio', st.radio )
+    st.session_state = _SessionState( st.session_state )
+
+
+
+def run_session( session, deadline, think, start_delay, records, errors ):
+    # Loop de uma sessão: rerun, tempo de leitura, interação
+    _current.session = session
+    time.sleep( start_delay )
+    action = 'open'
+    while time.perf_counter() < deadline:
+        page = session.page
+        started = time.perf_counter()
+        try:
+            runpy.run_path( os.path.join( ROOT, page ), run_name='__main__' )
+        except Exception as error:
+            errors.append( '{}: {!r}'.format( page, error ) )
+        records.append( ( page, action, time.perf_counter() - started ) )
+
+        time.sleep( think_time( session.rng, think ) )
+        action = session.interact()
+
+
+
+def percentiles( values ):
+    values = sorted( values )
+    if not values:
+        return {}
+    result = { 'p{:g}'.format( q * 100 ): round( values[min( len( values ) - 1, int( q * len( values ) ) )] * 1000, 1 )
+               for q in QUANTILES }
+    result['max'] = round( values[-1] * 1000, 1 )
+    return result
+
+
+
+def run_round( sessions, duration, think, seed ):
+
+    """ Uma rodada com `sessions` sessões simultâneas.
+
+        Output: dicionário com latências (ms), vazão e memória
+    """
+    from utils.memo import shared_memo
+
+    rng = random.Random( seed )
+    population = [ SimulatedSession( i, random.Random( rng.random() ), PAGES ) for i in range( sessions ) ]
+
+    gc.collect()
+    rss_start = rss_mb()
+    peak = [rss_start]
+    done = threading.Event()
+
+    def monitor():
+        while not done.wait( MEMORY_INTERVAL ):
+            peak[0] = max( peak[0], rss_mb() )
+
+    records = []
+    errors = []
+    started = time.perf_counter()
+    deadline = started + duration
+    # Chegadas espalhadas pelo primeiro tempo de leitura
+    threads = [ threading.Thread( target=run_session,
+                                  args=( session, deadline, think, rng.uniform( 0, think ), records, errors ) )
+                for session in population ]
+    watcher = threading.Thread( target=monitor, daemon=True )
+    watcher.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+
+    # As sessões continuam vivas (com o session_state) na medida final
+    gc.collect()
+    rss_end = rss_mb()
+    peak[0] = max( peak[0], rss_end )
+
+    by_page = {}
+    for page, _, latency in records:
+        by_page.setdefault( os.path.basename( page )[:-3], [] ).append( latency )
+
+    return { 'sessions': sessions,
+             'reruns': len( records ),
+             'errors': len( errors ),
+             'error_samples': errors[:5],
+             'throughput': round( len( records ) / elapsed, 2 ),
+             'actions': dict( collections.Counter( action for _, action, _ in records ) ),
+             'latency_ms': percentiles( [ latency for _, _, latency in records ] ),
+             'pages': { page: dict( percentiles( values ), reruns=len( values ) ) for page, values in sorted( by_page.items() ) },
+             'rss_mb': { 'start': round( rss_start, 1 ), 'peak': round( peak[0], 1 ), 'end': round( rss_end, 1 ),
+                         'per_session': round( ( rss_end - rss_start ) / sessions, 2 ) },
+             # Cache compartilhado entre páginas e sessões (utils.memo), acumulado desde o início
+             'memo': shared_memo.stats() }
+
+
+
+def warm_up():
+    # Carrega dados e caches do processo antes de medir (um rerun por página)
+    _current.session = SimulatedSession( -1, random.Random( 0 ) )
+    try:
+        for page in PAGES:
+            runpy.run_path( os.path.join( ROOT, page ), run_name='__main__' )
+    finally:
+        _current.session = None
+
+
+
+def report( result ):
+    rss = result['rss_mb']
+    print( '\n{} sessões: {} reruns, {} reruns/s, {} erros'.format(
+        result['sessions'], result['reruns'], result['throughput'], result['errors'] ) )
+    print( '  interações: ' + '  '.join( '{} {}'.format( k, v ) for k, v in sorted( result['actions'].items() ) ) )
+    print( '  latência (ms): ' + '  '.join( '{} {}'.format( k, v ) for k, v in result['latency_ms'].items() ) )
+    for page, stats in result['pages'].items():
+        print( '    {:<24}'.format( page ) + '  '.join( '{} {}'.format( k, v ) for k, v in stats.items() ) )
+    print( '  memória (MB): início {}  pico {}  fim {}  por sessão {}'.format(
+        rss['start'], rss['peak'], rss['end'], rss['per_session'] ) )
+    memo = result['memo']
+    print( '  cache compartilhado: {} resultados, {:.1f} MB de {:.0f} MB, {} acertos, {} cálculos, {} descartes'.format(
+        memo['entries'], memo['bytes'] / 2 ** 20, memo['max_bytes'] / 2 ** 20, memo['hits'], memo['misses'], memo['evictions'] ) )
+    for sample in result['error_samples']:
+        print( '  erro:', sample )
+
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description='Teste de carga com sessões simultâneas nas páginas' )
+    parser.add_argument( '--scale', default='45k', help='dados sintéticos (benchmarks.generator.SCALES) ou "repo" para o dataset/ da raiz' )
+    parser.add_argument( '--sessions', nargs='+', type=int, default=[1, 10, 50], help='sessões simultâneas de cada rodada' )
+    parser.add_argument( '--duration', type=float, default=60.0, help='duração de cada rodada (segundos)' )
+    parser.add_argument( '--think', type=float, default=3.0, help='tempo médio de leitura entre interações (segundos)' )
+    parser.add_argument( '--seed', type=int, default=0 )
+    parser.add_argument( '--json', help='grava os resultados neste arquivo' )
+    args = parser.parse_args( argv )
+
+    # Streamlit sem servidor ("bare mode") avisa a cada chamada de widget
+    warnings.filterwarnings( 'ignore' )
+    logging.disable( logging.WARNING )
+
+    os.chdir( ROOT if args.scale == 'repo' else prepare( args.scale ) )
+    install_widgets()
+    warm_up()
+
+    results = []
+    for sessions in args.sessions:
+        result = run_round( sessions, args.duration, args.think, args.seed )
+        report( result )
+        results.append( result )
+
+    if args.json:
+        with open( os.path.join( ROOT, args.json ), 'w', encoding='utf-8' ) as f:
+            json.dump( { 'scale': args.scale, 'duration': args.duration, 'think': args.think, 'rounds': results }, f, indent=2 )
+            f.write( '\n' )
+
+    return 1 if any( result['errors'] for result in results ) else 0
+
+
+
+if __name__ == '__main__':
+    sys.exit( main() )
@@ -0,0 +1,357 @@
+# Libraries
+import argparse
+import ast
+import datetime
+import importlib.util
+import json
+import logging
+import os
+import runpy
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+
+# ==========================================
+# Benchmarks: limpeza, gráficos e páginas com dados sintéticos
+# ==========================================
+#
+# Uso (na raiz do repositório):
+#
+#     python -m benchmarks.run --scales 45k 1M
+#     python -m benchmarks.run --scales 45k 1M --save
+#
+# Para cada escala o csv sintético é gerado (uma vez) em benchmarks/data e
+# cada etapa é medida: tempo (mediana de --repeat execuções) e pico de
+# memória (tracemalloc, numa execução separada). O resultado é comparado com
+# benchmarks/baseline.json; etapas mais lentas ou maiores que a base além da
+# tolerância fazem o comando terminar com código 1, assim como etapas que não
+# estão na base: ao criar ou renomear uma etapa, grave a base de novo (--save
+# com a suíte completa substitui as etapas da escala). A base depende da
+# máquina: grave uma nova (--save) antes de comparar em outro ambiente.
+
+ROOT = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+DATA_DIR = os.path.join( ROOT, 'benchmarks', 'data' )
+BASELINE_PATH = os.path.join( ROOT, 'benchmarks', 'baseline.json' )
+
+PAGES = ['pages/1_visao_empresa.py', 'pages/2_visao_entregadores.py', 'pages/3_visao_restaurantes.py']
+
+# Mesmos valores padrão dos filtros da barra lateral (inclusive o rótulo
+# 'Medius' das páginas, que não corresponde ao 'Medium' dos dados: as etapas
+# filtram as mesmas linhas que as páginas)
+DATE_SLIDER = datetime.datetime( 2022, 4, 13 )
+TRAFFIC_OPTIONS = ['Low', 'Medius', 'High', 'Jam']
+
+# Tolerância para acusar regressão (razão sobre a base) e diferenças
+# ignoradas por serem ruído de medida
+TOLERANCE = 1.3
+MIN_SECONDS = 0.005
+MIN_MB = 1.0
+
+sys.path.insert( 0, ROOT )
+
+from benchmarks.generator import SCALES, write_orders_csv  # noqa: E402
+
+
+def page_functions( page ):
+
+    """ Carrega apenas os imports, as funções (def) e as constantes (nomes
+        em maiúsculas, ex.: KPIS) de uma página, sem executar o restante do
+        script.
+
+        Input: caminho da página
+        Output: dicionário com as funções da página
+    """
+    with open( os.path.join( ROOT, page ), encoding='utf-8' ) as f:
+        tree = ast.parse( f.read(), filename=page )
+
+    def keep( node ):
+        if isinstance( node, ast.Assign ):
+            return all( isinstance( target, ast.Name ) and target.id.isupper() for target in node.targets )
+        return isinstance( node, ( ast.Import, ast.ImportFrom, ast.FunctionDef ) )
+
+    tree.body = [ node for node in tree.body if keep( node ) ]
+    namespace = { '__name__': 'benchmarks.' + os.path.basename( page )[:-3] }
+    exec( compile( tree, page, 'exec' ), namespace )
+
+    return namespace
+
+
+
+def measure( func, repeat ):
+
+    """ Mede uma etapa.
+
+        Input: função sem argumentos e número de repetições
+        Output: dicionário com segundos (mediana) e pico de memória em MB
+    """
+    if repeat > 1:
+        # Primeira execução descartada (imports tardios do plotly, caches frios)
+        func()
+
+    times = []
+    for _ in range( repeat ):
+        start = time.perf_counter()
+        func()
+        times.append( time.perf_counter() - start )
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return { 'seconds': round( statistics.median( times ), 4 ), 'peak_mb': round( peak / 2**20, 1 ) }
+
+
+
+def prepare( scale ):
+
+    """ Pasta de trabalho da escala: dataset/train.csv sintético e o logo,
+        nos caminhos relativos usados pelas páginas.
+    """
+    workdir = os.path.join( DATA_DIR, scale )
+    csv = os.path.join( workdir, 'dataset', 'train.csv' )
+    if not os.path.exists( csv ):
+        print( 'gerando {} linhas em {}'.format( SCALES[scale], csv ), flush=True )
+        write_orders_csv( csv, SCALES[scale] )
+
+    logo = os.path.join( workdir, 'logo.png' )
+    if not os.path.exists( logo ):
+        os.symlink( os.path.join( ROOT, 'logo.png' ), logo )
+
+    return workdir
+
+
+
+def stages( repeat ):
+
+    """ Etapas medidas, na ordem: (nome, função, repetições). Cada função roda
+        com o diretório de trabalho na pasta da escala.
+    """
+    from utils import cube as cube_module, data, index as index_module, spatial as spatial_module
+    from utils.chunked import aggregate_csv
+    from utils.couriers import top_couriers
+    from utils.maps import map_html
+    from utils.parallel import available_cores, read_clean_parallel
+    from utils.query import DuckDBQuery, PandasQuery, current_snapshot
+
+    path = data.DATASET_PATH
+    raw = {}
+    state = {}
+
+    def read_csv():
+        raw['df'] = data.read_orders( path )
+
+    def clean():
+        state['clean'] = data.clean_code( raw['df'] )
+
+    def clean_parallel():
+        # Um processo por núcleo disponível, como o load_workers
+        read_clean_parallel( path, available_cores() )
+
+    def load_cold():
+        # Sem snapshot nem cache: lê o csv, limpa e grava o snapshot
+        data._cache.clear()
+        if os.path.exists( data.snapshot_path( path ) ):
+            os.remove( data.snapshot_path( path ) )
+        data.load_data( path )
+
+    def load_snapshot():
+        data._cache.clear()
+        state['df1'] = data.load_data( path )
+
+    def build_index():
+        state['index'] = index_module.OrderIndex( state['df1'] )
+
+    def build_cube():
+        state['cube'] = cube_module.build_cube( state['df1'] )
+
+    def build_spatial():
+        # Pelo load_spatial, para que o mapa de restaurantes use o mesmo índice
+        data._derived.pop( ( 'spatial', path ), None )
+        state['spatial'] = spatial_module.load_spatial( path )
+
+    def select():
+        state['selected'] = state['index'].select( DATE_SLIDER, Road_traffic_density=TRAFFIC_OPTIONS )
+        state['filtered'] = cube_module.filter_cube( state['cube'], DATE_SLIDER, TRAFFIC_OPTIONS )
+
+    def chunked():
+        aggregate_csv( path )
+
+    # Com um só núcleo os processos disputam o mesmo núcleo e o caminho
+    # paralelo só mediria o custo de iniciá-los: a etapa fica de fora
+    parallel = [ ( 'read_clean_parallel', clean_parallel, 1 ) ] if available_cores() > 1 else []
+
+    result = [ ( 'read_csv', read_csv, 1 ), ( 'clean_code', clean, repeat ) ] + parallel + [
+               ( 'load_data (csv)', load_cold, 1 ), ( 'load_data (snapshot)', load_snapshot, repeat ),
+               ( 'build_index', build_index, 1 ), ( 'build_cube', build_cube, 1 ),
+               ( 'build_spatial', build_spatial, 1 ), ( 'select', select, repeat ), ( 'aggregate_csv', chunked, 1 ) ]
+
+    # Funções de gráfico e tabela de cada página, com as linhas e o cubo filtrados
+    page1 = page_functions( PAGES[0] )
+    page2 = page_functions( PAGES[1] )
+    page3 = page_functions( PAGES[2] )
+
+    def chart( name, call ):
+        return ( name, lambda: call( state['selected'], state['filtered'], PandasQuery( state['filtered'] ) ), repeat )
+
+    def sql_chart( name, call ):
+        # Mesma função de gráfico com o backend duckdb (SQL sobre o snapshot)
+        def run():
+            if 'snapshot' not in state:
+                state['snapshot'] = current_snapshot( path )
+            query = DuckDBQuery( state['snapshot'], DATE_SLIDER, TRAFFIC_OPTIONS )
+            return call( state['selected'], state['filtered'], query )
+        return ( name + ' [duckdb]', run, repeat )
+
+    # Gráficos que passam pela interface de consultas (utils.query)
+    query_charts = [
+        ( 'empresa.order_metric', lambda df1, cube, query: page1['order_metric']( query, 'auto', False ) ),
+        ( 'empresa.traffic_order_share', lambda df1, cube, query: page1['traffic_order_share']( query ) ),
+        ( 'empresa.traffic_order_city', lambda df1, cube, query: page1['traffic_order_city']( query ) ),
+        ( 'empresa.order_per_week', lambda df1, cube, query: page1['order_per_week']( query, False ) ),
+        ( 'restaurantes.avg_std_time_on_traffic', lambda df1, cube, query: page3['avg_std_time_on_traffic']( query ) ),
+        ( 'restaurantes.avg_std_time_graph', lambda df1, cube, query: page3['avg_std_time_graph']( query ) ),
+        ( 'restaurantes.distance', lambda df1, cube, query: page3['distance']( query, True ) ),
+    ]
+    result += [ chart( name, call ) for name, call in query_charts ]
+    if importlib.util.find_spec( 'duckdb' ) is not None:
+        result += [ sql_chart( name, call ) for name, call in query_charts ]
+
+    result += [
+        chart( 'empresa.order_share_per_week', lambda df1, cube, query: page1['order_share_per_week']( df1 ) ),
+    ]
+    for mode in ['Mediana por cidade', 'Locais de entrega', 'Restaurantes']:
+        result.append( chart( 'empresa.country_map ({})'.format( mode ),
+                              lambda df1, cube, query, mode=mode: map_html( page1['build_country_map']( df1, mode ) ) ) )
+
+    result += [
+        chart( 'entregadores.top_couriers', lambda df1, cube, query: top_couriers( df1 ) ),
+        chart( 'entregadores.kpis', lambda df1, cube, query: page2['compute_kpis']( page2['KPIS'], df1 ) ),
+        chart( 'restaurantes.kpis', lambda df1, cube, query: page3['compute_kpis']( page3['KPIS'], df1, cube ) ),
+    ]
+
+    # Consultas do índice espacial: pedidos num raio e restaurantes mais
+    # próximos de um local de entrega
+    def spatial_point():
+        df1 = state['df1']
+        return df1['Delivery_location_latitude'].iat[0], df1['Delivery_location_longitude'].iat[0]
+
+    result += [
+        ( 'spatial.orders_within (10 km)', lambda: state['spatial'].orders_within( *spatial_point(), 10 ), repeat ),
+        ( 'spatial.nearest_restaurants (10)', lambda: state['spatial'].nearest_restaurants( *spatial_point(), 10 ), repeat ),
+    ]
+
+    # Página inteira (execução do script como numa nova interação do usuário,
+    # com os dados já em cache no processo)
+    for page in PAGES:
+        name = 'page ' + os.path.basename( page )[:-3]
+        result.append( ( name, lambda page=page: runpy.run_path( os.path.join( ROOT, page ), run_name='__main__' ), repeat ) )
+
+    return result
+
+
+
+def run_scale( scale, repeat, only=None ):
+
+    """ Mede todas as etapas (ou as de `only`) de uma escala. """
+    workdir = prepare( scale )
+    cwd = os.getcwd()
+    os.chdir( workdir )
+    results = {}
+    try:
+        for name, func, times in stages( repeat ):
+            if only and not any( name.startswith( prefix ) for prefix in only ):
+                # Etapas de preparação rodam mesmo sem serem listadas
+                if name in ( 'read_csv', 'load_data (snapshot)', 'build_index', 'build_cube', 'build_spatial', 'select' ):
+                    func()
+                continue
+            results[name] = measure( func, times )
+            print( '{:>5} {:<48} {:>9.4f} s {:>9.1f} MB'.format( scale, name, results[name]['seconds'], results[name]['peak_mb'] ), flush=True )
+    finally:
+        os.chdir( cwd )
+
+    return results
+
+
+
+def compare( results, baseline, tolerance=TOLERANCE ):
+
+    """ Compara os resultados com a base.
+
+        Output: lista de regressões (escala, etapa, medida, base, atual)
+    """
+    regressions = []
+    for scale, scale_results in results.items():
+        for name, current in scale_results.items():
+            base = baseline.get( scale, {} ).get( name )
+            if base is None:
+                continue
+            for metric, floor in ( ( 'seconds', MIN_SECONDS ), ( 'peak_mb', MIN_MB ) ):
+                if current[metric] > base[metric] * tolerance and current[metric] - base[metric] > floor:
+                    regressions.append( ( scale, name, metric, base[metric], current[metric] ) )
+
+    return regressions
+
+
+
+def missing( results, baseline ):
+
+    """ Etapas medidas que não estão na base (ex.: etapa nova ou renomeada,
+        sem --save): sem base, compare não as verifica.
+
+        Output: lista de (escala, etapa)
+    """
+    return [ ( scale, name ) for scale, scale_results in results.items()
+             for name in scale_results if name not in baseline.get( scale, {} ) ]
+
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description='Benchmarks da limpeza, dos gráficos e das páginas' )
+    parser.add_argument( '--scales', nargs='+', default=['45k', '1M'], choices=list( SCALES ) )
+    parser.add_argument( '--repeat', type=int, default=3, help='execuções por etapa (mediana)' )
+    parser.add_argument( '--only', nargs='+', help='mede apenas as etapas que começam com estes nomes' )
+    parser.add_argument( '--baseline', default=BASELINE_PATH )
+    parser.add_argument( '--tolerance', type=float, default=TOLERANCE )
+    parser.add_argument( '--save', action='store_true', help='grava os resultados como nova base' )
+    args = parser.parse_args( argv )
+
+    # Streamlit sem servidor ("bare mode") avisa a cada chamada de widget
+    warnings.filterwarnings( 'ignore' )
+    logging.disable( logging.WARNING )
+
+    results = { scale: run_scale( scale, args.repeat, args.only ) for scale in args.scales }
+
+    baseline = {}
+    if os.path.exists( args.baseline ):
+        with open( args.baseline, encoding='utf-8' ) as f:
+            baseline = json.load( f )
+
+    if args.save:
+        for scale, scale_results in results.items():
+            if args.only:
+                baseline.setdefault( scale, {} ).update( scale_results )
+            else:
+                # Suíte completa: etapas que não existem mais saem da base
+                baseline[scale] = scale_results
+        with open( args.baseline, 'w', encoding='utf-8' ) as f:
+            json.dump( baseline, f, indent=2, sort_keys=True )
+            f.write( '\n' )
+        print( 'base gravada em', args.baseline )
+        return 0
+
+    regressions = compare( results, baseline, args.tolerance )
+    for scale, name, metric, base, current in regressions:
+        print( 'REGRESSÃO {} {}: {} {} -> {}'.format( scale, name, metric, base, current ) )
+    unchecked = missing( results, baseline )
+    for scale, name in unchecked:
+        print( 'SEM BASE {} {} (gravar com --save)'.format( scale, name ) )
+
+    return 1 if regressions or unchecked else 0
+
+
+
+if __name__ == '__main__':
+    sys.exit( main() )
@@ -0,0 +1,210 @@
+# Libraries
+import argparse
+import ast
+import json
+import logging
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+# ==========================================
+# Partida a frio: imports e primeira execução de cada página
+# ==========================================
+#
+# Uso (na raiz do repositório):
+#
+#     python -m benchmarks.startup --scale 45k
+#
+# Cada página roda num processo novo, como num worker recém-criado pelo
+# autoscaling, em que só o streamlit já foi importado (o servidor o importa
+# antes de executar qualquer página). Para cada página são medidos:
+#
+# - imports: os imports do topo do script (bibliotecas e módulos do projeto)
+# - first_run: a primeira execução com os widgets no valor padrão
+#   (carregamento dos dados, filtros e aba inicial: a primeira pintura)
+# - rerun: a execução seguinte, com os caches do processo já quentes
+#
+# O relatório mostra também as etapas mais lentas da primeira execução
+# (utils.timing) e os imports mais lentos (python -X importtime). O comando
+# termina com código 1 se uma página passar do orçamento (BUDGET) ou se a
+# primeira execução carregar uma biblioteca de LAZY_MODULES, que só deve ser
+# importada quando o widget que a usa é desenhado.
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from benchmarks.run import PAGES, ROOT, prepare  # noqa: E402
+
+STARTUP_PAGES = ['Home.py'] + PAGES
+
+# Orçamento por página em segundos (escala 45k, snapshot parquet já gravado)
+BUDGET = { 'imports': 0.5, 'first_run': 3.0 }
+
+# Bibliotecas que a primeira execução (aba inicial) não deve carregar
+LAZY_MODULES = ['folium', 'branca', 'haversine']
+
+# Imports e etapas listados no relatório de cada página
+TOP = 5
+
+
+def top_level_imports( page ):
+    # Só os imports do topo do script, para medi-los separados da execução
+    with open( page, encoding='utf-8' ) as f:
+        tree = ast.parse( f.read(), filename=page )
+    tree.body = [ node for node in tree.body if isinstance( node, ( ast.Import, ast.ImportFrom ) ) ]
+    return compile( tree, page, 'exec' )
+
+
+
+def child( page ):
+
+    """ Mede uma página no processo atual (novo) e imprime o resultado em json. """
+    warnings.filterwarnings( 'ignore' )
+    logging.disable( logging.WARNING )
+
+    import streamlit  # noqa: F401
+
+    preloaded = set( sys.modules )
+    page = os.path.join( ROOT, page )
+
+    started = time.perf_counter()
+    exec( top_level_imports( page ), { '__name__': '__main__', '__file__': page } )
+    imports = time.perf_counter() - started
+
+    started = time.perf_counter()
+    runpy.run_path( page, run_name='__main__' )
+    first_run = time.perf_counter() - started
+
+    started = time.perf_counter()
+    runpy.run_path( page, run_name='__main__' )
+    rerun = time.perf_counter() - started
+
+    from utils.timing import timings
+
+    # Bibliotecas (fora da biblioteca padrão) carregadas pela página
+    stdlib = getattr( sys, 'stdlib_module_names', () )
+    packages = sorted( { name.split( '.' )[0] for name in set( sys.modules ) - preloaded
+                         if not name.startswith( '_' ) and name.split( '.' )[0] not in stdlib } )
+    stages = sorted( timings.summary(), key=lambda row: -row['total'] )[:TOP]
+
+    json.dump( { 'imports': imports, 'first_run': first_run, 'rerun': rerun,
+                 'preloaded': sorted( preloaded ), 'packages': packages,
+                 'stages': [ { 'stage': row['stage'], 'seconds': row['total'] } for row in stages ] }, sys.stdout )
+
+
+
+def slowest_imports( stderr, preloaded, top=TOP ):
+
+    """ Imports mais lentos da página na saída de python -X importtime
+        (tempo acumulado, só o primeiro nível de cada import).
+
+        Output: lista de (módulo, segundos)
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith( 'import time:' ):
+            continue
+        parts = line[len( 'import time:' ):].split( '|' )
+        if len( parts ) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        # Primeiro nível: o nome vem logo após um espaço, sem recuo extra
+        if name.startswith( '  ' ) or name.strip() in preloaded:
+            continue
+        rows.append( ( name.strip(), int( parts[1] ) / 1e6 ) )
+
+    return sorted( rows, key=lambda row: -row[1] )[:top]
+
+
+
+def measure_page( page, workdir, metrics_path ):
+
+    """ Roda a página num processo novo (python -X importtime).
+
+        Output: dicionário com os tempos, as bibliotecas carregadas, as etapas
+                e os imports mais lentos
+    """
+    env = dict( os.environ, CURRY_TIMING='1', CURRY_METRICS_FILE=metrics_path,
+                PYTHONPATH=os.pathsep.join( filter( None, [ROOT, os.environ.get( 'PYTHONPATH' )] ) ) )
+    process = subprocess.run( [sys.executable, '-X', 'importtime', '-m', 'benchmarks.startup', '--child', page],
+                              cwd=workdir, env=env, capture_output=True, text=True )
+    if process.returncode != 0:
+        raise RuntimeError( '{} falhou:\n{}'.format( page, process.stderr[-2000:] ) )
+
+    result = json.loads( process.stdout )
+    result['slowest_imports'] = slowest_imports( process.stderr, set( result.pop( 'preloaded' ) ) )
+    return result
+
+
+
+def check( page, result, budget=BUDGET, lazy_modules=LAZY_MODULES ):
+
+    """ Problemas da página: tempos acima do orçamento e bibliotecas que
+        deveriam ser importadas só quando usadas.
+    """
+    problems = [ '{} {:.3f} s > orçamento {:.3f} s'.format( name, result[name], limit )
+                 for name, limit in budget.items() if result[name] > limit ]
+    problems += [ 'importou {} na primeira execução'.format( name )
+                  for name in lazy_modules if name in result['packages'] ]
+    return [ '{}: {}'.format( page, problem ) for problem in problems ]
+
+
+
+def report( page, result ):
+    print( '\n{}: imports {:.3f} s  primeira execução {:.3f} s  rerun {:.3f} s'.format(
+        page, result['imports'], result['first_run'], result['rerun'] ) )
+    print( '  imports mais lentos: ' + '  '.join( '{} {:.3f}'.format( name, seconds )
+                                                  for name, seconds in result['slowest_imports'] ) )
+    print( '  etapas mais lentas:  ' + '  '.join( '{} {:.3f}'.format( row['stage'], row['seconds'] )
+                                                  for row in result['stages'] ) )
+    print( '  bibliotecas carregadas: ' + ', '.join( result['packages'] ) )
+
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description='Partida a frio das páginas (imports e primeira execução)' )
+    parser.add_argument( '--scale', default='45k', help='dados sintéticos (benchmarks.generator.SCALES) ou "repo" para o dataset/ da raiz' )
+    parser.add_argument( '--pages', nargs='+', default=STARTUP_PAGES )
+    parser.add_argument( '--budget-imports', type=float, default=BUDGET['imports'], help='segundos' )
+    parser.add_argument( '--budget-first-run', type=float, default=BUDGET['first_run'], help='segundos' )
+    parser.add_argument( '--json', help='grava os resultados neste arquivo' )
+    parser.add_argument( '--child', help=argparse.SUPPRESS )
+    args = parser.parse_args( argv )
+
+    if args.child:
+        child( args.child )
+        return 0
+
+    workdir = ROOT if args.scale == 'repo' else prepare( args.scale )
+    budget = { 'imports': args.budget_imports, 'first_run': args.budget_first_run }
+
+    # Uma execução preparatória grava o snapshot parquet (se ainda não
+    # existir): as páginas medem a partida normal de um worker, que lê o
+    # snapshot em vez de limpar o csv
+    results = {}
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        metrics_path = os.path.join( tmp, 'timings.prom' )
+        measure_page( PAGES[0], workdir, metrics_path )
+        for page in args.pages:
+            results[page] = measure_page( page, workdir, metrics_path )
+            report( page, results[page] )
+            problems += check( page, results[page], budget )
+
+    if args.json:
+        with open( os.path.join( ROOT, args.json ), 'w', encoding='utf-8' ) as f:
+            json.dump( { 'scale': args.scale, 'budget': budget, 'pages': results }, f, indent=2 )
+            f.write( '\n' )
+
+    for problem in problems:
+        print( 'ACIMA DO ORÇAMENTO', problem )
+
+    return 1 if problems else 0
+
+
+
+if __name__ == '__main__':
+    sys.exit( main() )
@@ -1,200 +1,199 @@
 # Libraries
-from haversine import haversine
-import plotly.express as px
-import plotly.graph_objects as go
+# (plotly e folium são importados nas funções que desenham os gráficos e o
+# mapa: só quando a aba que os usa é aberta)
 
 # bibliotecas necessárias
 import pandas as pd
 import streamlit as st
-from PIL import Image
-import folium
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
+
+from utils.assets import LOGO_WIDTH, logo
+from utils.cube import filter_cube, load_cube
+from utils.index import load_index
+from utils.ingest import live_orders
+from utils.memo import filter_memo
+from utils.precompute import page_views
+from utils.query import open_query
+from utils.sections import lazy_tabs
+from utils.spatial import load_spatial, restaurant_points
+from utils.timebuckets import GRANULARITIES, bucket_start, bucket_sum, cap_granularity, downsample
+from utils.timing import page_run, timed, timer
 
 st.set_page_config( page_title='Visão Empresa', page_icon='📈', layout='wide' )
 
+# Tempos por etapa (ligado com CURRY_TIMING=1)
+rerun = page_run( 'visao_empresa' )
+
 # ==========================================
 # Funções
 # ==========================================
 
-def country_maps( df1 ):
+@timed( 'empresa.country_maps' )
+def country_maps( df1, map_mode ):
+    from utils.maps import map_html
+    
+    # O html de cada mapa fica no cache das visões (views.get), pelo estado
+    # dos filtros e pela versão dos dados
+    html = map_html( build_country_map( df1, map_mode ) )
     
-    # calcular o valor mediano da latitude e da longitude, agrupado por cidade e tipo de tráfego.
-    df_aux = ( df1.loc[: , ['City' , 'Road_traffic_density', 'Delivery_location_latitude' , 'Delivery_location_longitude']]
-                  .groupby(['City' , 'Road_traffic_density'])
-                  .median()
-                  .reset_index() )
+    return html
+
+
+
+@timed( 'empresa.build_country_map' )
+def build_country_map( df1, map_mode ):
+    import folium
+    from utils.maps import bulk_markers, point_layer
     
     # Para desenhar o mapa usar a biblioteca folium:
     # Guardar na variável map
-    
     map = folium.Map()
     
-    for index, location_info in df_aux.iterrows():
-        folium.Marker([location_info['Delivery_location_latitude'] , 
-                 location_info['Delivery_location_longitude' ]],
-                popup=location_info[['City' , 'Road_traffic_density']] ).add_to(map)
+    if map_mode == 'Mediana por cidade':
+        # calcular o valor mediano da latitude e da longitude, agrupado por cidade e tipo de tráfego.
+        df_aux = ( df1[['City' , 'Road_traffic_density', 'Delivery_location_latitude' , 'Delivery_location_longitude']]
+                      .groupby(['City' , 'Road_traffic_density'], observed=True )
+                      .median()
+                      .sort_index()
+                      .reset_index() )
+        
+        popups = ( df_aux['City'].astype( str ) + ' - ' + df_aux['Road_traffic_density'].astype( str ) ).tolist()
+        bulk_markers( map, df_aux['Delivery_location_latitude'], df_aux['Delivery_location_longitude'], popups )
+        
+    elif map_mode == 'Locais de entrega':
+        # todos os locais de entrega (cluster ou mapa de calor, conforme a quantidade)
+        point_layer( map, df1['Delivery_location_latitude'], df1['Delivery_location_longitude'] )
         
-    folium_static( map, width = 1024 , height = 600)
+    else:
+        # restaurantes: cada par de coordenadas distinto aparece uma vez (IDs
+        # do índice espacial, sem agrupar as coordenadas das linhas)
+        restaurants = restaurant_points( df1 )
+        point_layer( map, restaurants[:, 0], restaurants[:, 1] )
+        
+    return map
 
 
     
     
+@timed( 'empresa.order_share_per_week' )
 def order_share_per_week( df1 ):
+    import plotly.express as px
     # Calcular o número de entregas por semana e o cálculo do número de entregadores únicos por semana
     # e vou dividir os dois valores, exibindo-os em um gráfico de linha.
 
+    # Semana de cada pedido: a chave inteira order_week, calculada uma vez no
+    # carregamento (clean_code). As semanas começam no domingo, como a máscara
+    # %U do strftime; cada ponto é identificado pela data do domingo, então
+    # semanas de anos diferentes não se misturam.
+    week = df1['order_week']
+
     # número de pedidos por semana:
-    df_aux1 = (df1.loc[:, ['ID' , 'week_of_year']]
-                     .groupby( 'week_of_year')
-                     .count().reset_index() )
+    df_aux1 = df1['ID'].groupby( week ).count().reset_index()
 
     # número de entregadores únicos por semana
-    df_aux2 = ( df1.loc[: , ['Delivery_person_ID' , 'week_of_year']]
-                     .groupby('week_of_year')
-                     .nunique().reset_index() )
+    df_aux2 = df1['Delivery_person_ID'].groupby( week ).nunique().reset_index()
 
     # Juntar dois dataframes usando a função merge()
     df_aux = pd.merge(df_aux1 , df_aux2 , how = 'inner')
     df_aux['order_by_deliver'] = df_aux['ID'] / df_aux['Delivery_person_ID']
-    fig = px.line(df_aux , x = 'week_of_year' , y = 'order_by_deliver')
-    st.plotly_chart( fig, use_container_width = True )
+    df_aux.insert( 0, 'Order_Date', bucket_start( df_aux.pop( 'order_week' ), 'week' ) )
+    fig = px.line(df_aux , x = 'Order_Date' , y = 'order_by_deliver')
           
     return fig
 
 
 
-def order_per_week( df1 ):
+@timed( 'empresa.order_per_week' )
+def order_per_week( query, reduce_points ):
+    import plotly.express as px
     
-    # Fazer um contagem da colunas “ID” agrupado “Order Date” e usar uma bibliotecas de visualização para mostrar o gráfico de barras.
+    # Fazer um contagem dos pedidos por semana e mostrar num gráfico de linhas.
 
-    # Criar a coluna da semana
-    # É necessário calcular a semana da coluna 'Order_Date'.
-    # A função strdftime() formata a string no tempo. 
-    # A máscara %U pega o Domingo como primeiro dia da semana
-    # A mascara %W pega a Segunda feira como primeiro dia da semana
-    # .dt transforma string em data
-    df1['week_of_year'] = df1['Order_Date'].dt.strftime( '%U' )
-    df_aux = df1.loc[: ,['ID','week_of_year' ]].groupby('week_of_year').count().reset_index()
+    # As semanas começam no domingo (como a máscara %U do strftime), mas são
+    # chaves inteiras calculadas sobre o número de pedidos de cada dia (cubo),
+    # e não um texto formatado por linha. Cada ponto é identificado pela data
+    # do domingo, então semanas de anos diferentes não se misturam.
+    df_day = query.summarize( 'Order_Date' )
+    df_aux, _ = bucket_sum( df_day['Order_Date'], df_day['count'], 'week' )
+    df_aux.columns = ['Order_Date', 'ID']
+    
+    # Série longa: reduzir os pontos mantendo o formato (lttb)
+    if reduce_points:
+        df_aux = downsample( df_aux, 'Order_Date', 'ID' )
 
     # Plotar gráfico de linhas
-    fig = px.line(df_aux, x = 'week_of_year' , y = 'ID')
-    st.plotly_chart( fig, use_container_width = True )
+    fig = px.line(df_aux, x = 'Order_Date' , y = 'ID')
     
     return fig
 
 
 
-def traffic_order_city( df1 ):
+@timed( 'empresa.traffic_order_city' )
+def traffic_order_city( query ):
+    import plotly.express as px
     
     # Contar o número de pedidos, agrupados por cidade e tipo de tráfego e desenhar um gráfico de bolha.
-    df_aux = ( df1.loc[: , ['ID' , 'City' , 'Road_traffic_density'] ]
-                      .groupby(['City' , 'Road_traffic_density'])
-                      .count()
-                      .reset_index() )
+    df_aux = ( query.summarize( ['City' , 'Road_traffic_density'] )
+                      .loc[: , ['City' , 'Road_traffic_density', 'count']]
+                      .rename( columns={'count': 'ID'} ) )
     
     fig = px.scatter(df_aux, x = 'City' , y = 'Road_traffic_density' , size= 'ID' , color = 'City' )
-    st.plotly_chart( fig, use_container_width = True )
     
     return fig
             
 
 
 
-def traffic_order_share( df1 ):
+@timed( 'empresa.traffic_order_share' )
+def traffic_order_share( query ):
+    import plotly.express as px
     
     # Contar o número de entregas, agrupado pela coluna de densidade de tráfego e calcular a porcentagem que cada valor representa no todo.
-    df_aux = df1.loc[:, ['ID', 'Road_traffic_density']].groupby( 'Road_traffic_density' ).count().reset_index()
+    df_aux = query.summarize( 'Road_traffic_density' ).loc[:, ['Road_traffic_density', 'count']].rename( columns={'count': 'ID'} )
     df_aux['perc_ID'] = 100 * ( df_aux['ID'] / df_aux['ID'].sum() )
     # gráfico
     fig = px.pie( df_aux, values='perc_ID', names='Road_traffic_density' )
-    st.plotly_chart( fig, use_container_width = True )            
     
     return fig
 
 
-def order_metric(df1):
+@timed( 'empresa.order_metric' )
+def order_metric( query, granularity, reduce_points ):
+    import plotly.express as px
     
             
     # Order Matric
-    # Fazer um contagem da colunas “ID” agrupado “Order Date” e usar uma bibliotecas de visualização para mostrar o gráfico de barras.
-    # colunas
-    cols = ['ID' , 'Order_Date']
-    df_aux = df1.loc[: , cols].groupby('Order_Date').count().reset_index()
+    # Fazer um contagem dos pedidos agrupado “Order Date” e usar uma bibliotecas de visualização para mostrar o gráfico de barras.
+    # Os dias são somados por dia, semana ou mês ('auto': o menor período com
+    # até MAX_POINTS barras no intervalo de datas). Para limitar as barras, o
+    # período passa a ser um maior (cap_granularity): as barras são
+    # contagens e nenhuma pode ser descartada.
+    df_day = query.summarize( 'Order_Date' )
+    if reduce_points:
+        granularity = cap_granularity( df_day['Order_Date'], granularity )
+    df_aux, granularity = bucket_sum( df_day['Order_Date'], df_day['count'], granularity )
+    df_aux.columns = ['Order_Date', 'ID']
+    
     # desenhar o gráfico de colunas
     fig = px.bar(df_aux, x= 'Order_Date' , y= 'ID')
-    st.plotly_chart( fig, use_container_width = True )
     
     return fig
 
 
 
-def clean_code( df1 ):
-    
-    """ Essa função tem a responsabilidade de limpar o dataframe
-         Tipos de limpeza:
-         1. Remoção dos dados NaN
-         2. Mudança do tipo da coluna de dados
-         3. Remoção dos espaços das variáveis de texto
-         4. Formatação da coluna de datas
-         5. Limpeza da coluna de tempo (remoção do texto da variável numérica)
-         
-         Input: Dataframe
-         Output: Dataframe
-     
-    """
-    # Eliminar linhas com NaN
-    # linhas_selecionadas = (df1['Delivery_person_Age'] != 'NaN ')
-    linhas_selecionadas = ((df1['Delivery_person_Age'] != 'NaN ') & (df1['Delivery_person_Ratings'] 
-                          != 'NaN ') & (df1['Delivery_person_ID'] != 'NaN ') & (df1['Road_traffic_density'] 
-                          != 'NaN ') & (df1['City'] != 'NaN ') &  (df1['Festival'] != 'NaN ') )
-    
-    df1 = df1.loc[linhas_selecionadas , :].copy()
-    
-    # 1. Converter a coluna Age de texto para número inteiro
-    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype(int)
-    
-    # 2. Converter a coluna Ratings de texto para número decimal (float)
-    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype(float)
-    
-    
-    # 3. Converter a coluna Order_date de texto para data
-    df1['Order_Date'] = pd.to_datetime( df1['Order_Date'], format = '%d-%m-%Y')
-    
-    
-    # 4. Converter a coluna Multiple_deliveries de texto para número inteiro
-    linhas_selecionadas = (df1['multiple_deliveries'] != 'NaN ')
-    df1 = df1.loc[linhas_selecionadas , :].copy()
-    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype(int)
-    
-    # 5. Removendo os espacos dentro de strings/text/objects
-        # antes é necessário fazer um reset do index
-        # drop = True é para não criar uma coluna com cabeçalho "Index"
-    #df1 = df1.reset_index(drop = True)
-    # Percorrer cada linha para retirar os espaços
-    #for i in range(len(df1)):
-    #  df1.loc[i, 'ID'] = df1.loc[i, 'ID'].strip()
-    
-    # 6. Removendo os espacos dentro de strings/text/objects (método sem usar 'for')
-    #(mais rápido)
-    df1.loc[:,'ID'] = df1.loc[:,'ID'].str.strip()
-    df1.loc[:,'Road_traffic_density'] = df1.loc[:,'Road_traffic_density'].str.strip()
-    df1.loc[:,'Type_of_order'] = df1.loc[:,'Type_of_order'].str.strip()
-    df1.loc[:,'Type_of_vehicle'] = df1.loc[:,'Type_of_vehicle'].str.strip()
-    df1.loc[:,'City'] = df1.loc[:,'City'].str.strip()
-    df1.loc[:,'Festival'] = df1.loc[:,'Festival'].str.strip()
-    
-    # 7. Limpando a coluna de time taken
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].apply( lambda x: x.split( '(min) ')[1])
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].astype(int)
-    
-    return df1
-
 # -------------------------------------------- Início da estrutura lógica do código -----------------------------------------------
 
-# import dataset
-df = pd.read_csv( r'dataset/train.csv' )
+# import dataset (limpo, em cache e indexado para os filtros, compartilhado entre as páginas)
+with timer( 'load' ):
+    order_index = load_index()
+    # Índice espacial (restaurantes e locais de entrega) montado junto com o
+    # OrderIndex, e não na primeira consulta do mapa de restaurantes
+    load_spatial()
 
-df1 = clean_code(df)
+    # Cubo de agregados (com os pedidos da pasta dataset/incoming, se ela existir)
+    live = live_orders()
+    # (cubo e revisão lidos juntos: a revisão entra na chave do cache compartilhado)
+    cube, live_revision = live.state() if live is not None else ( load_cube(), None )
 
 
 
@@ -209,8 +208,8 @@ st.header('Marketplace - Visão Cliente')
 
 #image_path = r'C:\Users\Ricardo\Documents\data_science\repos\ftc\logo.png'
 #image = Image.open( image_path )
-image = Image.open( 'logo.png' )
-st.sidebar.image(image, width=120)
+# logo decodificado e redimensionado uma vez por processo (utils.assets)
+st.sidebar.image( logo(), width=LOGO_WIDTH )
 
 
 st.sidebar.markdown('# Cury Company')
@@ -233,16 +232,37 @@ traffic_options = st.sidebar.multiselect(
     ['Low', 'Medius',  'High', 'Jam'],
     default =  ['Low', 'Medius',  'High', 'Jam'] )
 
+st.sidebar.markdown( """___""")
+
+st.sidebar.markdown( '## Gráficos por data' )
+granularity = GRANULARITIES[st.sidebar.selectbox( 'Agrupar pedidos por', list( GRANULARITIES ) )]
+reduce_points = st.sidebar.checkbox( 'Limitar pontos das séries (mantendo o formato)' )
+
 st.sidebar.markdown( """___""")
 st.sidebar.markdown( '### Powered by Comunidade DS')
 
-#Filtro de Data
-lihas_selecionadas = df1['Order_Date'] < date_slider
-df1 = df1.loc[lihas_selecionadas, :]
+with timer( 'filters' ):
+    # Resultados destes filtros compartilhados entre as páginas e as sessões
+    # (utils.memo): outra página com os mesmos filtros já pode ter calculado
+    shared = filter_memo( date_slider, traffic_options, live_revision )
+
+    #Filtros de data (busca binária nas datas ordenadas) e de trânsito (bitmaps)
+    df1 = shared.get( 'select', order_index.select, date_slider, Road_traffic_density=traffic_options )
+
+    #Filtros de data e trânsito aplicados no cubo
+    cube = shared.get( 'filter_cube', filter_cube, cube, date_slider, traffic_options )
 
-#Filtro de trânsito
-lihas_selecionadas = df1['Road_traffic_density'].isin( traffic_options )
-df1 = df1.loc[lihas_selecionadas, :]
+    # Consultas dos gráficos: pandas (cubo) ou duckdb (snapshot), conforme a
+    # configuração da página (utils.query)
+    query = open_query( 'visao_empresa', cube, date_slider, traffic_options, live=live is not None, memo=shared )
+
+# Resultados pré-calculados para estes filtros (python -m utils.precompute), se
+# existirem; sem eles, cada gráfico é calculado na hora. Não valem com pedidos
+# novos na pasta de ingestão. Os resultados calculados ficam no cache
+# compartilhado (shared), indexado pela versão do dataset, pela revisão dos
+# pedidos ingeridos e pelos filtros: voltar para uma aba ou filtro já visto
+# não recalcula, e pedidos novos geram resultados novos.
+views = page_views( 'visao_empresa', date_slider, traffic_options, enabled=live is None, shared=shared )
 
 
 
@@ -250,13 +270,15 @@ df1 = df1.loc[lihas_selecionadas, :]
 # LAYOUT NO STREAMLIT
 # ====================================================================
 
-tab1, tab2, tab3 = st.tabs( ['Visão Gerencial', 'Visão Tática', 'Visão Geográfica'] )
+# Só a aba escolhida é calculada (utils.sections)
+tabs = lazy_tabs( ['Visão Gerencial', 'Visão Tática', 'Visão Geográfica'], key='empresa_tab' )
 
-with tab1:
+if tabs.show( 'Visão Gerencial' ):
     with st.container():
         # Order Metric
         st.markdown( '# Orders per day' )
-        fig = order_metric(df1)
+        fig = views.get( 'order_metric|{}|{}'.format( granularity, reduce_points ), order_metric, query, granularity, reduce_points )
+        st.plotly_chart( fig, use_container_width = True )
         
             
         
@@ -267,34 +289,44 @@ with tab1:
         with col1:
             
             st.header( 'Traffic Order Share' )
-            fig = traffic_order_share( df1 )
+            fig = views.get( 'traffic_order_share', traffic_order_share, query )
+            st.plotly_chart( fig, use_container_width = True )
               
                 
             
         
         with col2:
             st.header( 'Traffic Order City' )
-            fig = traffic_order_city( df1 )
+            fig = views.get( 'traffic_order_city', traffic_order_city, query )
+            st.plotly_chart( fig, use_container_width = True )
             
 
     
     
     
-with tab2:
+if tabs.show( 'Visão Tática' ):
     with st.container():
         st.markdown( "# Order per week" )
-        fig = order_per_week( df1 )
+        fig = views.get( 'order_per_week|{}'.format( reduce_points ), order_per_week, query, reduce_points )
+        st.plotly_chart( fig, use_container_width = True )
         
     
 
     with st.container():
         st.markdown( "# Order Share per week" )
-        fig = order_share_per_week( df1 )
+        fig = views.get( 'order_share_per_week', order_share_per_week, df1 )
+        st.plotly_chart( fig, use_container_width = True )
                
 
       
     
     
-with tab3:
+if tabs.show( 'Visão Geográfica' ):
     st.markdown( "# Country Map" )
-    country_maps( df1 )
+    map_mode = st.radio( 'Pontos no mapa', ['Mediana por cidade', 'Locais de entrega', 'Restaurantes'], horizontal=True )
+    html = views.get( 'country_maps|' + map_mode, country_maps, df1, map_mode )
+    components.html( html, width = 1024 , height = 610 )
+
+
+
+rerun.finish()
@@ -1,106 +1,41 @@
-# Libraries
-from haversine import haversine
-import plotly.express as px
-import plotly.graph_objects as go
-
 # bibliotecas necessárias
 import pandas as pd
 import streamlit as st
-from PIL import Image
-import folium
-from streamlit_folium import folium_static
+
+from utils.assets import LOGO_WIDTH, logo
+from utils.couriers import SORTS, CourierRatings, top_couriers
+from utils.cube import filter_cube, load_cube
+from utils.index import load_index
+from utils.ingest import live_orders
+from utils.memo import filter_memo
+from utils.kpis import KPI, compute_kpis
+from utils.precompute import page_views
+from utils.query import open_query
+from utils.sections import lazy_tabs
+from utils.timing import page_run, timer
 
 st.set_page_config( page_title='Visão Entregadores', page_icon='🚚', layout='wide' )
 
-# ==========================================
-# Funções
-# ==========================================
-
-def top_delivers( df1 , top_asc ):
-    
-    df2 = ( df1.loc[:, ['Delivery_person_ID' , 'Time_taken(min)' , 'City']]
-       .groupby(['City' , 'Delivery_person_ID']).max()
-       .sort_values(['City' , 'Time_taken(min)'], ascending=top_asc)
-       .reset_index() )
-    
-    df_aux01 = df2.loc[df2['City'] == 'Metropolitian' , :].head(10)
-    df_aux02 = df2.loc[df2['City'] == 'Urban' , :].head(10)
-    df_aux03 = df2.loc[df2['City'] == 'Semi-Urban' , :].head(10)
-
-    df3 = pd.concat([df_aux01 , df_aux02, df_aux03] ).reset_index(drop=True)
-    
-    return df3
-
-
-
-
-def clean_code( df1 ):
-    
-    """ Essa função tem a responsabilidade de limpar o dataframe
-         Tipos de limpeza:
-         1. Remoção dos dados NaN
-         2. Mudança do tipo da coluna de dados
-         3. Remoção dos espaços das variáveis de texto
-         4. Formatação da coluna de datas
-         5. Limpeza da coluna de tempo (remoção do texto da variável numérica)
-         
-         Input: Dataframe
-         Output: Dataframe
-     
-    """
-    # Eliminar linhas com NaN
-    # linhas_selecionadas = (df1['Delivery_person_Age'] != 'NaN ')
-    linhas_selecionadas = ((df1['Delivery_person_Age'] != 'NaN ') & (df1['Delivery_person_Ratings'] 
-                          != 'NaN ') & (df1['Delivery_person_ID'] != 'NaN ') & (df1['Road_traffic_density'] 
-                          != 'NaN ') & (df1['City'] != 'NaN ') &  (df1['Festival'] != 'NaN ') )
-    
-    df1 = df1.loc[linhas_selecionadas , :].copy()
-    
-    # 1. Converter a coluna Age de texto para número inteiro
-    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype(int)
-    
-    # 2. Converter a coluna Ratings de texto para número decimal (float)
-    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype(float)
-    
-    
-    # 3. Converter a coluna Order_date de texto para data
-    df1['Order_Date'] = pd.to_datetime( df1['Order_Date'], format = '%d-%m-%Y')
-    
-    
-    # 4. Converter a coluna Multiple_deliveries de texto para número inteiro
-    linhas_selecionadas = (df1['multiple_deliveries'] != 'NaN ')
-    df1 = df1.loc[linhas_selecionadas , :].copy()
-    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype(int)
-    
-    # 5. Removendo os espacos dentro de strings/text/objects
-        # antes é necessário fazer um reset do index
-        # drop = True é para não criar uma coluna com cabeçalho "Index"
-    #df1 = df1.reset_index(drop = True)
-    # Percorrer cada linha para retirar os espaços
-    #for i in range(len(df1)):
-    #  df1.loc[i, 'ID'] = df1.loc[i, 'ID'].strip()
-    
-    # 6. Removendo os espacos dentro de strings/text/objects (método sem usar 'for')
-    #(mais rápido)
-    df1.loc[:,'ID'] = df1.loc[:,'ID'].str.strip()
-    df1.loc[:,'Road_traffic_density'] = df1.loc[:,'Road_traffic_density'].str.strip()
-    df1.loc[:,'Type_of_order'] = df1.loc[:,'Type_of_order'].str.strip()
-    df1.loc[:,'Type_of_vehicle'] = df1.loc[:,'Type_of_vehicle'].str.strip()
-    df1.loc[:,'City'] = df1.loc[:,'City'].str.strip()
-    df1.loc[:,'Festival'] = df1.loc[:,'Festival'].str.strip()
-    
-    # 7. Limpando a coluna de time taken
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].apply( lambda x: x.split( '(min) ')[1])
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].astype(int)
-    
-    return df1
+# Tempos por etapa (ligado com CURRY_TIMING=1)
+rerun = page_run( 'visao_entregadores' )
+
+# Cartões da Visão Gerencial: {nome: KPI( função, coluna )}
+KPIS = { 'maior_idade': KPI( 'max', 'Delivery_person_Age' ),
+         'menor_idade': KPI( 'min', 'Delivery_person_Age' ),
+         'melhor_condicao': KPI( 'max', 'Vehicle_condition' ),
+         'pior_condicao': KPI( 'min', 'Vehicle_condition' ) }
 
 # -------------------------------------------- Início da estrutura lógica do código -----------------------------------------------
 
 
-# import dataset
-df = pd.read_csv( r'dataset/train.csv' )
-df1 = clean_code( df )
+# import dataset (limpo, em cache e indexado para os filtros, compartilhado entre as páginas)
+with timer( 'load' ):
+    order_index = load_index()
+
+    # Cubo de agregados (com os pedidos da pasta dataset/incoming, se ela existir)
+    live = live_orders()
+    # (cubo e revisão lidos juntos: a revisão entra na chave do cache compartilhado)
+    cube, live_revision = live.state() if live is not None else ( load_cube(), None )
 
 
 
@@ -116,8 +51,8 @@ st.header('Marketplace - Visão Entregadores')
 
 #image_path = r'C:\Users\Ricardo\Documents\data_science\repos\ftc\logo.png'
 #image = Image.open( image_path )
-image = Image.open( 'logo.png' )
-st.sidebar.image(image, width=120)
+# logo decodificado e redimensionado uma vez por processo (utils.assets)
+st.sidebar.image( logo(), width=LOGO_WIDTH )
 
 
 st.sidebar.markdown('# Cury Company')
@@ -143,45 +78,61 @@ traffic_options = st.sidebar.multiselect(
 st.sidebar.markdown( """___""")
 st.sidebar.markdown( '### Powered by Comunidade DS')
 
-#Filtro de Data
-lihas_selecionadas = df1['Order_Date'] < date_slider
-df1 = df1.loc[lihas_selecionadas, :]
+with timer( 'filters' ):
+    # Resultados destes filtros compartilhados entre as páginas e as sessões
+    # (utils.memo): outra página com os mesmos filtros já pode ter calculado
+    shared = filter_memo( date_slider, traffic_options, live_revision )
+
+    #Filtros de data (busca binária nas datas ordenadas) e de trânsito (bitmaps)
+    df1 = shared.get( 'select', order_index.select, date_slider, Road_traffic_density=traffic_options )
+
+    #Filtros de data e trânsito aplicados no cubo
+    cube = shared.get( 'filter_cube', filter_cube, cube, date_slider, traffic_options )
 
-#Filtro de trânsito
-lihas_selecionadas = df1['Road_traffic_density'].isin( traffic_options )
-df1 = df1.loc[lihas_selecionadas, :]
+    # Consultas dos gráficos: pandas (cubo) ou duckdb (snapshot), conforme a
+    # configuração da página (utils.query)
+    query = open_query( 'visao_entregadores', cube, date_slider, traffic_options, live=live is not None, memo=shared )
+
+# Resultados pré-calculados para estes filtros (python -m utils.precompute), se
+# existirem; sem eles, cada tabela é calculada na hora. Não valem com pedidos
+# novos na pasta de ingestão. Os resultados calculados ficam no cache
+# compartilhado (shared), indexado pela versão do dataset, pela revisão dos
+# pedidos ingeridos e pelos filtros: voltar para uma aba ou filtro já visto
+# não recalcula, e pedidos novos geram resultados novos.
+views = page_views( 'visao_entregadores', date_slider, traffic_options, enabled=live is None, shared=shared )
 
 
 # ====================================================================
 # LAYOUT NO STREAMLIT
 # ====================================================================
 
-tab1, tab2, tab3 = st.tabs( ['Visão Gerencial', '___', '___'] )
+# Só a aba escolhida é calculada (utils.sections)
+tabs = lazy_tabs( ['Visão Gerencial', '___', '___'], key='entregadores_tab' )
 
-with tab1:
+if tabs.show( 'Visão Gerencial' ):
     with st.container():
         st.title('Overal Metrics')
         
         col1, col2, col3, col4 = st.columns(4, gap = 'large')
+        # Todos os cartões saem de uma única passada (utils.kpis)
+        with timer( 'entregadores.kpis' ):
+            kpis = views.get( 'kpis', compute_kpis, KPIS, df1 )
+
         with col1:
             # A maior idade dos entregadores:
-            maior_idade = df1.loc[: ,'Delivery_person_Age' ].max()
-            col1.metric( 'Maior Idade', maior_idade )
+            col1.metric( 'Maior Idade', kpis['maior_idade'] )
             
         with col2:
             # A menor idade dos entregadores:
-            menor_idade = df1.loc[: ,'Delivery_person_Age' ].min()
-            col2.metric( 'Menor Idade', menor_idade )
+            col2.metric( 'Menor Idade', kpis['menor_idade'] )
             
         with col3:
             # A melhor condição de veículos:
-            melhor_condicao = df1.loc[: ,'Vehicle_condition' ].max()
-            col3.metric( 'Melhor Condição', melhor_condicao)
+            col3.metric( 'Melhor Condição', kpis['melhor_condicao'] )
             
         with col4:
             # A pior condição de veículos:
-            pior_condicao = df1.loc[: ,'Vehicle_condition' ].min()
-            col4.metric( 'Pior Condição', pior_condicao )
+            col4.metric( 'Pior Condição', kpis['pior_condicao'] )
             
             
     with st.container():
@@ -191,20 +142,31 @@ with tab1:
         col1, col2 = st.columns(2)
         with col1:
             st.markdown( '##### Avaliacao medias por entregadores' )
-            df_aux = (df1.loc[:, ['Delivery_person_ID' , 'Delivery_person_Ratings']]
-                      .groupby('Delivery_person_ID')
-                      .mean().reset_index() )
-            st.dataframe( df_aux )
+            # Tabela completa no servidor; só a página visível vai para o navegador
+            with timer( 'entregadores.ratings_by_courier' ):
+                ratings = views.get( 'ratings_by_courier', CourierRatings, df1 )
+            
+            busca = st.text_input( 'Buscar entregador pelo ID', key='ratings_search' )
+            if busca.strip():
+                df_aux = ratings.lookup( busca )
+                if df_aux.empty:
+                    st.caption( 'Entregador não encontrado' )
+            else:
+                ordem = st.selectbox( 'Ordenar por', list( SORTS ), key='ratings_sort' )
+                pagina = st.number_input( 'Página', min_value=1, max_value=ratings.pages(), value=1, step=1, key='ratings_page' )
+                df_aux = ratings.page( ordem, int( pagina ) )
+                st.caption( 'Página {} de {} ({} entregadores)'.format( int( pagina ), ratings.pages(), len( ratings ) ) )
+            
+            st.dataframe( df_aux.reset_index( drop=True ) )
                 
                 
                 
         with col2:
             st.markdown( '##### Avaliacao media por transito' )
             # A avaliação média por tipo de tráfego:
-            # A média e desvio padrão por tipo de tráfego:
-            df_aux01 = (df1.loc[:, ['Delivery_person_Ratings' , 'Road_traffic_density']]
-                        .groupby('Road_traffic_density')
-                        .agg({'Delivery_person_Ratings' : ['mean' , 'std']}).reset_index())
+            # A média e desvio padrão por tipo de tráfego (a partir do cubo):
+            df_aux01 = ( query.summarize( 'Road_traffic_density', value='Delivery_person_Ratings' )
+                        .loc[:, ['Road_traffic_density', 'avg', 'std']] )
 
             # Usar o comando .columns para renomear as colunas
             df_aux01.columns = ['Delivery_person_Ratings','delivery_mean' , 'delivery_std']
@@ -214,10 +176,9 @@ with tab1:
             
                        
             st.markdown( '##### Avaliacao media por clima' )
-            # A avaliação média por tipo de condição climática:
-            df_aux01 = (df1.loc[:, ['Delivery_person_Ratings' , 'Weatherconditions']]
-                        .groupby('Weatherconditions')
-                        .agg({'Delivery_person_Ratings' : ['mean' , 'std']}).reset_index())
+            # A avaliação média por tipo de condição climática (a partir do cubo):
+            df_aux01 = ( query.summarize( 'Weatherconditions', value='Delivery_person_Ratings' )
+                        .loc[:, ['Weatherconditions', 'avg', 'std']] )
 
             # Usar o comando .columns para renomear as colunas
             df_aux01.columns = ['Weatherconditions' ,'delivery_mean' , 'delivery_std']
@@ -237,13 +198,18 @@ with tab1:
         
         with col1:
             st.markdown( '##### Top Entregadores Mais Rápidos' )
-            df3 = top_delivers( df1, top_asc=True )
-            st.dataframe( df3 )
+            # Mais rápidos e mais lentos de cada cidade, calculados juntos
+            with timer( 'entregadores.top_couriers' ):
+                fastest, slowest = views.get( 'top_couriers', top_couriers, df1, k=10 )
+            st.dataframe( fastest )
             
             
             
             
         with col2:
             st.markdown( '##### Top Entregadores Mais Lentos' )
-            df3 = top_delivers( df1, top_asc=False )
-            st.dataframe( df3 )
\ No newline at end of file
+            st.dataframe( slowest )
+
+
+
+rerun.finish()
@@ -1,47 +1,53 @@
 # Libraries
-from haversine import haversine
-import plotly.express as px
-import plotly.graph_objects as go
+# (plotly é importado nas funções que desenham os gráficos)
 
 # bibliotecas necessárias
 import pandas as pd
 import numpy as np
 import streamlit as st
-from PIL import Image
-import folium
-from streamlit_folium import folium_static
+
+from utils.assets import LOGO_WIDTH, logo
+from utils.cube import filter_cube, load_cube
+from utils.index import load_index
+from utils.ingest import live_orders
+from utils.memo import filter_memo
+from utils.kpis import KPI, compute_kpis, kpi_columns
+from utils.precompute import page_views
+from utils.query import open_query
+from utils.sections import lazy_tabs
+from utils.timing import page_run, timed, timer
 
 st.set_page_config( page_title='Visão Restaurantes', page_icon='🍽️', layout='wide' )
 
+# Tempos por etapa (ligado com CURRY_TIMING=1)
+rerun = page_run( 'visao_restaurantes' )
+
 # ==========================================
 # Funções
 # ==========================================
 
-def avg_std_time_on_traffic( df1 ):
-    # Colunas envolvidas no cálculo do tempo médio de entrega e desvio padrão de entrega por cidade e tipo de tráfego:
-    cols = ['City' , 'Time_taken(min)', 'Road_traffic_density']
-
-    df_aux = df1.loc[:, cols].groupby( ['City' , 'Road_traffic_density'] ).agg( {'Time_taken(min)': ['mean' , 'std'] })
-    df_aux.columns = ['avg_time' , 'std_time']
-    df_aux = df_aux.reset_index()
+@timed( 'restaurantes.avg_std_time_on_traffic' )
+def avg_std_time_on_traffic( query ):
+    import plotly.express as px
+    # Tempo médio de entrega e desvio padrão de entrega por cidade e tipo de tráfego (a partir do cubo):
+    df_aux = query.summarize( ['City' , 'Road_traffic_density'] ).loc[:, ['City' , 'Road_traffic_density', 'avg', 'std']]
+    df_aux.columns = ['City' , 'Road_traffic_density', 'avg_time' , 'std_time']
 
 
     fig = px.sunburst( df_aux, path=['City' , 'Road_traffic_density'], values='avg_time',
                      color= 'std_time', color_continuous_scale= 'RdBu',
                      color_continuous_midpoint=np.average(df_aux['std_time']))
 
-    st.plotly_chart( fig )
-
     return fig
 
 
 
-def avg_std_time_graph( df1 ):
-    # Colunas envolvidas no cálculo do tempo médio de entrega e desvio padrão de entrega por cidade:
-    cols = ['City' , 'Time_taken(min)' ]
-    df_aux = df1.loc[:, cols].groupby( 'City' ).agg( {'Time_taken(min)': ['mean' , 'std'] })
-    df_aux.columns = ['avg_time' , 'std_time']
-    df_aux = df_aux.reset_index()
+@timed( 'restaurantes.avg_std_time_graph' )
+def avg_std_time_graph( query ):
+    import plotly.graph_objects as go
+    # Tempo médio de entrega e desvio padrão de entrega por cidade (a partir do cubo):
+    df_aux = query.summarize( 'City' ).loc[:, ['City', 'avg', 'std']]
+    df_aux.columns = ['City', 'avg_time' , 'std_time']
 
 
     fig = go.Figure()
@@ -49,152 +55,63 @@ def avg_std_time_graph( df1 ):
                          error_y=dict( type='data', array=df_aux['std_time'])) )
 
     fig.update_layout(barmode='group')
-    st.plotly_chart( fig )
 
     return fig
 
 
 
-def avg_std_time_delivery( df1, festival, op ):
-    """
-    Esta função calcula o tempo médio e o desvio padrão do tempo de entrega.
-    Parâmetros:
-        Input:
-            - df: Dataframe com os dados necessários para o cálculo.
-            - op: Tidpo de operação que precisa ser calculado.
-                'avg_time': Calcula o tempo médio.
-                'std_time': Calcula o desvio padrão do tempo
-        Output:
-            - df: Dataframe com 2 colunas e 1 linha.
-        
-    """
-        
-    cols = ['Time_taken(min)', 'Festival']
-    df_aux = ( df1.loc[:, cols].groupby( 'Festival' ).agg( {'Time_taken(min)': ['mean' , 'std'] }) )
-    df_aux.columns = ['avg_time' , 'std_time']
-    df_aux = df_aux.reset_index()
-    linhas_selecionadas = df_aux['Festival'] == festival
-    df_aux = np.round(df_aux.loc[linhas_selecionadas , op] , 2)
-        
-    return df_aux
-
-
-def distance( df1 , fig ):
+@timed( 'restaurantes.distance' )
+def distance( query , fig ):
+    # A distância (haversine entre restaurante e local de entrega, em km) já vem
+    # calculada pelo carregamento dos dados
+    avg_distance = query.summarize( 'City', value='distance' )
     if fig == False:
-        cols = ['Delivery_location_latitude' , 'Delivery_location_longitude' , 'Restaurant_latitude' , 'Restaurant_longitude']
-        # Comando para calcular distâncias a partir das latitudes e longitudes:
-        # haversine((latitude, longitude), (latitude, longitude) )
-        # A distancia calculada fica armazenada numa nova coluna chamada 'distance'
-        df1['distance'] = df1.loc[: , cols].apply( lambda x: 
-                                   haversine( (x['Restaurant_latitude'] , x['Restaurant_longitude']), 
-                                              (x['Delivery_location_latitude'] , x['Delivery_location_longitude'] )), axis=1)
-        avg_distance = np.round(df1['distance'].mean() , 2)
+        # Média geral: médias das cidades ponderadas pelo número de pedidos
+        avg_distance = np.round( ( avg_distance['avg'] * avg_distance['count'] ).sum() / avg_distance['count'].sum() , 2)
             
         return avg_distance
             
     else:
-        cols = ['Delivery_location_latitude' , 'Delivery_location_longitude' , 'Restaurant_latitude' , 'Restaurant_longitude']
-        # Comando para calcular distâncias a partir das latitudes e longitudes:
-        # haversine((latitude, longitude), (latitude, longitude) )
-        # A distancia calculada fica armazenada numa nova coluna chamada 'distance'
-        df1['distance'] = df1.loc[: , cols].apply( lambda x: 
-                                   haversine( (x['Restaurant_latitude'] , x['Restaurant_longitude']), 
-                                              (x['Delivery_location_latitude'] , x['Delivery_location_longitude'] )), axis=1)
-            
+        import plotly.graph_objects as go
 
-        avg_distance = df1.loc[:, ['City', 'distance']].groupby( 'City' ).mean().reset_index()
+        avg_distance = avg_distance.loc[:, ['City', 'avg']]
+        avg_distance.columns = ['City', 'distance']
         fig = go.Figure( data=[ go.Pie( labels = avg_distance['City'], values=avg_distance['distance'] , pull = [0.05, 0.05, 0] ) ] )   
             
         return fig
 
 
 
-def top_delivers( df1 , top_asc ):
-    
-    df2 = ( df1.loc[:, ['Delivery_person_ID' , 'Time_taken(min)' , 'City']]
-       .groupby(['City' , 'Delivery_person_ID']).max()
-       .sort_values(['City' , 'Time_taken(min)'], ascending=top_asc)
-       .reset_index() )
-    
-    df_aux01 = df2.loc[df2['City'] == 'Metropolitian' , :].head(10)
-    df_aux02 = df2.loc[df2['City'] == 'Urban' , :].head(10)
-    df_aux03 = df2.loc[df2['City'] == 'Semi-Urban' , :].head(10)
-
-    df3 = pd.concat([df_aux01 , df_aux02, df_aux03] ).reset_index(drop=True)
-    
-    return df3
-
-
-
-
-def clean_code( df1 ):
-    
-    """ Essa função tem a responsabilidade de limpar o dataframe
-         Tipos de limpeza:
-         1. Remoção dos dados NaN
-         2. Mudança do tipo da coluna de dados
-         3. Remoção dos espaços das variáveis de texto
-         4. Formatação da coluna de datas
-         5. Limpeza da coluna de tempo (remoção do texto da variável numérica)
-         
-         Input: Dataframe
-         Output: Dataframe
-     
-    """
-    # Eliminar linhas com NaN
-    # linhas_selecionadas = (df1['Delivery_person_Age'] != 'NaN ')
-    linhas_selecionadas = ((df1['Delivery_person_Age'] != 'NaN ') & (df1['Delivery_person_Ratings'] 
-                          != 'NaN ') & (df1['Delivery_person_ID'] != 'NaN ') & (df1['Road_traffic_density'] 
-                          != 'NaN ') & (df1['City'] != 'NaN ') &  (df1['Festival'] != 'NaN ') )
-    
-    df1 = df1.loc[linhas_selecionadas , :].copy()
-    
-    # 1. Converter a coluna Age de texto para número inteiro
-    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype(int)
-    
-    # 2. Converter a coluna Ratings de texto para número decimal (float)
-    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype(float)
-    
-    
-    # 3. Converter a coluna Order_date de texto para data
-    df1['Order_Date'] = pd.to_datetime( df1['Order_Date'], format = '%d-%m-%Y')
-    
-    
-    # 4. Converter a coluna Multiple_deliveries de texto para número inteiro
-    linhas_selecionadas = (df1['multiple_deliveries'] != 'NaN ')
-    df1 = df1.loc[linhas_selecionadas , :].copy()
-    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype(int)
-    
-    # 5. Removendo os espacos dentro de strings/text/objects
-        # antes é necessário fazer um reset do index
-        # drop = True é para não criar uma coluna com cabeçalho "Index"
-    #df1 = df1.reset_index(drop = True)
-    # Percorrer cada linha para retirar os espaços
-    #for i in range(len(df1)):
-    #  df1.loc[i, 'ID'] = df1.loc[i, 'ID'].strip()
-    
-    # 6. Removendo os espacos dentro de strings/text/objects (método sem usar 'for')
-    #(mais rápido)
-    df1.loc[:,'ID'] = df1.loc[:,'ID'].str.strip()
-    df1.loc[:,'Road_traffic_density'] = df1.loc[:,'Road_traffic_density'].str.strip()
-    df1.loc[:,'Type_of_order'] = df1.loc[:,'Type_of_order'].str.strip()
-    df1.loc[:,'Type_of_vehicle'] = df1.loc[:,'Type_of_vehicle'].str.strip()
-    df1.loc[:,'City'] = df1.loc[:,'City'].str.strip()
-    df1.loc[:,'Festival'] = df1.loc[:,'Festival'].str.strip()
-    
-    # 7. Limpando a coluna de time taken
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].apply( lambda x: x.split( '(min) ')[1])
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].astype(int)
-    
-    return df1
+# Cartões da Visão Gerencial: {nome: KPI( função, coluna, filtro, casas decimais )}
+KPIS = { 'deliverymen_unique': KPI( 'nunique', 'Delivery_person_ID' ),
+         'avg_distance': KPI( 'mean', 'distance', decimals=2 ),
+         'festival_avg_time': KPI( 'mean', 'Time_taken(min)', { 'Festival': 'Yes' }, 2 ),
+         'festival_std_time': KPI( 'std', 'Time_taken(min)', { 'Festival': 'Yes' }, 2 ),
+         'no_festival_avg_time': KPI( 'mean', 'Time_taken(min)', { 'Festival': 'No' }, 2 ),
+         'no_festival_std_time': KPI( 'std', 'Time_taken(min)', { 'Festival': 'No' }, 2 ) }
+
 
-# -------------------------------------------- Início da estrutura lógica do código -----------------------------------------------
 
-# import dataset
-df = pd.read_csv( r'dataset/train.csv' )
+def restaurant_kpis( df1, cube, live, live_revision, date_slider, traffic_options ):
+    # Com pedidos ingeridos, o cubo já os inclui: as linhas ingeridas também
+    # entram nos KPIs calculados pelas linhas (ex.: entregadores únicos)
+    ingested = None
+    if live is not None:
+        ingested = live.rows( live_revision, date_slider, traffic_options, kpi_columns( KPIS ) )
+    return compute_kpis( KPIS, df1, cube, ingested )
 
 
-df1 = clean_code( df )
+
+# -------------------------------------------- Início da estrutura lógica do código -----------------------------------------------
+
+# import dataset (limpo, em cache e indexado para os filtros, compartilhado entre as páginas)
+with timer( 'load' ):
+    order_index = load_index()
+
+    # Cubo de agregados (com os pedidos da pasta dataset/incoming, se ela existir)
+    live = live_orders()
+    # (cubo e revisão lidos juntos: a revisão entra na chave do cache compartilhado)
+    cube, live_revision = live.state() if live is not None else ( load_cube(), None )
 
 
 
@@ -209,8 +126,8 @@ st.header('Marketplace - Visão Entregadores')
 
 #image_path = r'C:\Users\Ricardo\Documents\data_science\repos\ftc\logo.png'
 #image = Image.open( image_path )
-image = Image.open( 'logo.png' )
-st.sidebar.image(image, width=120)
+# logo decodificado e redimensionado uma vez por processo (utils.assets)
+st.sidebar.image( logo(), width=LOGO_WIDTH )
 
 
 st.sidebar.markdown('# Cury Company')
@@ -236,59 +153,70 @@ traffic_options = st.sidebar.multiselect(
 st.sidebar.markdown( """___""")
 st.sidebar.markdown( '### Powered by Comunidade DS')
 
-#Filtro de Data
-lihas_selecionadas = df1['Order_Date'] < date_slider
-df1 = df1.loc[lihas_selecionadas, :]
+with timer( 'filters' ):
+    # Resultados destes filtros compartilhados entre as páginas e as sessões
+    # (utils.memo): outra página com os mesmos filtros já pode ter calculado
+    shared = filter_memo( date_slider, traffic_options, live_revision )
+
+    #Filtros de data (busca binária nas datas ordenadas) e de trânsito (bitmaps)
+    df1 = shared.get( 'select', order_index.select, date_slider, Road_traffic_density=traffic_options )
+
+    #Filtros de data e trânsito aplicados no cubo
+    cube = shared.get( 'filter_cube', filter_cube, cube, date_slider, traffic_options )
+
+    # Consultas dos gráficos: pandas (cubo) ou duckdb (snapshot), conforme a
+    # configuração da página (utils.query)
+    query = open_query( 'visao_restaurantes', cube, date_slider, traffic_options, live=live is not None, memo=shared )
 
-#Filtro de trânsito
-lihas_selecionadas = df1['Road_traffic_density'].isin( traffic_options )
-df1 = df1.loc[lihas_selecionadas, :]
+# Resultados pré-calculados para estes filtros (python -m utils.precompute), se
+# existirem; sem eles, cada gráfico é calculado na hora. Não valem com pedidos
+# novos na pasta de ingestão. Os resultados calculados ficam no cache
+# compartilhado (shared), indexado pela versão do dataset, pela revisão dos
+# pedidos ingeridos e pelos filtros: voltar para uma aba ou filtro já visto
+# não recalcula, e pedidos novos geram resultados novos.
+views = page_views( 'visao_restaurantes', date_slider, traffic_options, enabled=live is None, shared=shared )
 
 
 # ====================================================================
 # LAYOUT NO STREAMLIT
 # ====================================================================
-tab1, tab2, tab3 = st.tabs( ['Visão Gerencial', '__', '__'] )
+# Só a aba escolhida é calculada (utils.sections)
+tabs = lazy_tabs( ['Visão Gerencial', '__', '__'], key='restaurantes_tab' )
 
-with tab1:
+if tabs.show( 'Visão Gerencial' ):
     with st.container():
         st.title('Overal Metrics')
         
         col1, col2, col3, col4, col5, col6 = st.columns(6)
+        # Todos os cartões saem de uma única passada (utils.kpis)
+        with timer( 'restaurantes.kpis' ):
+            kpis = views.get( 'kpis', restaurant_kpis, df1, cube, live, live_revision, date_slider, traffic_options )
+
         with col1:
-            
-            deliverymen_unique = len( df1.loc[: , 'Delivery_person_ID'].unique() )
-            col1.metric( 'Entregadores únicos' ,deliverymen_unique )
+            col1.metric( 'Entregadores únicos' , kpis['deliverymen_unique'] )
 
         with col2:
-            avg_distance = distance( df1, fig=False)
-            col2.metric( 'Distância média das entregas' , avg_distance )
+            col2.metric( 'Distância média das entregas' , kpis['avg_distance'] )
    
 
 
         with col3:
-            df_aux = avg_std_time_delivery( df1, 'Yes', 'avg_time')              
-            col3.metric( 'Tempo médio de entrega com festival' , df_aux )
+            col3.metric( 'Tempo médio de entrega com festival' , kpis['festival_avg_time'] )
             
             
         with col4:
-            df_aux = avg_std_time_delivery( df1, 'Yes', 'std_time')       
-            col4.metric( 'STD de entrega com festival' , df_aux )
+            col4.metric( 'STD de entrega com festival' , kpis['festival_std_time'] )
              
             
             
         with col5:
-            
-            df_aux = avg_std_time_delivery( df1, 'No', 'avg_time')            
-            col5.metric( 'Tempo médio de entrega com festival' , df_aux )
+            col5.metric( 'Tempo médio de entrega com festival' , kpis['no_festival_avg_time'] )
             
             
             
             
         with col6:
-            
-            df_aux = avg_std_time_delivery( df1, 'No', 'std_time')             
-            col6.metric( 'STD de entrega com festival' , df_aux )
+            col6.metric( 'STD de entrega com festival' , kpis['no_festival_std_time'] )
             
         
         
@@ -298,17 +226,15 @@ with tab1:
         col1, col2 = st.columns(2)
         
         with col1:
-            fig = avg_std_time_graph( df1 )
+            fig = views.get( 'avg_std_time_graph', avg_std_time_graph, query )
+            st.plotly_chart( fig )
             
             
         with col2:
             
-            # Colunas envolvidas no cálculo do tempo médio de entrega e desvio padrão de entrega por cidade e tipo de pedido:
-            cols = ['City' , 'Time_taken(min)', 'Type_of_order']
-            
-            df_aux = df1.loc[:, cols].groupby( ['City' , 'Type_of_order'] ).agg( {'Time_taken(min)': ['mean' , 'std'] })
-            df_aux.columns = ['avg_time' , 'std_time']
-            df_aux = df_aux.reset_index()
+            # Tempo médio de entrega e desvio padrão de entrega por cidade e tipo de pedido (a partir do cubo):
+            df_aux = query.summarize( ['City' , 'Type_of_order'] ).loc[:, ['City' , 'Type_of_order', 'avg', 'std']]
+            df_aux.columns = ['City' , 'Type_of_order', 'avg_time' , 'std_time']
             st.dataframe(df_aux)
             
 
@@ -321,14 +247,19 @@ with tab1:
         
         with col1:
             # st.title('Distância média por Cidade')
-            fig = distance( df1, fig=True )
+            fig = views.get( 'distance', distance, query, fig=True )
             st.plotly_chart( fig )
             
                         
         
         with col2:
-            fig = avg_std_time_on_traffic( df1 )
+            fig = views.get( 'avg_std_time_on_traffic', avg_std_time_on_traffic, query )
+            st.plotly_chart( fig )
 
         
     with st.container():
         st.markdown("""___""")
+
+
+
+rerun.finish()
@@ -0,0 +1,6 @@
+# Libraries
+import os
+import sys
+
+# Os testes importam os módulos do projeto (utils, benchmarks) a partir da raiz
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
@@ -0,0 +1,64 @@
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.generator import generate_orders
+from benchmarks.run import PAGES, page_functions
+from utils.chunked import aggregate_csv
+from utils.data import clean_code, read_orders
+
+# ==========================================
+# Agregados lidos em blocos x resultados das páginas em memória
+# ==========================================
+
+ROWS = 3000
+CHUNKSIZE = 250
+
+FILTERS = [ ( pd.Timestamp( 2022, 4, 13 ), ['Low', 'Medium', 'High', 'Jam'] ),
+            ( pd.Timestamp( 2022, 3, 15 ), ['Low', 'High'] ),
+            ( pd.Timestamp( 2022, 2, 20 ), ['Jam'] ) ]
+
+
+@pytest.fixture( scope='module' )
+def orders( tmp_path_factory ):
+    # csv sintético, o dataframe limpo inteiro e os agregados em blocos pequenos
+    path = tmp_path_factory.mktemp( 'chunked' ) / 'train.csv'
+    generate_orders( ROWS, seed=7 ).to_csv( path, index=False )
+    return clean_code( read_orders( str( path ) ) ), aggregate_csv( str( path ), chunksize=CHUNKSIZE )
+
+
+
+def select( df1, date_slider, traffic_options ):
+    # Filtros da barra lateral nas linhas
+    linhas_selecionadas = ( df1['Order_Date'] < date_slider ) & df1['Road_traffic_density'].isin( traffic_options )
+    return df1.loc[linhas_selecionadas, :]
+
+
+
+@pytest.mark.parametrize( 'date_slider, traffic_options', FILTERS )
+def test_order_share_per_week_matches_page( orders, date_slider, traffic_options ):
+    df1, aggregates = orders
+    fig = page_functions( PAGES[0] )['order_share_per_week']( select( df1, date_slider, traffic_options ) )
+
+    df_aux = aggregates.order_share_per_week( date_slider, traffic_options )
+    np.testing.assert_array_equal( pd.to_datetime( fig.data[0].x ), df_aux['Order_Date'] )
+    np.testing.assert_allclose( fig.data[0].y, df_aux['order_by_deliver'] )
+
+
+
+@pytest.mark.parametrize( 'date_slider, traffic_options', FILTERS )
+def test_orders_and_city_times_match_rows( orders, date_slider, traffic_options ):
+    df1, aggregates = orders
+    df1 = select( df1, date_slider, traffic_options )
+
+    per_day = df1.groupby( 'Order_Date' )['ID'].count()
+    df_aux = aggregates.orders_per_day( date_slider, traffic_options )
+    np.testing.assert_array_equal( df_aux['Order_Date'], per_day.index )
+    np.testing.assert_array_equal( df_aux['ID'], per_day.to_numpy() )
+
+    per_city = df1.groupby( 'City', observed=True )['Time_taken(min)'].agg( ['mean', 'std'] )
+    df_aux = aggregates.city_time_stats( date_slider, traffic_options ).set_index( 'City' )
+    np.testing.assert_allclose( df_aux.loc[per_city.index, 'avg_time'], per_city['mean'] )
+    np.testing.assert_allclose( df_aux.loc[per_city.index, 'std_time'], per_city['std'] )
+    assert len( df_aux ) == len( per_city )
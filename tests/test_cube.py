@@ -0,0 +1,127 @@
+# Libraries
+import io
+import logging
+import os
+
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.generator import generate_orders
+from utils.cube import CUBE_KEYS, CUBE_VALUES, RunningStats, summarize
+from utils.data import clean_code, read_orders
+from utils.ingest import LiveOrders
+from utils.kpis import KPI, compute_kpis, kpi_columns
+
+# ==========================================
+# Cubo acumulado lote a lote e ingestão da pasta incoming
+# ==========================================
+
+ROWS = 5000
+
+
+def orders_csv( rows, seed, start_id=0, header=True ):
+    # Pedidos sintéticos em texto, no formato do dataset/train.csv
+    return generate_orders( rows, seed=seed, start_id=start_id ).to_csv( index=False, header=header ).encode()
+
+
+
+def clean( data ):
+    return clean_code( read_orders( io.BytesIO( data ) ) )
+
+
+
+@pytest.fixture( scope='module' )
+def orders():
+    return clean( orders_csv( ROWS, seed=1 ) )
+
+
+
+def assert_same_cube( expected, result ):
+    # Mesmas células (em qualquer ordem) e mesmas estatísticas
+    pd.testing.assert_frame_equal( expected.sort_index(), result.sort_index(), check_exact=False, rtol=1e-12 )
+
+
+
+def test_update_in_batches_matches_single_update( orders ):
+    expected = RunningStats( CUBE_KEYS, CUBE_VALUES ).update( orders ).table
+
+    stats = RunningStats( CUBE_KEYS, CUBE_VALUES )
+    rows = np.random.default_rng( 0 ).permutation( len( orders ) )
+    for part in np.array_split( rows, 7 ):
+        stats.update( orders.iloc[np.sort( part )] )
+
+    assert_same_cube( expected, stats.table )
+    for by in ['Order_Date', 'City', ['City', 'Festival']]:
+        pd.testing.assert_frame_equal( summarize( expected, by ), summarize( stats.table, by ),
+                                       check_exact=False, rtol=1e-9 )
+
+
+
+def test_table_is_not_changed_by_later_batches( orders ):
+    stats = RunningStats( CUBE_KEYS, CUBE_VALUES ).update( orders.iloc[:2000] )
+    stats.update( orders.iloc[2000:3000] )
+    table = stats.table
+    before = table.copy()
+
+    stats.update( orders.iloc[3000:] )
+
+    pd.testing.assert_frame_equal( table, before )
+    assert stats.table['Time_taken(min)|count'].sum() == len( orders )
+
+
+
+def test_live_orders_skips_malformed_batch( tmp_path, caplog ):
+    path = tmp_path / 'train.csv'
+    path.write_bytes( orders_csv( ROWS, seed=2 ) )
+    incoming = tmp_path / 'incoming'
+    incoming.mkdir()
+
+    live = LiveOrders( str( incoming ), str( path ) ).refresh()
+    total = live.cube['Time_taken(min)|count'].sum()
+
+    # Lote bom, lote malformado e lote bom no mesmo arquivo
+    first = orders_csv( 200, seed=3, start_id=ROWS )
+    last = orders_csv( 300, seed=4, start_id=ROWS + 200, header=False )
+    batch = incoming / 'orders.csv'
+    batch.write_bytes( first )
+    live.refresh()
+    with open( batch, 'ab' ) as f:
+        f.write( b'0xbad,x\n' )
+    with caplog.at_level( logging.WARNING, logger='utils.ingest' ):
+        live.refresh()
+    with open( batch, 'ab' ) as f:
+        f.write( last )
+    live.refresh()
+
+    assert len( live.rejected ) == 1
+    assert live.rejected[0][0] == str( batch )
+    assert 'Lote descartado' in caplog.text
+    assert live.offsets[str( batch )][0] == os.path.getsize( batch )
+
+    header = first.split( b'\n', 1 )[0] + b'\n'
+    added = len( clean( first ) ) + len( clean( header + last ) )
+    assert live.cube['Time_taken(min)|count'].sum() == total + added
+
+
+
+def test_live_kpis_use_ingested_rows( tmp_path ):
+    path = tmp_path / 'train.csv'
+    path.write_bytes( orders_csv( ROWS, seed=2 ) )
+    incoming = tmp_path / 'incoming'
+    incoming.mkdir()
+    batch = orders_csv( 300, seed=5, start_id=ROWS )
+    ( incoming / 'orders.csv' ).write_bytes( batch )
+
+    live = LiveOrders( str( incoming ), str( path ) ).refresh()
+    cube, revision = live.state()
+    kpis = { 'couriers': KPI( 'nunique', 'Delivery_person_ID' ),
+             'festival_time': KPI( 'mean', 'Time_taken(min)', { 'Festival': 'Yes' } ) }
+
+    # Todos os cartões (do cubo ou das linhas) contam o histórico e o lote
+    ingested = live.rows( revision, pd.Timestamp.max, ['Low', 'Medium', 'High', 'Jam'], kpi_columns( kpis ) )
+    result = compute_kpis( kpis, live.history, cube, ingested )
+    expected = compute_kpis( kpis, pd.concat( [ live.history, clean( batch ) ] ) )
+    assert len( ingested ) == len( clean( batch ) )
+    assert result == pytest.approx( expected )
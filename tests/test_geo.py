@@ -0,0 +1,52 @@
+# Libraries
+import numpy as np
+import pytest
+from haversine import haversine
+
+from utils.geo import haversine_np
+
+# ==========================================
+# haversine_np x haversine (linha a linha)
+# ==========================================
+
+# (lat1, lon1, lat2, lon2) em graus
+POINTS = [
+    # Coordenadas do dataset (restaurante e local de entrega)
+    ( 22.745049, 75.892471, 22.765049, 75.912471 ),
+    ( 12.913041, 77.683237, 13.043041, 77.813237 ),
+    ( -19.916681, -43.934493, -23.550520, -46.633309 ),
+    # Mesmo ponto
+    ( 22.745049, 75.892471, 22.745049, 75.892471 ),
+    ( 0.0, 0.0, 0.0, 0.0 ),
+    # Antípodas
+    ( 0.0, 0.0, 0.0, 180.0 ),
+    ( 45.0, 30.0, -45.0, -150.0 ),
+    ( 90.0, 0.0, -90.0, 0.0 ),
+    # Atravessando o antimeridiano
+    ( 10.0, 179.5, 10.0, -179.5 ),
+    ( -35.0, -179.9, -35.5, 179.9 ),
+    # Polos
+    ( 90.0, 0.0, 89.0, 120.0 ),
+    ( -90.0, 45.0, -90.0, -45.0 ),
+]
+
+
+@pytest.mark.parametrize( 'lat1, lon1, lat2, lon2', POINTS )
+def test_haversine_np_matches_haversine( lat1, lon1, lat2, lon2 ):
+    expected = haversine( ( lat1, lon1 ), ( lat2, lon2 ) )
+    result = haversine_np( lat1, lon1, lat2, lon2 )
+    assert result == pytest.approx( expected, rel=1e-9, abs=1e-9 )
+
+
+
+def test_haversine_np_arrays():
+    # Arrays inteiros dão o mesmo resultado que a chamada linha a linha
+    lat1, lon1, lat2, lon2 = np.array( POINTS ).T
+    expected = [ haversine( ( a, b ), ( c, d ) ) for a, b, c, d in POINTS ]
+    np.testing.assert_allclose( haversine_np( lat1, lon1, lat2, lon2 ), expected, rtol=1e-9, atol=1e-9 )
+
+
+
+def test_haversine_np_nan():
+    # Coordenada ausente dá distância ausente (a linha é descartada depois)
+    assert np.isnan( haversine_np( [np.nan], [75.0], [22.0], [75.0] ) ).all()
@@ -0,0 +1,20 @@
+# bibliotecas necessárias
+import pandas as pd
+
+from benchmarks.generator import generate_orders
+from utils.data import clean_code, read_orders
+from utils.parallel import read_clean_parallel
+
+# ==========================================
+# Limpeza em vários processos x caminho serial
+# ==========================================
+
+ROWS = 5000
+
+
+def test_read_clean_parallel_matches_serial( tmp_path ):
+    path = str( tmp_path / 'train.csv' )
+    generate_orders( ROWS, seed=11 ).to_csv( path, index=False )
+
+    # Mesmas linhas, índice, tipos e categorias do clean_code( read_orders )
+    pd.testing.assert_frame_equal( read_clean_parallel( path, workers=2 ), clean_code( read_orders( path ) ) )
@@ -0,0 +1,28 @@
+# Libraries
+import os
+
+import pytest
+
+from benchmarks.run import PAGES, prepare
+from benchmarks.startup import BUDGET, STARTUP_PAGES, check, measure_page
+
+# ==========================================
+# Orçamento de partida a frio das páginas (benchmarks.startup)
+# ==========================================
+
+
+@pytest.fixture( scope='module' )
+def workdir( tmp_path_factory ):
+    # Dados sintéticos da escala 45k e uma execução que grava o snapshot
+    # parquet, como no comando python -m benchmarks.startup
+    workdir = prepare( '45k' )
+    metrics_path = os.path.join( str( tmp_path_factory.mktemp( 'startup' ) ), 'timings.prom' )
+    measure_page( PAGES[0], workdir, metrics_path )
+    return workdir, metrics_path
+
+
+
+@pytest.mark.parametrize( 'page', STARTUP_PAGES )
+def test_page_within_startup_budget( workdir, page ):
+    result = measure_page( page, *workdir )
+    assert check( page, result, BUDGET ) == []
@@ -0,0 +1,34 @@
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from utils.timebuckets import bucket_sum, cap_granularity
+
+# ==========================================
+# Limite de barras das contagens por período
+# ==========================================
+
+# Três anos de dias: 1096 dias, 157 semanas, 36 meses
+DATES = pd.date_range( '2020-01-01', '2022-12-31' )
+
+
+def test_cap_granularity_keeps_period_that_fits():
+    assert cap_granularity( DATES, 'week', max_points=400 ) == 'week'
+    assert cap_granularity( DATES, 'month', max_points=400 ) == 'month'
+    assert cap_granularity( DATES, 'auto', max_points=400 ) == 'auto'
+
+
+
+def test_cap_granularity_moves_to_larger_period():
+    assert cap_granularity( DATES, 'day', max_points=400 ) == 'week'
+    assert cap_granularity( DATES, 'iso_week', max_points=100 ) == 'month'
+
+
+
+def test_capped_bars_keep_total():
+    counts = np.random.default_rng( 0 ).integers( 0, 50, len( DATES ) )
+    granularity = cap_granularity( DATES, 'day', max_points=400 )
+    df_aux, _ = bucket_sum( DATES, counts, granularity )
+
+    assert len( df_aux ) <= 400
+    assert df_aux['value'].sum() == counts.sum()
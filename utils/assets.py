@@ -0,0 +1,51 @@
+# Libraries
+import io
+import os
+import threading
+
+# ==========================================
+# Arquivos estáticos decodificados uma vez por processo
+# ==========================================
+
+LOGO_PATH = 'logo.png'
+
+# Largura do logo na barra lateral (pixels)
+LOGO_WIDTH = 120
+
+# Cache do processo: {(caminho, largura): bytes do png}
+_assets = {}
+_assets_lock = threading.Lock()
+
+
+def logo( path=LOGO_PATH, width=LOGO_WIDTH ):
+
+    """ Logo em png, já na largura da barra lateral.
+
+        st.sidebar.image( Image.open( ... ), width=120 ) decodifica o arquivo,
+        codifica a imagem de novo em png e a redimensiona a cada rerun. Aqui
+        isso é feito uma vez por processo, com o mesmo redimensionamento do
+        streamlit (bilinear); com a imagem já na largura pedida, o streamlit
+        envia os bytes sem alterá-los.
+
+        Input: caminho da imagem e largura em pixels
+        Output: bytes do png
+    """
+    key = ( os.path.abspath( path ), width )
+    data = _assets.get( key )
+    if data is not None:
+        return data
+
+    with _assets_lock:
+        data = _assets.get( key )
+        if data is None:
+            from PIL import Image
+
+            image = Image.open( path )
+            if image.width > width:
+                height = int( 1.0 * image.height * width / image.width )
+                image = image.resize( ( width, height ), resample=Image.BILINEAR )
+            buffer = io.BytesIO()
+            image.save( buffer, format='PNG' )
+            data = _assets[key] = buffer.getvalue()
+
+    return data
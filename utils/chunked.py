@@ -0,0 +1,152 @@
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from utils.cube import CUBE_KEYS, CUBE_VALUES, RunningStats, filter_cube, summarize
+from utils.data import DATASET_PATH, clean_code, read_orders
+from utils.timebuckets import bucket_keys, bucket_start
+
+# ==========================================
+# Processamento em blocos (csv maior que a memória)
+# ==========================================
+
+# Linhas lidas por bloco: a memória usada depende deste valor e não do csv
+CHUNKSIZE = 100000
+
+# Pares distintos guardados para contar entregadores únicos com os filtros
+COURIER_KEYS = ['Order_Date', 'Road_traffic_density', 'Delivery_person_ID']
+
+# Código inteiro de um par: ( dia * _TRAFFIC_SLOTS + trânsito ) * _COURIER_SLOTS
+# + entregador (int64; dias desde 1970, códigos de trânsito e de entregador
+# atribuídos na ordem em que aparecem)
+_TRAFFIC_SLOTS = 1 << 8
+_COURIER_SLOTS = 1 << 32
+
+
+def iter_clean_chunks( path=DATASET_PATH, chunksize=CHUNKSIZE ):
+
+    """ Lê o csv em blocos e aplica o clean_code em cada um.
+
+        Input: caminho do csv e linhas por bloco
+        Output: gerador de dataframes limpos
+    """
+    for chunk in read_orders( path, chunksize=chunksize ):
+        yield clean_code( chunk )
+
+
+
+class OrderAggregates:
+
+    """ Agregados usados pelas páginas, montados bloco a bloco:
+
+        - cube: cubo de RunningStats (pedidos por dia, tempos por cidade, ...)
+        - couriers: códigos inteiros dos pares distintos (data, trânsito,
+          entregador), para contar entregadores únicos por semana depois dos
+          filtros
+
+        O tamanho de ambos depende do número de grupos (datas, cidades,
+        entregadores), não do número de linhas do csv. Cada bloco soma só os
+        seus pares novos ao conjunto, sem rever os pares já guardados.
+    """
+
+    def __init__( self ):
+        self.stats = RunningStats( CUBE_KEYS, CUBE_VALUES )
+        self.couriers = set()
+        # Códigos atribuídos aos valores de trânsito e aos entregadores
+        self._traffic = {}
+        self._courier_ids = {}
+
+
+    @staticmethod
+    def _intern( values, ids ):
+        # Código de cada linha, no dicionário {valor: código} (valores novos
+        # recebem o próximo código)
+        codes, uniques = pd.factorize( np.asarray( values ) )
+        known = np.array( [ ids.setdefault( value, len( ids ) ) for value in uniques ], dtype=np.int64 )
+        return known[codes]
+
+
+    def update( self, df1 ):
+
+        """ Soma um bloco de linhas limpas aos agregados. """
+        self.stats.update( df1 )
+
+        day = df1['Order_Date'].to_numpy( dtype='datetime64[D]' ).astype( np.int64 )
+        traffic = self._intern( df1['Road_traffic_density'], self._traffic )
+        courier = self._intern( df1['Delivery_person_ID'], self._courier_ids )
+        codes = ( day * _TRAFFIC_SLOTS + traffic ) * _COURIER_SLOTS + courier
+        self.couriers.update( np.unique( codes ).tolist() )
+
+        return self
+
+
+    @property
+    def cube( self ):
+        return self.stats.table
+
+
+    def _couriers( self, date_slider, traffic_options ):
+        # Pares distintos com os filtros da barra lateral: data e código do
+        # entregador (o código basta para contar entregadores únicos)
+        codes = np.fromiter( self.couriers, dtype=np.int64, count=len( self.couriers ) )
+        courier = codes % _COURIER_SLOTS
+        day, traffic = np.divmod( codes // _COURIER_SLOTS, _TRAFFIC_SLOTS )
+
+        dates = day.astype( 'datetime64[D]' ).astype( 'datetime64[ns]' )
+        selected = [ code for value, code in self._traffic.items() if value in traffic_options ]
+        linhas_selecionadas = ( dates < np.datetime64( pd.Timestamp( date_slider ) ) ) & np.isin( traffic, selected )
+
+        return pd.DataFrame( { 'Order_Date': dates[linhas_selecionadas],
+                               'Delivery_person_ID': courier[linhas_selecionadas] } )
+
+
+    def orders_per_day( self, date_slider, traffic_options ):
+
+        """ Número de pedidos por dia (mesmo df_aux do order_metric). """
+        cube = filter_cube( self.cube, date_slider, traffic_options )
+        return summarize( cube, 'Order_Date' ).loc[:, ['Order_Date', 'count']].rename( columns={'count': 'ID'} )
+
+
+    def order_share_per_week( self, date_slider, traffic_options ):
+
+        """ Pedidos por semana, entregadores únicos por semana e a razão entre
+            eles (mesmo df_aux do order_share_per_week).
+        """
+        orders = self.orders_per_day( date_slider, traffic_options )
+        week = pd.Series( bucket_keys( orders['Order_Date'], 'week' ), index=orders.index, name='order_week' )
+        df_aux1 = orders['ID'].groupby( week ).sum().reset_index()
+
+        pairs = self._couriers( date_slider, traffic_options )
+        week = pd.Series( bucket_keys( pairs['Order_Date'], 'week' ), index=pairs.index, name='order_week' )
+        df_aux2 = pairs['Delivery_person_ID'].groupby( week ).nunique().reset_index()
+
+        df_aux = pd.merge( df_aux1, df_aux2, how='inner' )
+        df_aux['order_by_deliver'] = df_aux['ID'] / df_aux['Delivery_person_ID']
+        df_aux.insert( 0, 'Order_Date', bucket_start( df_aux.pop( 'order_week' ), 'week' ) )
+
+        return df_aux
+
+
+    def city_time_stats( self, date_slider, traffic_options ):
+
+        """ Tempo médio e desvio padrão de entrega por cidade (mesmo df_aux do
+            avg_std_time_graph).
+        """
+        cube = filter_cube( self.cube, date_slider, traffic_options )
+        df_aux = summarize( cube, 'City' ).loc[:, ['City', 'avg', 'std']]
+        df_aux.columns = ['City', 'avg_time', 'std_time']
+
+        return df_aux
+
+
+
+def aggregate_csv( path=DATASET_PATH, chunksize=CHUNKSIZE ):
+
+    """ Monta os OrderAggregates lendo o csv em blocos, sem carregar o
+        arquivo inteiro na memória.
+    """
+    aggregates = OrderAggregates()
+    for df1 in iter_clean_chunks( path, chunksize ):
+        aggregates.update( df1 )
+
+    return aggregates
@@ -0,0 +1,167 @@
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# Avaliação média por entregador: ordenação, páginas e busca no servidor
+# ==========================================
+
+# Linhas enviadas ao navegador por página da tabela
+PAGE_SIZE = 50
+
+# Ordenações da tabela: (rótulo, coluna, crescente)
+SORTS = { 'ID do entregador': ( 'Delivery_person_ID', True ),
+          'Maior avaliação': ( 'Delivery_person_Ratings', False ),
+          'Menor avaliação': ( 'Delivery_person_Ratings', True ) }
+
+
+def top_k_positions( values, k, ascending=True ):
+
+    """ Posições dos k menores (ascending) ou maiores valores, ordenados;
+        empates ficam na ordem das posições. Usa seleção parcial (partition)
+        e ordena apenas os candidatos, em vez de ordenar o array inteiro.
+
+        Input: array de valores, k e a ordem
+        Output: array com até k posições
+    """
+    values = np.asarray( values, dtype=np.float64 )
+    n = len( values )
+    k = min( k, n )
+    if k <= 0:
+        return np.array( [], dtype=np.int64 )
+
+    # Valores ausentes (NaN) ficam no final em qualquer ordem
+    values = values if ascending else -values
+    values = np.where( np.isnan( values ), np.inf, values )
+
+    if k < n:
+        # Inclui todos os empatados com o k-ésimo valor, para desempatar pela posição
+        kth = np.partition( values, k - 1 )[k - 1]
+        candidates = np.flatnonzero( values <= kth )
+    else:
+        candidates = np.arange( n )
+
+    order = np.lexsort( ( candidates, values[candidates] ) )
+    return candidates[order][:k]
+
+
+
+class CourierRatings:
+
+    """ Avaliação média de cada entregador (linhas já filtradas).
+
+        A tabela completa fica no servidor: a página pede uma página da
+        tabela ordenada (page), os k primeiros (top) ou um entregador pelo ID
+        (lookup, busca num dicionário: tempo constante).
+    """
+
+    def __init__( self, df1 ):
+        df_aux = ( df1[['Delivery_person_ID', 'Delivery_person_Ratings']]
+                      .groupby( 'Delivery_person_ID', observed=True )
+                      .mean().sort_index().reset_index() )
+        df_aux['Delivery_person_ID'] = df_aux['Delivery_person_ID'].astype( str )
+
+        self.table = df_aux
+        self.ratings = df_aux['Delivery_person_Ratings'].values
+        # Índice ID -> linha (IDs sem os espaços do csv, como digitados na busca)
+        self.positions = { courier.strip(): i for i, courier in enumerate( df_aux['Delivery_person_ID'] ) }
+
+
+    def __len__( self ):
+        return len( self.table )
+
+
+    def pages( self, page_size=PAGE_SIZE ):
+        return max( 1, -( -len( self ) // page_size ) )
+
+
+    def lookup( self, courier_id ):
+
+        """ Linha do entregador (ou dataframe vazio se o ID não existir). """
+        i = self.positions.get( courier_id.strip() )
+        if i is None:
+            return self.table.iloc[:0]
+        return self.table.iloc[i:i + 1]
+
+
+    def top_positions( self, k, ascending ):
+
+        """ Posições dos k entregadores com menor (ascending) ou maior
+            avaliação, ordenados; empates ficam na ordem do ID.
+        """
+        return top_k_positions( self.ratings, k, ascending )
+
+
+
+    def top( self, k, ascending=False ):
+        return self.table.iloc[self.top_positions( k, ascending )]
+
+
+    def page( self, sort, number, page_size=PAGE_SIZE ):
+
+        """ Linhas de uma página da tabela.
+
+            Input: rótulo da ordenação (SORTS), número da página (começa em 1)
+                   e linhas por página
+            Output: Dataframe com no máximo page_size linhas
+        """
+        column, ascending = SORTS[sort]
+        start = ( number - 1 ) * page_size
+        end = start + page_size
+
+        if column == 'Delivery_person_ID':
+            # Tabela já ordenada pelo ID
+            return self.table.iloc[start:end]
+
+        return self.table.iloc[self.top_positions( end, ascending )[start:]]
+
+
+
+def top_couriers( df1, k=10, cities=None ):
+
+    """ Entregadores mais rápidos e mais lentos de cada cidade.
+
+        O maior tempo de entrega de cada (cidade, entregador) é calculado num
+        único agrupamento; em cada cidade, as duas listas saem de seleções
+        parciais (top_k_positions) sobre esse resultado, sem ordenar tudo.
+        Empates ficam na ordem do ID do entregador.
+
+        Input: linhas filtradas, k e as cidades (None: todas, em ordem alfabética)
+        Output: (mais rápidos, mais lentos), dataframes com City,
+                Delivery_person_ID e Time_taken(min)
+    """
+    df2 = ( df1[['Delivery_person_ID', 'Time_taken(min)', 'City']]
+               .groupby( ['City', 'Delivery_person_ID'], observed=True ).max()
+               .sort_index().reset_index() )
+
+    # O resultado está ordenado pela cidade: as linhas de cada cidade são
+    # contíguas e encontradas por busca binária nos códigos
+    city = df2['City']
+    if not isinstance( city.dtype, pd.CategoricalDtype ):
+        city = city.astype( 'category' )
+    codes = city.cat.codes.values
+    categories = city.cat.categories
+    times = df2['Time_taken(min)'].values
+    if cities is None:
+        cities = categories[np.unique( codes )]
+
+    fastest = []
+    slowest = []
+    for name in cities:
+        if name not in categories:
+            continue
+        code = categories.get_loc( name )
+        start, end = np.searchsorted( codes, [code, code + 1] )
+        fastest.append( start + top_k_positions( times[start:end], k, ascending=True ) )
+        slowest.append( start + top_k_positions( times[start:end], k, ascending=False ) )
+
+    def pick( positions ):
+        positions = np.concatenate( positions ) if positions else np.array( [], dtype=np.int64 )
+        df3 = df2.take( positions ).reset_index( drop=True )
+        # Texto simples: uma coluna categórica levaria todas as categorias
+        # (todos os entregadores) para o navegador junto com as poucas linhas
+        for col in ['City', 'Delivery_person_ID']:
+            df3[col] = np.asarray( df3[col], dtype=object )
+        return df3
+
+    return pick( fastest ), pick( slowest )
@@ -0,0 +1,254 @@
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from utils.data import DATASET_PATH, load_derived
+
+# ==========================================
+# Cubo de agregados (rollup) para os gráficos e KPIs
+# ==========================================
+
+# Dimensões do cubo: cobrem os filtros da barra lateral (data e trânsito) e
+# todos os agrupamentos usados pelos gráficos das páginas
+CUBE_KEYS = ['Order_Date', 'City', 'Road_traffic_density', 'Festival', 'Type_of_order', 'Weatherconditions']
+CUBE_VALUES = ['Time_taken(min)', 'Delivery_person_Ratings', 'distance']
+
+# Estatísticas guardadas por célula e como elas se combinam entre células
+STATS = { 'count': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max' }
+
+
+class RunningStats:
+
+    """ Contagem, soma, soma dos quadrados, mínimo e máximo por grupo,
+        acumulados lote a lote. Cada update custa o tamanho do lote (as
+        células do lote são somadas às células guardadas), e não o histórico
+        inteiro.
+
+        table é um Dataframe com um índice com as colunas de `keys` e, para
+        cada coluna de `values`, as colunas '<coluna>|count', '<coluna>|sum',
+        etc. Ele é montado quando lido, uma vez a cada lote somado; quem o
+        recebe não o vê mudar com os lotes seguintes.
+    """
+
+    def __init__( self, keys, values ):
+        self.keys = list( keys )
+        self.values = list( values )
+        self.columns = [ col + '|' + stat for col in self.values for stat in ['count', 'sum', 'min', 'max', 'sumsq'] ]
+        # Como cada coluna combina entre lotes: 'sum', 'min' ou 'max'
+        self.how = np.array( [ STATS[col.split( '|' )[1]] for col in self.columns ] )
+        self._table = None
+        # Acumuladores, montados a partir do segundo lote:
+        # - valores distintos de cada dimensão ({valor: código} e a lista)
+        # - {códigos da célula: linha} e, por linha, os códigos e as estatísticas
+        #   (arrays com folga, que dobram de tamanho quando enchem)
+        self._codes_of = None
+        self._level_values = None
+        self._level_dtypes = None
+        self._cells = None
+        self._codes = None
+        self._stats = None
+        self._size = 0
+
+
+    def batch_stats( self, df1 ):
+        # Agregados de um lote de linhas limpas
+        df_aux = df1.loc[:, self.keys + self.values].copy()
+        for col in self.keys:
+            # Categorias viram valores simples para alinhar lotes com categorias diferentes
+            if isinstance( df_aux[col].dtype, pd.CategoricalDtype ):
+                df_aux[col] = np.asarray( df_aux[col] )
+
+        aggs = {}
+        for col in self.values:
+            # Somas em float64 (a avaliação é lida como float32)
+            values = df_aux[col] = df_aux[col].astype( 'float64' )
+            df_aux[col + '|sumsq'] = values * values
+            aggs[col] = ['count', 'sum', 'min', 'max']
+            aggs[col + '|sumsq'] = ['sum']
+
+        df_aux = df_aux.groupby( self.keys, dropna=False ).agg( aggs )
+
+        table = pd.DataFrame( index=df_aux.index )
+        for col in self.values:
+            for stat in ['count', 'sum', 'min', 'max']:
+                table[col + '|' + stat] = df_aux[(col, stat)].astype( 'float64' )
+            table[col + '|sumsq'] = df_aux[(col + '|sumsq', 'sum')]
+
+        return table
+
+
+    def _start_accumulators( self ):
+        # Acumuladores a partir da tabela do primeiro lote (uma vez)
+        index = self._table.index
+        self._level_values = [ list( level ) for level in index.levels ]
+        self._level_dtypes = [ level.dtype for level in index.levels ]
+        self._codes_of = [ { value: code for code, value in enumerate( values ) } for values in self._level_values ]
+
+        self._size = len( self._table )
+        capacity = max( 2 * self._size, 64 )
+        self._codes = np.empty( ( capacity, len( self.keys ) ), dtype=np.int64 )
+        self._codes[:self._size] = np.column_stack( index.codes )
+        self._stats = np.empty( ( capacity, len( self.columns ) ), dtype=np.float64 )
+        self._stats[:self._size] = self._table.loc[:, self.columns].values
+        self._cells = { cell: row for row, cell in enumerate( map( tuple, self._codes[:self._size].tolist() ) ) }
+
+
+    def _batch_codes( self, index ):
+        # Códigos (dos acumuladores) das células do lote; valores novos ganham código
+        codes = []
+        for i, level in enumerate( index.levels ):
+            codes_of = self._codes_of[i]
+            mapping = np.empty( len( level ) + 1, dtype=np.int64 )
+            for j, value in enumerate( level ):
+                code = codes_of.get( value )
+                if code is None:
+                    code = codes_of[value] = len( self._level_values[i] )
+                    self._level_values[i].append( value )
+                mapping[j] = code
+            # Valor ausente (dropna=False) tem código -1 nos dois lados
+            mapping[-1] = -1
+            codes.append( mapping[index.codes[i]] )
+
+        return np.column_stack( codes )
+
+
+    def _grow( self, size ):
+        if size <= len( self._stats ):
+            return
+        capacity = max( size, 2 * len( self._stats ) )
+        for name in ['_codes', '_stats']:
+            old = getattr( self, name )
+            new = np.empty( ( capacity, old.shape[1] ), dtype=old.dtype )
+            new[:self._size] = old[:self._size]
+            setattr( self, name, new )
+
+
+    def _merge( self, batch ):
+        # Soma as células do lote às guardadas; células novas vão para o final
+        codes = self._batch_codes( batch.index )
+        stats = batch.loc[:, self.columns].values
+
+        rows = np.empty( len( codes ), dtype=np.int64 )
+        size = self._size
+        for i, cell in enumerate( map( tuple, codes.tolist() ) ):
+            row = self._cells.get( cell )
+            if row is None:
+                row = self._cells[cell] = size
+                size += 1
+            rows[i] = row
+
+        new = rows >= self._size
+        self._grow( size )
+        self._codes[rows[new]] = codes[new]
+        self._stats[rows[new]] = stats[new]
+
+        # Células que já existiam: soma, mínimo e máximo só nas linhas tocadas
+        old = rows[~new]
+        if len( old ):
+            current = self._stats[old]
+            for how, func in ( ( 'sum', np.add ), ( 'min', np.fmin ), ( 'max', np.fmax ) ):
+                cols = np.flatnonzero( self.how == how )
+                current[:, cols] = func( current[:, cols], stats[~new][:, cols] )
+            self._stats[old] = current
+
+        self._size = size
+
+
+    def update( self, df1 ):
+
+        """ Soma um lote de linhas limpas aos agregados. """
+        if len( df1 ) == 0:
+            return self
+
+        batch = self.batch_stats( df1 )
+        if self._table is None and self._cells is None:
+            # Primeiro lote: a tabela é o próprio resultado do groupby
+            self._table = batch
+            return self
+
+        if self._cells is None:
+            self._start_accumulators()
+        self._merge( batch )
+        self._table = None
+
+        return self
+
+
+    @property
+    def table( self ):
+        if self._table is None and self._cells is not None:
+            self._table = self._build_table()
+        return self._table
+
+
+    def _build_table( self ):
+        # Dataframe a partir dos acumuladores (cópia: os lotes seguintes não o alteram)
+        n = self._size
+        levels = []
+        codes = []
+        for i, values in enumerate( self._level_values ):
+            level = pd.Index( values, dtype=self._level_dtypes[i] )
+            # Valores de cada dimensão em ordem crescente, como no groupby
+            order = np.argsort( level.values, kind='stable' )
+            rank = np.empty( len( order ) + 1, dtype=np.int64 )
+            rank[order] = np.arange( len( order ) )
+            rank[-1] = -1
+            levels.append( level[order] )
+            codes.append( rank[self._codes[:n, i]] )
+
+        index = pd.MultiIndex( levels=levels, codes=codes, names=self.keys, verify_integrity=False )
+        return pd.DataFrame( self._stats[:n].copy(), index=index, columns=self.columns )
+
+
+
+def summarize( table, by, value='Time_taken(min)' ):
+
+    """ Junta os agregados de uma tabela de RunningStats nas dimensões `by`
+        e calcula as estatísticas finais.
+
+        Input: tabela (já filtrada), colunas de agrupamento e coluna de valor
+        Output: Dataframe com as colunas de `by` e count, avg, std, min, max
+    """
+    cols = [value + '|' + stat for stat in STATS]
+    how = { value + '|' + stat: func for stat, func in STATS.items() }
+    df_aux = table.loc[:, cols].groupby( level=by ).agg( how )
+    df_aux.columns = list( STATS )
+
+    n = df_aux['count']
+    df_aux['avg'] = df_aux['sum'] / n
+    # Desvio padrão amostral (ddof=1), igual ao .std() do pandas
+    var = ( df_aux['sumsq'] - df_aux['sum'] * df_aux['sum'] / n ) / ( n - 1 )
+    df_aux['std'] = np.sqrt( var.clip( lower=0 ) ).where( n > 1 )
+    df_aux['count'] = n.astype( 'int64' )
+
+    return df_aux.loc[:, ['count', 'avg', 'std', 'min', 'max']].reset_index()
+
+
+
+def build_cube( df1 ):
+    
+    """ Monta o cubo (tabela de RunningStats nas dimensões CUBE_KEYS) a partir
+        das linhas limpas.
+    """
+    return RunningStats( CUBE_KEYS, CUBE_VALUES ).update( df1 ).table
+
+
+
+def load_cube( path=DATASET_PATH ):
+    
+    """ Devolve o cubo do dataset limpo. Ele é montado uma vez por processo e
+        refeito apenas quando load_data devolver um dataframe novo (csv alterado).
+    """
+    return load_derived( 'cube', build_cube, path )
+
+
+
+def filter_cube( cube, date_slider, traffic_options ):
+    
+    """ Aplica os filtros da barra lateral (data limite e condições de
+        trânsito) nas células do cubo, sem passar pelas linhas de pedidos.
+    """
+    dates = cube.index.get_level_values( 'Order_Date' )
+    traffic = cube.index.get_level_values( 'Road_traffic_density' )
+    
+    return cube.loc[( dates < date_slider ) & traffic.isin( traffic_options ), :]
@@ -0,0 +1,385 @@
+# Libraries
+import hashlib
+import os
+import threading
+
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from utils.geo import haversine_np
+from utils.timebuckets import time_keys
+from utils.timing import timer
+
+# ==========================================
+# Carregamento e limpeza compartilhados entre as páginas
+# ==========================================
+
+DATASET_PATH = r'dataset/train.csv'
+
+# Snapshot colunar (parquet) gravado ao lado do csv
+SNAPSHOT_SUFFIX = '.parquet'
+SNAPSHOT_HASH_KEY = b'curry_source_sha256'
+SNAPSHOT_VERSION_KEY = b'curry_schema_version'
+# Incrementar sempre que clean_code mudar o formato do dataframe limpo,
+# para que snapshots antigos sejam descartados
+SCHEMA_VERSION = b'5'
+
+# Cache do processo: {caminho absoluto: ((tamanho, mtime), dataframe limpo)}
+_cache = {}
+_cache_lock = threading.Lock()
+
+# Estruturas montadas sobre o dataframe limpo (índice, cubo, índice espacial):
+# {(nome, caminho): (dataframe de origem, estrutura)}, uma trava por nome
+_derived = {}
+_derived_locks = {}
+
+# ==========================================
+# Esquema do csv
+# ==========================================
+
+# Valor usado no csv para indicar dado ausente (com o espaço no final)
+NA_SENTINEL = 'NaN '
+
+# Colunas em que 'NaN ' elimina a linha
+REQUIRED_COLUMNS = ['Delivery_person_Age', 'Delivery_person_Ratings', 'Delivery_person_ID',
+                    'Road_traffic_density', 'City', 'Festival', 'multiple_deliveries']
+
+# Texto com poucos valores distintos: lido direto como categoria
+CATEGORY_COLUMNS = ['Order_Date', 'Time_Orderd', 'Time_Order_picked',
+                    'Weatherconditions', 'Road_traffic_density', 'Type_of_order',
+                    'Type_of_vehicle', 'Festival', 'City', 'Time_taken(min)']
+
+# Texto com muitos valores distintos (um por entregador): o read_csv monta
+# categorias bem mais devagar que texto simples, então a coluna é lida como
+# texto e vira categoria no clean_code, depois do filtro das linhas
+LATE_CATEGORY_COLUMNS = ['Delivery_person_ID']
+
+# Colunas de texto que chegam com espaços no final do valor
+STRIP_COLUMNS = ['Road_traffic_density', 'Type_of_order', 'Type_of_vehicle', 'City', 'Festival']
+
+# Tipos lidos pelo read_csv. Idade e múltiplas entregas são lidas como
+# float32 (o ausente vira NaN) e convertidas para int8 depois do filtro: o
+# inteiro com suporte a ausentes ('Int8') deixava a leitura cerca de 40% mais
+# lenta (1M linhas: 8,0 s contra 3,7 s com float32 e os IDs dos entregadores
+# em texto).
+CSV_DTYPES = { 'ID': object,
+               'Delivery_person_ID': object,
+               'Delivery_person_Age': 'float32',
+               'Delivery_person_Ratings': 'float32',
+               'Restaurant_latitude': 'float64',
+               'Restaurant_longitude': 'float64',
+               'Delivery_location_latitude': 'float64',
+               'Delivery_location_longitude': 'float64',
+               'Vehicle_condition': 'int8',
+               'multiple_deliveries': 'float32' }
+CSV_DTYPES.update( { col: 'category' for col in CATEGORY_COLUMNS } )
+
+# 'NaN ' só é tratado como ausente nas colunas que decidem a limpeza
+CSV_NA_VALUES = { col: [NA_SENTINEL] for col in REQUIRED_COLUMNS }
+
+
+def read_orders( path, **kwargs ):
+    
+    """ Lê o csv de pedidos já com os tipos do esquema (CSV_DTYPES).
+        Argumentos extras (ex.: chunksize) são repassados ao read_csv.
+        
+        Input: caminho do csv
+        Output: Dataframe bruto tipado, pronto para o clean_code
+    """
+    return pd.read_csv( path, dtype=CSV_DTYPES, na_values=CSV_NA_VALUES, **kwargs )
+
+
+
+def _map_categories( series, func ):
+    # Aplica func apenas nas categorias (poucos valores) e não em cada linha.
+    # Se duas categorias virarem o mesmo valor (ex.: 'Urban' e 'Urban '), o
+    # map devolve valores comuns e a coluna é recategorizada.
+    if not isinstance( series.dtype, pd.CategoricalDtype ):
+        series = series.astype( 'category' )
+    categories = series.cat.categories
+    mapped = series.map( dict( zip( categories, func( categories ) ) ) )
+    if not isinstance( mapped.dtype, pd.CategoricalDtype ):
+        mapped = mapped.astype( 'category' )
+    return mapped
+
+
+
+def clean_code( df1 ):
+    
+    """ Essa função tem a responsabilidade de limpar o dataframe
+         Tipos de limpeza:
+         1. Remoção dos dados NaN
+         2. Mudança do tipo da coluna de dados
+         3. Remoção dos espaços das variáveis de texto
+         4. Formatação da coluna de datas
+         5. Limpeza da coluna de tempo (remoção do texto da variável numérica)
+         6. Cálculo da distância entre restaurante e local de entrega
+         7. Chaves inteiras de tempo (dia, semana, semana ISO, mês e dia da semana)
+         8. IDs dos entregadores como categoria, depois do filtro das linhas
+         
+         Input: Dataframe lido com read_orders
+         Output: Dataframe
+     
+    """
+    # Linhas sem 'NaN ' nas colunas obrigatórias (filtradas uma única vez, no final)
+    linhas_selecionadas = df1[REQUIRED_COLUMNS].notna().all( axis=1 )
+    
+    # Cópia rasa: as colunas convertidas substituem as originais sem copiar as demais
+    df1 = df1.copy( deep=False )
+    
+    # 1. Idade e múltiplas entregas cabem em int8 (os ausentes serão descartados)
+    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].fillna( 0 ).astype( 'int8' )
+    df1['multiple_deliveries'] = df1['multiple_deliveries'].fillna( 0 ).astype( 'int8' )
+    
+    # 2. Converter a coluna Order_date de texto para data (só as datas distintas)
+    df1['Order_Date'] = _map_categories( df1['Order_Date'],
+                                         lambda c: pd.to_datetime( c, format = '%d-%m-%Y' ) ).astype( 'datetime64[ns]' )
+    
+    # 3. Removendo os espacos dentro de strings/text/objects
+    df1['ID'] = df1['ID'].str.strip()
+    for col in STRIP_COLUMNS:
+        df1[col] = _map_categories( df1[col], lambda c: c.str.strip() )
+    
+    # 4. Limpando a coluna de time taken: '(min) 24' -> 24
+    df1['Time_taken(min)'] = _map_categories( df1['Time_taken(min)'],
+                                              lambda c: c.map( lambda x: int( x.split( '(min) ' )[1] ) ) ).astype( 'int16' )
+    
+    # 5. Categorias em ordem alfabética: groupby e sort_values ficam na mesma
+    #    ordem de quando as colunas eram texto
+    for col in CATEGORY_COLUMNS:
+        if isinstance( df1[col].dtype, pd.CategoricalDtype ):
+            df1[col] = df1[col].cat.reorder_categories( df1[col].cat.categories.sort_values() )
+    
+    # 6. Distância (km) entre o restaurante e o local de entrega, calculada uma única vez
+    df1['distance'] = haversine_np( df1['Restaurant_latitude'], df1['Restaurant_longitude'],
+                                    df1['Delivery_location_latitude'], df1['Delivery_location_longitude'] )
+    
+    # 7. Chaves inteiras de tempo (utils.timebuckets.TIME_KEYS), calculadas uma única vez
+    for col, keys in time_keys( df1['Order_Date'].values ).items():
+        df1[col] = keys
+    
+    # 8. Eliminar as linhas com NaN (cópia rasa: as colunas seguintes
+    #    substituem as do resultado sem alterar o dataframe recebido)
+    df1 = df1.loc[linhas_selecionadas, :].copy( deep=False )
+    
+    # 9. Colunas de texto com muitos valores viram categoria só agora, já sem
+    #    as linhas descartadas (categorias em ordem alfabética, como no passo 5)
+    for col in LATE_CATEGORY_COLUMNS:
+        df1[col] = df1[col].astype( 'category' )
+    
+    return df1
+
+
+
+def _file_key( path ):
+    # Tamanho e data de modificação identificam a versão do arquivo
+    stat = os.stat( path )
+    return ( stat.st_size, stat.st_mtime_ns )
+
+
+
+def file_hash( path ):
+    # Hash do conteúdo do csv, lido em blocos para não carregar o arquivo inteiro
+    digest = hashlib.sha256()
+    with open( path, 'rb' ) as f:
+        for block in iter( lambda: f.read( 1 << 20 ), b'' ):
+            digest.update( block )
+    return digest.hexdigest()
+
+
+
+def snapshot_path( path ):
+    return os.path.splitext( path )[0] + SNAPSHOT_SUFFIX
+
+
+
+def read_snapshot( path, source_hash ):
+    
+    """ Lê o snapshot parquet do csv, se ele existir e tiver sido gerado a
+        partir do mesmo conteúdo (mesmo hash) com a versão atual de
+        clean_code. Caso contrário devolve None.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+    
+    snapshot = snapshot_path( path )
+    if not os.path.exists( snapshot ):
+        return None
+    
+    try:
+        metadata = pq.read_schema( snapshot ).metadata or {}
+        if metadata.get( SNAPSHOT_HASH_KEY ) != source_hash.encode():
+            return None
+        if metadata.get( SNAPSHOT_VERSION_KEY ) != SCHEMA_VERSION:
+            return None
+        return pq.read_table( snapshot ).to_pandas()
+    except Exception:
+        # Snapshot corrompido ou incompatível: reconstruir a partir do csv
+        return None
+
+
+
+def write_snapshot( df1, path, source_hash ):
+    
+    """ Grava o dataframe limpo em parquet ao lado do csv, guardando o hash
+        do csv nos metadados do arquivo. A gravação é feita em um arquivo
+        temporário e depois renomeada, para que outro processo nunca leia um
+        snapshot pela metade.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return
+    
+    snapshot = snapshot_path( path )
+    tmp = '{}.{}.tmp'.format( snapshot, os.getpid() )
+    
+    table = pa.Table.from_pandas( df1 )
+    metadata = dict( table.schema.metadata or {} )
+    metadata[SNAPSHOT_HASH_KEY] = source_hash.encode()
+    metadata[SNAPSHOT_VERSION_KEY] = SCHEMA_VERSION
+    table = table.replace_schema_metadata( metadata )
+    
+    try:
+        pq.write_table( table, tmp )
+        os.replace( tmp, snapshot )
+    except OSError:
+        # Diretório somente leitura: seguimos sem snapshot
+        if os.path.exists( tmp ):
+            os.remove( tmp )
+
+
+
+def sort_by_date( df1 ):
+    # Linhas em ordem de Order_Date (estável); sem cópia se já estiverem
+    dates = df1['Order_Date'].values
+    if ( dates[1:] >= dates[:-1] ).all():
+        return df1
+    return df1.take( np.argsort( dates, kind='stable' ) )
+
+
+
+def read_clean( path ):
+    
+    """ Devolve o dataframe limpo a partir do snapshot parquet, quando ele
+        corresponde ao conteúdo atual do csv. Caso contrário lê e limpa o csv
+        (em paralelo, se ele for grande) e regrava o snapshot, com as linhas
+        em ordem de data.
+    """
+    with timer( 'load.hash' ):
+        source_hash = file_hash( path )
+    
+    with timer( 'load.snapshot' ):
+        df1 = read_snapshot( path, source_hash )
+    if df1 is None:
+        # csv grande: lido e limpo por faixas em vários processos (utils.parallel)
+        from utils.parallel import load_workers, read_clean_parallel
+        workers = load_workers( path )
+        if workers > 1:
+            with timer( 'load.clean_parallel' ):
+                df1 = read_clean_parallel( path, workers )
+        else:
+            with timer( 'load.read_csv' ):
+                df_raw = read_orders( path )
+            with timer( 'load.clean_code' ):
+                df1 = clean_code( df_raw )
+        # Gravado em ordem de data: o carregamento não precisa reordenar
+        df1 = sort_by_date( df1 )
+        write_snapshot( df1, path, source_hash )
+    
+    # Identifica o conteúdo do csv (ex.: resultados pré-calculados)
+    df1.attrs['source_hash'] = source_hash
+        
+    return df1
+
+
+
+def share_frame( df1 ):
+    
+    """ Prepara o dataframe limpo para ser compartilhado por todas as sessões:
+        
+        - linhas em ordem de Order_Date (ordenação estável), para que o
+          OrderIndex use o próprio dataframe, sem uma segunda cópia ordenada
+        - colunas somente leitura: uma alteração feita por engano numa página
+          gera erro em vez de mudar os dados de todas as sessões
+    """
+    df1 = sort_by_date( df1 )
+    
+    for values in df1._mgr.arrays:
+        # Categorias e datas guardam os valores num ndarray interno (_ndarray)
+        array = getattr( values, '_ndarray', values )
+        if isinstance( array, np.ndarray ):
+            array.flags.writeable = False
+    
+    return df1
+
+
+
+def load_data( path=DATASET_PATH ):
+    
+    """ Esta função lê o csv e devolve o dataframe já limpo.
+        O resultado fica guardado em um cache do processo, indexado pelo
+        caminho, tamanho e data de modificação do arquivo. Enquanto o arquivo
+        não mudar, todas as páginas e sessões recebem o mesmo dataframe sem
+        reler nem limpar o csv. Em um processo novo, o dataframe vem do
+        snapshot parquet (ver read_clean).
+        
+        O dataframe devolvido é compartilhado e somente leitura (share_frame),
+        com as linhas em ordem de data: as páginas o leem pelas seleções do
+        OrderIndex, que não copiam as linhas.
+        
+        Input: caminho do csv
+        Output: Dataframe limpo
+    """
+    path = os.path.abspath( path )
+    key = _file_key( path )
+    
+    cached = _cache.get( path )
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    
+    with _cache_lock:
+        # Outra sessão pode ter carregado o arquivo enquanto esperávamos
+        cached = _cache.get( path )
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        
+        df1 = share_frame( read_clean( path ) )
+        _cache[path] = ( key, df1 )
+        
+    return df1
+
+
+
+def load_derived( name, build, path=DATASET_PATH ):
+    
+    """ Cache do processo para as estruturas montadas sobre o dataframe
+        limpo (load_index, load_cube, load_spatial). A estrutura é montada
+        uma vez por processo, com o tempo medido em 'load.build_<nome>', e
+        refeita apenas quando load_data devolver um dataframe novo (csv
+        alterado).
+        
+        Input: nome da estrutura, função build( df1 ) e caminho do csv
+        Output: a estrutura montada
+    """
+    df1 = load_data( path )
+    key = ( name, path )
+    
+    cached = _derived.get( key )
+    if cached is not None and cached[0] is df1:
+        return cached[1]
+    
+    with _derived_locks.setdefault( name, threading.Lock() ):
+        # Outra sessão pode ter montado a estrutura enquanto esperávamos
+        cached = _derived.get( key )
+        if cached is not None and cached[0] is df1:
+            return cached[1]
+        with timer( 'load.build_' + name ):
+            value = build( df1 )
+        _derived[key] = ( df1, value )
+        
+    return value
@@ -0,0 +1,29 @@
+# bibliotecas necessárias
+import numpy as np
+
+# ==========================================
+# Funções geográficas vetorizadas
+# ==========================================
+
+# Mesmo raio médio da Terra usado pela biblioteca haversine (em km)
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_np( lat1, lon1, lat2, lon2 ):
+    
+    """ Calcula a distância (em km) sobre a superfície da Terra entre pares
+        de pontos, de uma só vez para arrays inteiros. Dá o mesmo resultado
+        que haversine((lat1, lon1), (lat2, lon2)) aplicado linha a linha.
+        
+        Input: arrays (ou Series) de latitudes e longitudes em graus
+        Output: array numpy com as distâncias em km
+    """
+    lat1 = np.radians( np.asarray( lat1, dtype=np.float64 ) )
+    lon1 = np.radians( np.asarray( lon1, dtype=np.float64 ) )
+    lat2 = np.radians( np.asarray( lat2, dtype=np.float64 ) )
+    lon2 = np.radians( np.asarray( lon2, dtype=np.float64 ) )
+    
+    d = ( np.sin( ( lat2 - lat1 ) * 0.5 ) ** 2
+          + np.cos( lat1 ) * np.cos( lat2 ) * np.sin( ( lon2 - lon1 ) * 0.5 ) ** 2 )
+    
+    return 2 * EARTH_RADIUS_KM * np.arcsin( np.sqrt( d ) )
@@ -0,0 +1,194 @@
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from utils.data import DATASET_PATH, load_derived
+
+# ==========================================
+# Índices para os filtros da barra lateral
+# ==========================================
+
+# Colunas com um bitmap por valor (filtros de igualdade / lista de valores)
+BITMAP_COLUMNS = ['Road_traffic_density', 'City', 'Festival', 'Weatherconditions', 'Type_of_vehicle']
+
+
+class OrderIndex:
+
+    """ Índice sobre o dataframe limpo para os filtros da barra lateral.
+
+        - As linhas ficam ordenadas por Order_Date (ordenação estável), então o
+          filtro "Order_Date < data" vira uma busca binária e um fatiamento.
+        - Cada valor das colunas de BITMAP_COLUMNS tem um bitmap (um bit por
+          linha, np.packbits). Valores da mesma coluna são combinados com OU
+          e colunas diferentes com E, sem percorrer o dataframe.
+
+        select não copia o dataframe: devolve uma Selection com as posições
+        das linhas, e só as colunas usadas pela página são montadas.
+    """
+
+    def __init__( self, df1, bitmap_columns=BITMAP_COLUMNS ):
+        dates = df1['Order_Date'].values
+        if ( dates[1:] >= dates[:-1] ).all():
+            # load_data já entrega as linhas em ordem de data: sem cópia
+            self.frame = df1
+        else:
+            self.frame = df1.take( np.argsort( dates, kind='stable' ) )
+        self.dates = self.frame['Order_Date'].values
+        self.bitmaps = {}
+        # Colunas em que toda linha tem valor (marcar todos os valores = sem filtro)
+        self.complete = {}
+
+        for col in bitmap_columns:
+            values = self.frame[col]
+            if not isinstance( values.dtype, pd.CategoricalDtype ):
+                values = values.astype( 'category' )
+            codes = values.cat.codes.values
+            self.bitmaps[col] = { value: np.packbits( codes == code )
+                                  for code, value in enumerate( values.cat.categories ) }
+            self.complete[col] = bool( ( codes >= 0 ).all() )
+
+
+    def __len__( self ):
+        return len( self.frame )
+
+
+    def date_end( self, date_before ):
+        # Número de linhas com Order_Date < date_before (busca binária)
+        if date_before is None:
+            return len( self.frame )
+        return int( np.searchsorted( self.dates, np.datetime64( date_before, 'ns' ), side='left' ) )
+
+
+    def column_mask( self, col, values, nbytes ):
+        # OU dos bitmaps dos valores escolhidos; None quando não há o que filtrar
+        bitmaps = self.bitmaps[col]
+        values = set( values )
+        if self.complete[col] and values.issuperset( bitmaps ):
+            return None
+
+        mask = np.zeros( nbytes, dtype=np.uint8 )
+        for value in values:
+            if value in bitmaps:
+                np.bitwise_or( mask, bitmaps[value][:nbytes], out=mask )
+        return mask
+
+
+    def mask( self, date_before=None, **filters ):
+
+        """ Filtros combinados, ainda compactados (um bit por linha).
+
+            Input: data limite (exclusiva) e, por coluna de BITMAP_COLUMNS, a
+                   lista de valores aceitos. Ex.: Road_traffic_density=['Low', 'Jam']
+            Output: (número de linhas antes da data limite, bitmap ou None
+                    quando só há o filtro de data)
+        """
+        end = self.date_end( date_before )
+        nbytes = ( end + 7 ) // 8
+
+        mask = None
+        for col, values in filters.items():
+            if values is None:
+                continue
+            col_mask = self.column_mask( col, values, nbytes )
+            if col_mask is None:
+                continue
+            mask = col_mask if mask is None else np.bitwise_and( mask, col_mask )
+
+        return end, mask
+
+
+    def positions( self, date_before=None, **filters ):
+
+        """ Posições (nas linhas ordenadas) que passam nos filtros (mesmos
+            argumentos de mask).
+
+            Output: slice (só filtro de data) ou array de posições
+        """
+        return unpack_positions( *self.mask( date_before, **filters ) )
+
+
+    def select( self, date_before=None, **filters ):
+
+        """ Linhas que passam nos filtros (mesmos argumentos de mask). """
+        return Selection( self.frame, *self.mask( date_before, **filters ) )
+
+
+
+def unpack_positions( end, mask ):
+    # Bitmap -> posições das linhas marcadas (slice quando não há bitmap)
+    if mask is None:
+        return slice( 0, end )
+    return np.flatnonzero( np.unpackbits( mask, count=end ) )
+
+
+
+class Selection:
+
+    """ Linhas filtradas de um dataframe compartilhado, sem copiá-lo.
+
+        Guarda o bitmap dos filtros (um bit por linha); as posições só são
+        calculadas e cada coluna só é montada quando ela é pedida:
+        selection['col'] devolve uma Series (fatia sem cópia ou apenas os
+        valores selecionados) e selection[['a', 'b']] um Dataframe com essas
+        colunas. Um rerun cujos resultados já estão guardados (PageViews) não
+        lê nenhuma coluna, e os demais ocupam memória só com as colunas usadas.
+    """
+
+    def __init__( self, frame, end, mask=None ):
+        self.frame = frame
+        self.columns = frame.columns
+        self._end = end
+        self._mask = mask
+        self._rows = None
+        self._series = {}
+
+
+    @property
+    def rows( self ):
+        # slice ou array de posições no dataframe compartilhado
+        if self._rows is None:
+            self._rows = unpack_positions( self._end, self._mask )
+        return self._rows
+
+
+    def __len__( self ):
+        if self._mask is None:
+            return self._end
+        return len( self.rows )
+
+
+    @property
+    def nbytes( self ):
+        # Memória própria da seleção (bitmap, posições e colunas já montadas),
+        # sem o dataframe compartilhado
+        size = 0 if self._mask is None else self._mask.nbytes
+        # Com um slice as colunas são fatias do dataframe (sem cópia)
+        if self._rows is not None and not isinstance( self._rows, slice ):
+            size += self._rows.nbytes
+            for series in list( self._series.values() ):
+                size += int( series.memory_usage( index=True ) )
+        return size
+
+
+    def __getitem__( self, key ):
+        if isinstance( key, str ):
+            series = self._series.get( key )
+            if series is None:
+                column = self.frame[key]
+                if isinstance( self.rows, slice ):
+                    series = column.iloc[self.rows]
+                else:
+                    series = column.take( self.rows )
+                self._series[key] = series
+            return series
+
+        return pd.DataFrame( { col: self[col] for col in key } )
+
+
+
+def load_index( path=DATASET_PATH ):
+
+    """ Devolve o OrderIndex do dataset limpo. Ele é montado uma vez por
+        processo e refeito apenas quando load_data devolver um dataframe novo.
+    """
+    return load_derived( 'index', OrderIndex, path )
@@ -0,0 +1,167 @@
+# Libraries
+import glob
+import io
+import logging
+import os
+import threading
+
+# bibliotecas necessárias
+import pandas as pd
+
+from utils.cube import CUBE_KEYS, CUBE_VALUES, RunningStats
+from utils.data import DATASET_PATH, clean_code, load_data, read_orders
+
+# ==========================================
+# Ingestão contínua de pedidos com agregados acumulados
+# ==========================================
+
+# Pasta onde chegam os arquivos novos de pedidos (mesmo formato do train.csv)
+LIVE_DIR = r'dataset/incoming'
+
+_live = {}
+_live_lock = threading.Lock()
+
+logger = logging.getLogger( __name__ )
+
+
+class LiveOrders:
+
+    """ Acompanha a pasta LIVE_DIR: cada arquivo .csv novo, ou as linhas
+        acrescentadas ao final de um arquivo já lido, são limpos com as mesmas
+        regras do clean_code e somados ao cubo de agregados (RunningStats nas
+        dimensões CUBE_KEYS), que começa com o histórico do dataset/train.csv.
+
+        Os arquivos da pasta devem apenas crescer: linhas são lidas uma única
+        vez, a partir da posição em que a leitura anterior parou. Um lote que
+        não pode ser lido ou limpo é descartado (com um aviso no log e um
+        registro em rejected), e a leitura continua depois dele.
+    """
+
+    def __init__( self, live_dir=LIVE_DIR, path=DATASET_PATH ):
+        self.live_dir = live_dir
+        self.path = path
+        self.lock = threading.Lock()
+        self.history = None
+        self.stats = None
+        # {arquivo: (bytes já lidos, linha de cabeçalho)}
+        self.offsets = {}
+        # Muda a cada lote somado ao cubo (versão dos resultados em cache)
+        self.revision = 0
+        # Lotes descartados: (arquivo, byte inicial, byte final, erro)
+        self.rejected = []
+        # Linhas limpas de cada lote somado: (revisão, dataframe)
+        self.batches = []
+
+
+    def _read_new_rows( self, filename ):
+        # Lê apenas as linhas completas que chegaram depois da última leitura
+        offset, header = self.offsets.get( filename, ( 0, b'' ) )
+        if os.path.getsize( filename ) <= offset:
+            return None
+
+        with open( filename, 'rb' ) as f:
+            f.seek( offset )
+            data = f.read()
+
+        end = data.rfind( b'\n' ) + 1
+        if end == 0:
+            # Linha ainda sendo escrita
+            return None
+        data = data[:end]
+
+        if offset == 0:
+            header_end = data.find( b'\n' ) + 1
+            header, data = data[:header_end], data[header_end:]
+
+        batch = None
+        if data.strip():
+            try:
+                batch = clean_code( read_orders( io.BytesIO( header + data ) ) )
+            except Exception as error:
+                # Lote malformado: registrado e descartado uma única vez, em
+                # vez de falhar a cada rerun das páginas
+                logger.warning( 'Lote descartado: %s, bytes %d a %d: %s', filename, offset, offset + end, error )
+                self.rejected.append( ( filename, offset, offset + end, repr( error ) ) )
+
+        # A posição só avança depois da leitura e da limpeza do lote (um erro
+        # ao abrir o arquivo deixa o lote para o próximo refresh)
+        self.offsets[filename] = ( offset + end, header )
+
+        return batch
+
+
+    def refresh( self ):
+
+        """ Soma aos agregados as linhas novas da pasta. O custo é proporcional
+            às linhas novas; se o train.csv mudar, os agregados são refeitos.
+        """
+        with self.lock:
+            history = load_data( self.path )
+            if history is not self.history:
+                self.history = history
+                self.stats = RunningStats( CUBE_KEYS, CUBE_VALUES ).update( history )
+                self.offsets = {}
+                self.batches = []
+                self.revision += 1
+
+            for filename in sorted( glob.glob( os.path.join( self.live_dir, '*.csv' ) ) ):
+                batch = self._read_new_rows( filename )
+                if batch is not None:
+                    self.stats.update( batch )
+                    self.revision += 1
+                    self.batches.append( ( self.revision, batch ) )
+
+        return self
+
+
+    @property
+    def cube( self ):
+        # Cubo com o histórico e todas as linhas já ingeridas
+        return self.stats.table
+
+
+    def state( self ):
+        # Cubo e revisão lidos juntos (outra sessão pode estar somando um lote)
+        with self.lock:
+            return self.stats.table, self.revision
+
+
+    def rows( self, revision, date_slider, traffic_options, columns=None ):
+
+        """ Linhas ingeridas até a revisão (a do cubo usado pela página) que
+            passam nos filtros da barra lateral. Com o histórico (OrderIndex),
+            são as mesmas linhas somadas no cubo filtrado.
+
+            Input: revisão (LiveOrders.state), filtros e colunas (None: todas)
+            Output: Dataframe (vazio se nenhuma linha passar)
+        """
+        with self.lock:
+            batches = [ batch for batch_revision, batch in self.batches if batch_revision <= revision ]
+
+        frames = []
+        for batch in batches:
+            linhas_selecionadas = ( batch['Order_Date'] < date_slider ) & batch['Road_traffic_density'].isin( traffic_options )
+            batch = batch.loc[linhas_selecionadas, :]
+            frames.append( batch if columns is None else batch.loc[:, columns] )
+
+        if not frames:
+            return pd.DataFrame( columns=columns )
+        return pd.concat( frames, ignore_index=True )
+
+
+
+def live_orders( live_dir=LIVE_DIR, path=DATASET_PATH ):
+
+    """ Devolve o LiveOrders do processo (compartilhado entre páginas e
+        sessões) já atualizado, ou None se a pasta de ingestão não existir.
+    """
+    if not os.path.isdir( live_dir ):
+        return None
+
+    key = ( os.path.abspath( live_dir ), os.path.abspath( path ) )
+    with _live_lock:
+        live = _live.get( key )
+        if live is None:
+            live = _live[key] = LiveOrders( live_dir, path )
+
+    return live.refresh()
@@ -0,0 +1,146 @@
+# Libraries
+from collections import namedtuple
+
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from utils.cube import CUBE_KEYS, CUBE_VALUES
+
+# ==========================================
+# KPIs dos cartões (st.metric) calculados numa única passada
+# ==========================================
+
+# Um KPI: função ('count', 'mean', 'std', 'min', 'max' ou 'nunique'), coluna,
+# filtro opcional {coluna: valor} e casas decimais (None: sem arredondar)
+KPI = namedtuple( 'KPI', ['func', 'column', 'where', 'decimals'], defaults=[None, None] )
+
+# Funções que o cubo responde (a partir de count, sum, sumsq, min e max)
+CUBE_FUNCS = { 'count', 'mean', 'std', 'min', 'max' }
+
+
+def _mask( source, where ):
+    # Linhas (ou células do cubo) que passam no filtro do KPI; None = todas
+    mask = None
+    for col, value in where:
+        if isinstance( getattr( source, 'index', None ), pd.MultiIndex ) and col in source.index.names:
+            values = source.index.get_level_values( col )
+        else:
+            values = source[col]
+        col_mask = np.asarray( values == value )
+        mask = col_mask if mask is None else mask & col_mask
+    return mask
+
+
+
+def _cube_stats( cube, column, mask ):
+    # count, sum, sumsq, min e max somados nas células selecionadas
+    cells = cube if mask is None else cube.loc[mask]
+    return { 'count': cells[column + '|count'].sum(),
+             'sum': cells[column + '|sum'].sum(),
+             'sumsq': cells[column + '|sumsq'].sum(),
+             'min': cells[column + '|min'].min(),
+             'max': cells[column + '|max'].max() }
+
+
+
+def _row_stats( df1, column, mask ):
+    # Mesmas estatísticas a partir das linhas (valores ausentes ignorados)
+    values = df1[column].values if mask is None else df1[column].values[mask]
+    if values.dtype.kind == 'f':
+        values = values[~np.isnan( values )]
+    if len( values ) == 0:
+        return { 'count': 0, 'sum': 0.0, 'sumsq': 0.0, 'min': np.nan, 'max': np.nan }
+
+    as_float = values.astype( np.float64 )
+    return { 'count': len( values ), 'sum': as_float.sum(), 'sumsq': ( as_float * as_float ).sum(),
+             'min': values.min(), 'max': values.max() }
+
+
+
+def _nunique( df1, column, mask ):
+    # Número de valores distintos (pelos códigos, se a coluna for categórica)
+    values = df1[column]
+    if isinstance( values.dtype, pd.CategoricalDtype ):
+        codes = values.cat.codes.values if mask is None else values.cat.codes.values[mask]
+        return int( np.count_nonzero( np.bincount( codes[codes >= 0], minlength=1 ) ) )
+    values = values.values if mask is None else values.values[mask]
+    return len( pd.unique( values[pd.notna( values )] ) )
+
+
+
+def _value( func, stats ):
+    n = stats['count']
+    if func == 'count':
+        return int( n )
+    if func in ( 'min', 'max' ):
+        return stats[func]
+    if func == 'mean':
+        return stats['sum'] / n if n else np.nan
+    # Desvio padrão amostral (ddof=1), como o std do pandas
+    if n < 2:
+        return np.nan
+    return np.sqrt( max( stats['sumsq'] - stats['sum'] ** 2 / n, 0.0 ) / ( n - 1 ) )
+
+
+
+def kpi_columns( kpis ):
+    # Colunas lidas pelos KPIs (valores e filtros), na ordem em que aparecem
+    columns = []
+    for kpi in kpis.values():
+        for col in [kpi.column] + list( kpi.where or {} ):
+            if col not in columns:
+                columns.append( col )
+    return columns
+
+
+
+def compute_kpis( kpis, df1, cube=None, ingested=None ):
+
+    """ Calcula todos os KPIs declarados pela página de uma vez.
+
+        Cada filtro (where) é avaliado uma única vez e as estatísticas de
+        cada (filtro, coluna) são calculadas uma única vez, qualquer que seja
+        o número de KPIs que as usem (ex.: média e desvio padrão do tempo com
+        festival). KPIs que o cubo responde (colunas de CUBE_VALUES, filtros
+        em CUBE_KEYS) usam o cubo, que também inclui os pedidos ingeridos;
+        os demais (ex.: nunique, idade) usam as linhas filtradas, somadas às
+        linhas ingeridas (ingested) quando o cubo as inclui: todos os cartões
+        saem da mesma versão dos dados.
+
+        Input: {nome: KPI}, linhas filtradas e, opcionalmente, o cubo filtrado
+               e as linhas ingeridas que passam nos filtros (LiveOrders.rows)
+        Output: {nome: valor}
+    """
+    if ingested is not None and len( ingested ):
+        columns = kpi_columns( kpis )
+        df1 = pd.concat( [ df1[columns], ingested.loc[:, columns] ], ignore_index=True )
+
+    masks = {}
+    stats = {}
+    results = {}
+
+    for name, kpi in kpis.items():
+        where = tuple( sorted( ( kpi.where or {} ).items() ) )
+        use_cube = ( cube is not None and kpi.func in CUBE_FUNCS and kpi.column in CUBE_VALUES
+                     and all( col in CUBE_KEYS for col, _ in where ) )
+        source = cube if use_cube else df1
+
+        mask_key = ( use_cube, where )
+        if mask_key not in masks:
+            masks[mask_key] = _mask( source, where )
+        mask = masks[mask_key]
+
+        if kpi.func == 'nunique':
+            value = _nunique( df1, kpi.column, mask )
+        else:
+            stats_key = ( use_cube, where, kpi.column )
+            if stats_key not in stats:
+                stats[stats_key] = ( _cube_stats if use_cube else _row_stats )( source, kpi.column, mask )
+            value = _value( kpi.func, stats[stats_key] )
+
+        if kpi.decimals is not None:
+            value = np.round( value, kpi.decimals )
+        results[name] = value
+
+    return results
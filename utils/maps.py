@@ -0,0 +1,81 @@
+# bibliotecas necessárias
+import numpy as np
+import folium
+from folium.plugins import FastMarkerCluster, HeatMap
+
+# ==========================================
+# Mapas com muitos pontos
+# ==========================================
+
+# Até este número de pontos o mapa usa marcadores agrupados (cluster montado
+# no navegador a partir de um único array); acima disso, mapa de calor
+CLUSTER_LIMIT = 5000
+
+# Tamanho inicial da célula do mapa de calor (graus, ~1 km) e número máximo
+# de células enviadas ao navegador
+HEATMAP_BIN_DEG = 0.01
+HEATMAP_MAX_CELLS = 20000
+
+
+def bulk_markers( map, lat, lon, popups ):
+
+    """ Adiciona um marcador por ponto a partir de arrays (sem iterrows). """
+    for point_lat, point_lon, popup in zip( np.asarray( lat ).tolist(), np.asarray( lon ).tolist(), popups ):
+        folium.Marker( [point_lat, point_lon], popup=popup ).add_to( map )
+
+    return map
+
+
+
+def bin_points( lat, lon, bin_deg=HEATMAP_BIN_DEG, max_cells=HEATMAP_MAX_CELLS ):
+
+    """ Agrupa os pontos em células de uma grade (no servidor). A célula
+        dobra de tamanho até caberem no máximo max_cells células.
+
+        Input: arrays de latitude e longitude
+        Output: latitude e longitude médias de cada célula e número de pontos
+    """
+    lat = np.asarray( lat, dtype=np.float64 )
+    lon = np.asarray( lon, dtype=np.float64 )
+
+    while True:
+        row = np.floor( ( lat + 90 ) / bin_deg ).astype( np.int64 )
+        col = np.floor( ( lon + 180 ) / bin_deg ).astype( np.int64 )
+        cells, inverse, counts = np.unique( row * ( int( 360 / bin_deg ) + 1 ) + col,
+                                            return_inverse=True, return_counts=True )
+        if len( cells ) <= max_cells:
+            break
+        bin_deg *= 2
+
+    cell_lat = np.bincount( inverse, weights=lat ) / counts
+    cell_lon = np.bincount( inverse, weights=lon ) / counts
+
+    return cell_lat, cell_lon, counts
+
+
+
+def point_layer( map, lat, lon, name=None ):
+
+    """ Camada com muitos pontos: cluster de marcadores para poucos pontos e
+        mapa de calor pré-agrupado (bin_points) para muitos.
+    """
+    lat = np.asarray( lat, dtype=np.float64 )
+    lon = np.asarray( lon, dtype=np.float64 )
+
+    if len( lat ) <= CLUSTER_LIMIT:
+        FastMarkerCluster( np.column_stack( [lat, lon] ).tolist(), name=name ).add_to( map )
+    else:
+        cell_lat, cell_lon, counts = bin_points( lat, lon )
+        weights = counts / counts.max()
+        HeatMap( np.column_stack( [cell_lat, cell_lon, weights] ).tolist(), name=name ).add_to( map )
+
+    if len( lat ):
+        map.fit_bounds( [[lat.min(), lon.min()], [lat.max(), lon.max()]] )
+
+    return map
+
+
+
+def map_html( map ):
+    # Mesmo html gerado pelo folium_static
+    return folium.Figure().add_child( map ).render()
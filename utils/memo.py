@@ -0,0 +1,204 @@
+# Libraries
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from utils.data import DATASET_PATH
+from utils.precompute import dataset_version, filter_key
+
+# ==========================================
+# Resultados compartilhados entre páginas e sessões
+# ==========================================
+#
+# As três páginas aplicam os mesmos filtros da barra lateral aos mesmos
+# dados. Os resultados que dependem só dos filtros (linhas selecionadas,
+# cubo filtrado, agregados das consultas) e os resultados de cada página
+# (PageViews) ficam num cache do processo indexado por
+#
+#     (versão do dataset, data limite, condições de trânsito, nome)
+#
+# Trocar de página, ou outra sessão com os mesmos filtros, reaproveita o que
+# já foi calculado. O cache é LRU com orçamento em bytes (CURRY_MEMO_MB): ao
+# passar do orçamento, os resultados usados há mais tempo são descartados.
+
+MEMO_BYTES = int( os.environ.get( 'CURRY_MEMO_MB', '256' ) ) << 20
+
+
+def sizeof( value, _seen=None ):
+
+    """ Estimativa dos bytes de um resultado (arrays e dataframes pelo
+        tamanho dos dados; figuras pelo dicionário do plotly; outros objetos
+        pelos seus atributos). Objetos com nbytes (ex.: Selection, arrays
+        numpy) informam o próprio tamanho.
+    """
+    seen = set() if _seen is None else _seen
+    if id( value ) in seen:
+        return 0
+    seen.add( id( value ) )
+
+    if hasattr( value, 'nbytes' ):
+        return int( value.nbytes )
+    if isinstance( value, ( pd.DataFrame, pd.Series, pd.Index ) ):
+        usage = value.memory_usage( index=True )
+        return int( usage.sum() if isinstance( usage, pd.Series ) else usage )
+    if isinstance( value, ( str, bytes ) ):
+        return sys.getsizeof( value )
+    if isinstance( value, dict ):
+        return sys.getsizeof( value ) + sum( sizeof( k, seen ) + sizeof( v, seen ) for k, v in value.items() )
+    if isinstance( value, ( list, tuple, set, frozenset ) ):
+        return sys.getsizeof( value ) + sum( sizeof( v, seen ) for v in value )
+    if hasattr( value, 'to_plotly_json' ):
+        return sizeof( value.to_plotly_json(), seen )
+    if hasattr( value, '__dict__' ):
+        return sys.getsizeof( value ) + sizeof( vars( value ), seen )
+
+    return sys.getsizeof( value )
+
+
+
+class SharedMemo:
+
+    """ Cache LRU do processo com orçamento em bytes.
+
+        get( chave, função, *args ) devolve o resultado guardado ou chama
+        função( *args ) e guarda o resultado. Se várias sessões pedem a mesma
+        chave ao mesmo tempo, só uma calcula e as demais esperam por ela.
+        Resultados maiores que o orçamento inteiro não são guardados.
+    """
+
+    def __init__( self, max_bytes=MEMO_BYTES ):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # {chave: [resultado, bytes]}, do usado há mais tempo ao mais recente
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.total = 0
+        # Versão do dataset das chaves guardadas (keep_version)
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def _evict( self ):
+        while self.total > self.max_bytes and self.entries:
+            _, ( _, size ) = self.entries.popitem( last=False )
+            self.total -= size
+            self.evictions += 1
+
+
+    def get( self, key, func, *args, **kwargs ):
+        while True:
+            with self.lock:
+                entry = self.entries.get( key )
+                if entry is not None:
+                    self.entries.move_to_end( key )
+                    self.hits += 1
+                    value = entry[0]
+                    if isinstance( value, np.ndarray ) or not hasattr( value, 'nbytes' ):
+                        return value
+                    # Resultados que crescem depois de guardados (ex.: colunas
+                    # montadas sob demanda da Selection) são medidos de novo
+                    size = sizeof( value )
+                    self.total += size - entry[1]
+                    entry[1] = size
+                    self._evict()
+                    return value
+
+                pending = self.pending.get( key )
+                if pending is None:
+                    pending = self.pending[key] = threading.Event()
+                    break
+
+            # Outra sessão está calculando a mesma chave
+            pending.wait()
+
+        try:
+            value = func( *args, **kwargs )
+        finally:
+            with self.lock:
+                del self.pending[key]
+            pending.set()
+
+        size = sizeof( value )
+        with self.lock:
+            self.misses += 1
+            if size <= self.max_bytes and key not in self.entries:
+                self.entries[key] = [value, size]
+                self.total += size
+                self._evict()
+
+        return value
+
+
+    def keep_version( self, version ):
+
+        """ Descarta as chaves de outras versões do dataset quando a versão
+            muda (csv alterado): elas não seriam mais pedidas e as linhas
+            selecionadas prendem o dataframe antigo, que não entra na conta
+            dos bytes.
+        """
+        if version == self.version:
+            return
+        with self.lock:
+            for key in [ key for key in self.entries if key[0].split( '+' )[0] != version ]:
+                _, size = self.entries.pop( key )
+                self.total -= size
+            self.version = version
+
+
+    def clear( self ):
+        with self.lock:
+            self.entries.clear()
+            self.total = 0
+
+
+    def stats( self ):
+        with self.lock:
+            return { 'entries': len( self.entries ), 'bytes': self.total, 'max_bytes': self.max_bytes,
+                     'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions }
+
+
+
+shared_memo = SharedMemo()
+
+
+class FilterMemo:
+
+    """ Resultados de uma combinação (versão do dataset, filtros) no cache
+        compartilhado. get( nome, função, *args ) como o SharedMemo.get; o
+        nome deve identificar a função e os argumentos que não são filtros.
+    """
+
+    def __init__( self, version, date_slider, traffic_options, memo=None ):
+        self.memo = memo if memo is not None else shared_memo
+        self.prefix = ( version, filter_key( date_slider, traffic_options ) )
+
+
+    def get( self, name, func, *args, **kwargs ):
+        return self.memo.get( self.prefix + ( name, ), func, *args, **kwargs )
+
+
+
+def filter_memo( date_slider, traffic_options, live_revision=None, path=DATASET_PATH ):
+
+    """ FilterMemo dos filtros escolhidos.
+
+        Com pedidos ingeridos (utils.ingest), a versão inclui a revisão do
+        cubo usado pela página (LiveOrders.state): os resultados são refeitos
+        quando chegam linhas novas.
+
+        Input: filtros da barra lateral e a revisão do cubo (ou None)
+        Output: FilterMemo
+    """
+    version = dataset_version( path )
+    shared_memo.keep_version( version )
+    if live_revision is not None:
+        version = '{}+live{}'.format( version, live_revision )
+
+    return FilterMemo( version, date_slider, traffic_options )
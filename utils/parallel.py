@@ -0,0 +1,146 @@
+# Libraries
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# bibliotecas necessárias
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from utils.data import clean_code, read_orders
+
+# ==========================================
+# Limpeza em paralelo (vários processos)
+# ==========================================
+#
+# O csv é dividido em faixas de bytes que terminam no fim de uma linha; cada
+# processo lê e limpa a sua faixa (read_orders + clean_code) e o processo
+# principal junta os dataframes. O resultado é idêntico ao caminho serial:
+# mesmas linhas, mesmo índice, mesmos tipos e mesmas categorias.
+#
+# Supõe que nenhum valor do csv tem quebra de linha entre aspas (vale para o
+# dataset de pedidos).
+
+# Workers: CURRY_LOAD_WORKERS=N força N processos (1 = serial); sem a
+# variável, usa um processo por núcleo quando o csv é grande
+WORKERS = int( os.environ.get( 'CURRY_LOAD_WORKERS', '0' ) )
+
+# Bytes mínimos por processo no modo automático: abaixo disso iniciar os
+# processos custa mais do que limpar o csv num só
+MIN_RANGE_BYTES = 32 << 20
+
+
+def available_cores():
+    # Núcleos disponíveis para este processo (não os da máquina inteira)
+    if hasattr( os, 'sched_getaffinity' ):
+        return len( os.sched_getaffinity( 0 ) )
+    return os.cpu_count() or 1
+
+
+
+def load_workers( path, workers=WORKERS ):
+
+    """ Número de processos para limpar o csv (1 = caminho serial). """
+    if workers > 0:
+        return workers
+
+    size = os.path.getsize( path )
+    return max( 1, min( available_cores(), size // MIN_RANGE_BYTES ) )
+
+
+
+def byte_ranges( path, parts ):
+
+    """ Divide o csv (sem o cabeçalho) em até `parts` faixas de bytes, cada
+        uma terminando no fim de uma linha.
+
+        Input: caminho do csv e número de faixas
+        Output: (cabeçalho em bytes, lista de (início, fim))
+    """
+    size = os.path.getsize( path )
+    with open( path, 'rb' ) as f:
+        header = f.readline()
+        start = f.tell()
+
+        ranges = []
+        for i in range( 1, parts + 1 ):
+            if i < parts:
+                # Avança até o fim da linha que contém a posição proporcional
+                f.seek( max( start, start + ( size - start ) * i // parts - 1 ) )
+                f.readline()
+                end = min( f.tell(), size )
+            else:
+                end = size
+            if end > start:
+                ranges.append( ( start, end ) )
+                start = end
+
+    return header, ranges
+
+
+
+def clean_range( path, header, start, end ):
+
+    """ Lê e limpa uma faixa do csv (roda dentro de um processo do pool).
+
+        Output: (linhas lidas da faixa, dataframe limpo)
+    """
+    with open( path, 'rb' ) as f:
+        f.seek( start )
+        data = f.read( end - start )
+
+    df_raw = read_orders( io.BytesIO( header + data ) )
+    return len( df_raw ), clean_code( df_raw )
+
+
+
+def concat_clean( parts ):
+
+    """ Junta os dataframes limpos das faixas como se fossem um só.
+
+        - índice: as linhas de cada faixa são deslocadas pelo número de
+          linhas lidas nas faixas anteriores (posição da linha no csv)
+        - categorias: união das categorias de todas as faixas, em ordem
+          alfabética (como o passo 5 do clean_code)
+
+        Input: lista de (linhas lidas, dataframe limpo), na ordem do csv
+        Output: Dataframe limpo
+    """
+    frames = []
+    offset = 0
+    for rows, df_part in parts:
+        df_part = df_part.copy( deep=False )
+        df_part.index = df_part.index + offset
+        frames.append( df_part )
+        offset += rows
+
+    first = frames[0]
+    for col in first.columns:
+        if isinstance( first[col].dtype, pd.CategoricalDtype ):
+            categories = union_categoricals( [ df_part[col] for df_part in frames ], sort_categories=True ).categories
+            for df_part in frames:
+                df_part[col] = df_part[col].cat.set_categories( categories )
+
+    return pd.concat( frames )
+
+
+
+def read_clean_parallel( path, workers ):
+
+    """ Lê e limpa o csv em `workers` processos.
+
+        Input: caminho do csv e número de processos
+        Output: Dataframe limpo, idêntico a clean_code( read_orders( path ) )
+    """
+    header, ranges = byte_ranges( path, workers )
+    if len( ranges ) <= 1:
+        return clean_code( read_orders( path ) )
+
+    # spawn: os processos não herdam as threads do servidor do streamlit
+    context = multiprocessing.get_context( 'spawn' )
+    with ProcessPoolExecutor( max_workers=len( ranges ), mp_context=context ) as pool:
+        futures = [ pool.submit( clean_range, path, header, start, end ) for start, end in ranges ]
+        parts = [ future.result() for future in futures ]
+
+    return concat_clean( parts )
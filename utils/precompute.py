@@ -0,0 +1,283 @@
+# Libraries
+import argparse
+import datetime
+import itertools
+import os
+import pickle
+import runpy
+import threading
+from collections import OrderedDict
+
+from utils.data import DATASET_PATH, SCHEMA_VERSION, load_data
+
+# ==========================================
+# Resultados pré-calculados por combinação de filtros
+# ==========================================
+#
+# Os filtros da barra lateral têm poucos valores: uma data limite e um
+# subconjunto das condições de trânsito. O comando
+#
+#     python -m utils.precompute
+#
+# roda as páginas sem servidor para as combinações escolhidas e grava, para
+# cada página e combinação, os gráficos (figuras do plotly), tabelas e
+# valores dos KPIs em STORE_DIR. As páginas usam esses resultados quando a
+# combinação existe e calculam na hora caso contrário.
+
+STORE_DIR = r'dataset/precomputed'
+
+PAGES = ['pages/1_visao_empresa.py', 'pages/2_visao_entregadores.py', 'pages/3_visao_restaurantes.py']
+# Página com o mapa: roda uma vez para cada modo do mapa
+MAP_PAGE = 'pages/1_visao_empresa.py'
+
+# Opções da barra lateral (iguais às das páginas)
+DATE_DEFAULT = datetime.datetime( 2022, 4, 13 )
+DATE_MIN = datetime.datetime( 2022, 2, 11 )
+DATE_MAX = datetime.datetime( 2022, 4, 6 )
+TRAFFIC_OPTIONS = ['Low', 'Medius', 'High', 'Jam']
+MAP_MODES = ['Mediana por cidade', 'Locais de entrega', 'Restaurantes']
+
+# Arquivos já lidos pelo processo (LRU): {caminho: resultados}
+LOADED_SIZE = 256
+_loaded = OrderedDict()
+_loaded_lock = threading.Lock()
+
+# Preenchido pelo comando de pré-cálculo: {(página, combinação): resultados}
+_recording = None
+
+
+def dataset_version( path=DATASET_PATH ):
+    # Hash do csv e versão do clean_code: resultados de outro dataset são ignorados
+    df1 = load_data( path )
+    return '{}-v{}'.format( df1.attrs.get( 'source_hash', 'unknown' )[:16], SCHEMA_VERSION.decode() )
+
+
+
+def filter_key( date_slider, traffic_options ):
+
+    """ Nome da combinação de filtros. A ordem das condições de trânsito
+        escolhidas não muda os resultados.
+    """
+    traffic = '-'.join( sorted( set( traffic_options ) ) ) or 'none'
+    return '{:%Y-%m-%d}_{}'.format( date_slider, traffic )
+
+
+
+def store_path( page, key, version, store_dir=STORE_DIR ):
+    return os.path.join( store_dir, version, page, key + '.pkl' )
+
+
+
+class PageViews:
+
+    """ Resultados de uma página para uma combinação de filtros.
+
+        get( nome, função, *args ) devolve o resultado guardado com esse nome
+        (pré-calculado, ou já calculado por esta ou outra sessão com os
+        mesmos filtros, em shared) ou, se não houver, chama função( *args ). No modo de pré-cálculo, os resultados calculados são
+        guardados para gravação.
+    """
+
+    def __init__( self, stored=None, record=None, shared=None, page=None ):
+        self.stored = stored if stored is not None else {}
+        self.record = record
+        # Cache do processo (utils.memo.FilterMemo); nomes prefixados pela página
+        self.shared = shared
+        self.page = page
+
+
+    def get( self, name, func, *args, **kwargs ):
+        if name in self.stored:
+            return self.stored[name]
+
+        if self.shared is not None:
+            result = self.shared.get( '{}|{}'.format( self.page, name ), func, *args, **kwargs )
+        else:
+            result = func( *args, **kwargs )
+        if self.record is not None:
+            self.record[name] = result
+
+        return result
+
+
+
+def _read_store( path ):
+    # Lê o arquivo de resultados, se existir; os arquivos lidos ficam em cache
+    with _loaded_lock:
+        if path in _loaded:
+            _loaded.move_to_end( path )
+            return _loaded[path]
+
+    if not os.path.exists( path ):
+        return None
+
+    try:
+        with open( path, 'rb' ) as f:
+            stored = pickle.load( f )
+    except Exception:
+        # Arquivo incompatível (outra versão das bibliotecas): calcular na hora
+        return None
+
+    with _loaded_lock:
+        _loaded[path] = stored
+        while len( _loaded ) > LOADED_SIZE:
+            _loaded.popitem( last=False )
+
+    return stored
+
+
+
+def recording():
+    # Se as páginas estão rodando pelo comando de pré-cálculo
+    return _recording is not None
+
+
+
+def page_views( page, date_slider, traffic_options, enabled=True, shared=None, path=DATASET_PATH ):
+
+    """ Resultados da página para os filtros escolhidos.
+
+        Input: nome da página, filtros da barra lateral, se o pré-cálculo
+               pode ser usado (ex.: não quando há pedidos novos na pasta de
+               ingestão, que não estão nos arquivos) e o cache compartilhado
+               dos filtros (utils.memo.FilterMemo), com a versão do dataset e
+               a revisão dos pedidos ingeridos
+        Output: PageViews
+    """
+    if not enabled:
+        return PageViews( shared=shared, page=page )
+
+    key = filter_key( date_slider, traffic_options )
+
+    if _recording is not None:
+        # Resultados já calculados em outra execução da mesma combinação
+        # (ex.: outro modo do mapa) são reaproveitados
+        record = _recording.setdefault( ( page, key ), {} )
+        return PageViews( stored=record, record=record )
+
+    return PageViews( stored=_read_store( store_path( page, key, dataset_version( path ) ) ), shared=shared, page=page )
+
+
+
+def write_store( results, version, store_dir=STORE_DIR ):
+
+    """ Grava os resultados gravados pelo modo de pré-cálculo (um arquivo por
+        página e combinação, escrito em um temporário e renomeado).
+    """
+    for ( page, key ), stored in results.items():
+        path = store_path( page, key, version, store_dir )
+        os.makedirs( os.path.dirname( path ), exist_ok=True )
+        tmp = '{}.{}.tmp'.format( path, os.getpid() )
+        with open( tmp, 'wb' ) as f:
+            pickle.dump( stored, f, protocol=pickle.HIGHEST_PROTOCOL )
+        os.replace( tmp, path )
+
+    return len( results )
+
+
+
+def all_dates():
+    # Todas as datas do slider e a data padrão
+    days = ( DATE_MAX - DATE_MIN ).days + 1
+    return [ DATE_MIN + datetime.timedelta( days=i ) for i in range( days ) ] + [DATE_DEFAULT]
+
+
+
+def all_traffic():
+    # Subconjuntos não vazios das condições de trânsito
+    return [ list( traffic ) for size in range( 1, len( TRAFFIC_OPTIONS ) + 1 )
+             for traffic in itertools.combinations( TRAFFIC_OPTIONS, size ) ]
+
+
+
+def standard_combinations():
+
+    """ Combinações padrão: todas as datas com todas as condições de trânsito
+        e a data padrão com cada subconjunto das condições.
+    """
+    combinations = [ ( date, TRAFFIC_OPTIONS ) for date in all_dates() ]
+    combinations += [ ( DATE_DEFAULT, traffic ) for traffic in all_traffic() if traffic != TRAFFIC_OPTIONS ]
+
+    return combinations
+
+
+
+def _run_page( page, date_slider, traffic_options, map_mode ):
+    # Executa a página sem servidor, com os valores dos widgets fixados
+    import streamlit as st
+    from streamlit.delta_generator import DeltaGenerator
+
+    widgets = { 'slider': DeltaGenerator.slider, 'multiselect': DeltaGenerator.multiselect, 'radio': st.radio }
+    DeltaGenerator.slider = lambda self, *args, **kwargs: date_slider
+    DeltaGenerator.multiselect = lambda self, *args, **kwargs: list( traffic_options )
+    # Outros seletores (ex.: abas) ficam no valor padrão
+    st.radio = lambda label, options, index=0, *args, **kwargs: map_mode if map_mode in options else options[index]
+    try:
+        runpy.run_path( page, run_name='__main__' )
+    finally:
+        DeltaGenerator.slider = widgets['slider']
+        DeltaGenerator.multiselect = widgets['multiselect']
+        st.radio = widgets['radio']
+
+
+
+def precompute( combinations, pages=PAGES, path=DATASET_PATH, store_dir=STORE_DIR ):
+
+    """ Roda as páginas para cada combinação de filtros (e cada modo do mapa)
+        e grava os resultados em store_dir.
+
+        Output: número de arquivos gravados
+    """
+    global _recording
+
+    import logging
+    import warnings
+
+    # Streamlit sem servidor avisa a cada chamada de widget
+    warnings.filterwarnings( 'ignore' )
+    logging.disable( logging.WARNING )
+
+    version = dataset_version( path )
+    written = 0
+    for date_slider, traffic_options in combinations:
+        _recording = {}
+        try:
+            for page in pages:
+                for map_mode in MAP_MODES if page == MAP_PAGE else MAP_MODES[:1]:
+                    _run_page( page, date_slider, traffic_options, map_mode )
+            written += write_store( _recording, version, store_dir )
+        finally:
+            _recording = None
+
+    return written
+
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description='Pré-calcula as páginas para combinações de filtros' )
+    parser.add_argument( '--dates', nargs='+', help='datas limite (AAAA-MM-DD); padrão: combinações padrão' )
+    parser.add_argument( '--traffic', nargs='+', help='conjuntos de trânsito separados por vírgula, ex.: Low,Jam' )
+    parser.add_argument( '--all', action='store_true', help='todas as datas com todos os subconjuntos de trânsito' )
+    parser.add_argument( '--store', default=STORE_DIR )
+    args = parser.parse_args( argv )
+
+    if args.dates or args.traffic or args.all:
+        if args.all:
+            dates, traffic = all_dates(), all_traffic()
+        else:
+            dates = [ datetime.datetime.fromisoformat( d ) for d in args.dates ] if args.dates else [DATE_DEFAULT]
+            traffic = [ t.split( ',' ) for t in args.traffic ] if args.traffic else [TRAFFIC_OPTIONS]
+        combinations = list( itertools.product( dates, traffic ) )
+    else:
+        combinations = standard_combinations()
+
+    written = precompute( combinations, store_dir=args.store )
+    print( '{} combinações, {} arquivos gravados em {}'.format( len( combinations ), written, args.store ) )
+
+
+
+if __name__ == '__main__':
+    # As páginas importam utils.precompute: usar esse módulo (e não o __main__)
+    # para que elas vejam o modo de pré-cálculo
+    from utils.precompute import main
+    main()
@@ -0,0 +1,206 @@
+# Libraries
+import os
+import threading
+
+# bibliotecas necessárias
+from utils.cube import summarize
+from utils.data import DATASET_PATH, SCHEMA_VERSION, SNAPSHOT_HASH_KEY, SNAPSHOT_VERSION_KEY, load_data, snapshot_path
+
+# ==========================================
+# Consultas dos gráficos (backend escolhido por página)
+# ==========================================
+#
+# As funções de gráfico pedem os agregados a um objeto de consulta:
+#
+#     query.summarize( by, value )  ->  colunas de `by` e count, avg, std, min, max
+#
+# - pandas: junta as células do cubo (utils.cube) já filtrado, na memória
+# - duckdb: SQL sobre o snapshot parquet das linhas limpas (utils.data), num
+#   motor colunar vetorizado que usa vários núcleos
+#
+# CURRY_QUERY_BACKEND escolhe o backend de todas as páginas e
+# CURRY_QUERY_BACKEND_<PÁGINA> (ex.: CURRY_QUERY_BACKEND_VISAO_EMPRESA) o de
+# uma página. O padrão é pandas.
+#
+# Com um memo (utils.memo.FilterMemo), os agregados ficam no cache
+# compartilhado: a mesma consulta em outra página ou sessão, com os mesmos
+# filtros, não é refeita.
+
+BACKENDS = ['pandas', 'duckdb']
+DEFAULT_BACKEND = 'pandas'
+
+# Conexão do processo (em memória); cada consulta usa um cursor próprio
+_connection = None
+_connection_lock = threading.Lock()
+
+
+class _Query:
+
+    """ summarize( by, value ) com o resultado guardado no memo (se houver). """
+
+    name = None
+    memo = None
+
+    def summarize( self, by, value='Time_taken(min)' ):
+        if self.memo is None:
+            return self._summarize( by, value )
+
+        # Resultados compartilhados: quem usa o dataframe não deve alterá-lo
+        columns = by if isinstance( by, str ) else ','.join( by )
+        key = 'summarize|{}|{}|{}'.format( self.name, columns, value )
+        return self.memo.get( key, self._summarize, by, value )
+
+
+
+class PandasQuery( _Query ):
+
+    """ Consultas sobre o cubo já filtrado (filter_cube). """
+
+    name = 'pandas'
+
+    def __init__( self, cube, memo=None ):
+        self.cube = cube
+        self.memo = memo
+
+
+    def _summarize( self, by, value ):
+        return summarize( self.cube, by, value )
+
+
+
+class DuckDBQuery( _Query ):
+
+    """ Consultas SQL (duckdb) sobre o snapshot parquet, com os filtros da
+        barra lateral aplicados no WHERE.
+    """
+
+    name = 'duckdb'
+
+    def __init__( self, snapshot, date_slider, traffic_options, memo=None ):
+        self.snapshot = snapshot
+        self.date_slider = date_slider
+        self.traffic_options = list( traffic_options )
+        self.memo = memo
+
+
+    def _summarize( self, by, value ):
+
+        """ Mesmo resultado de utils.cube.summarize (grupos ordenados pelas
+            colunas de `by`; std amostral, vazio com menos de 2 linhas).
+        """
+        by = [by] if isinstance( by, str ) else list( by )
+        keys = ', '.join( _quote( col ) for col in by )
+        # Em DOUBLE, como as estatísticas do cubo (ex.: avaliação é float32)
+        column = _quote( value ) + '::DOUBLE'
+
+        # Mesmo filtro do filter_cube: data anterior à data limite e trânsito escolhido
+        traffic = ', '.join( '?' for _ in self.traffic_options ) or 'NULL'
+        sql = ( 'SELECT {keys}, count( {col} ) AS "count", avg( {col} ) AS "avg", '
+                'stddev_samp( {col} ) AS "std", min( {col} ) AS "min", max( {col} ) AS "max" '
+                'FROM read_parquet( {path} ) '
+                'WHERE "Order_Date" < ? AND "Road_traffic_density" IN ( {traffic} ) '
+                'GROUP BY {keys} ORDER BY {keys}' ).format( keys=keys, col=column, traffic=traffic,
+                                                            path=_literal( self.snapshot ) )
+
+        cursor = _cursor()
+        try:
+            df_aux = cursor.execute( sql, [self.date_slider] + self.traffic_options ).df()
+        finally:
+            cursor.close()
+
+        df_aux['count'] = df_aux['count'].astype( 'int64' )
+        return df_aux.loc[:, by + ['count', 'avg', 'std', 'min', 'max']]
+
+
+
+def _quote( name ):
+    # Identificador SQL entre aspas (ex.: "Time_taken(min)")
+    return '"' + name.replace( '"', '""' ) + '"'
+
+
+
+def _literal( text ):
+    return "'" + text.replace( "'", "''" ) + "'"
+
+
+
+def _has_duckdb():
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+
+def _cursor():
+    global _connection
+
+    import duckdb
+
+    if _connection is None:
+        with _connection_lock:
+            if _connection is None:
+                _connection = duckdb.connect( ':memory:' )
+
+    return _connection.cursor()
+
+
+
+def current_snapshot( path=DATASET_PATH ):
+
+    """ Caminho do snapshot parquet se ele corresponde ao csv carregado
+        (mesmo hash e mesma versão do clean_code); caso contrário None (ex.:
+        pasta somente leitura, em que o snapshot não pôde ser regravado).
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+
+    path = os.path.abspath( path )
+    snapshot = snapshot_path( path )
+    source_hash = load_data( path ).attrs.get( 'source_hash' )
+    try:
+        metadata = pq.read_schema( snapshot ).metadata or {}
+    except Exception:
+        return None
+
+    if source_hash is None or metadata.get( SNAPSHOT_HASH_KEY ) != source_hash.encode():
+        return None
+    if metadata.get( SNAPSHOT_VERSION_KEY ) != SCHEMA_VERSION:
+        return None
+
+    return snapshot
+
+
+
+def backend_name( page ):
+
+    """ Backend configurado para a página (variáveis de ambiente). """
+    name = os.environ.get( 'CURRY_QUERY_BACKEND_' + page.upper(),
+                           os.environ.get( 'CURRY_QUERY_BACKEND', DEFAULT_BACKEND ) )
+    if name not in BACKENDS:
+        raise ValueError( 'Backend de consulta desconhecido: {!r} (opções: {})'.format( name, ', '.join( BACKENDS ) ) )
+    return name
+
+
+
+def open_query( page, cube, date_slider, traffic_options, live=False, memo=None, path=DATASET_PATH ):
+
+    """ Objeto de consulta da página para os filtros escolhidos.
+
+        O duckdb só é usado quando o snapshot corresponde ao csv e não há
+        pedidos ingeridos (que estão apenas no cubo); nos demais casos, e
+        se o duckdb não estiver instalado, as consultas usam o cubo (pandas).
+
+        Input: nome da página, cubo já filtrado, filtros da barra lateral, se
+               há pedidos ingeridos e o memo dos filtros (utils.memo)
+        Output: PandasQuery ou DuckDBQuery
+    """
+    if backend_name( page ) == 'duckdb' and not live and _has_duckdb():
+        snapshot = current_snapshot( path )
+        if snapshot is not None:
+            return DuckDBQuery( snapshot, date_slider, traffic_options, memo )
+
+    return PandasQuery( cube, memo )
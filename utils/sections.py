@@ -0,0 +1,45 @@
+# bibliotecas necessárias
+import streamlit as st
+
+from utils import precompute
+
+# ==========================================
+# Abas calculadas sob demanda
+# ==========================================
+#
+# O st.tabs envia o conteúdo de todas as abas a cada rerun (a troca de aba
+# acontece só no navegador). lazy_tabs mostra as abas como um seletor
+# horizontal: o servidor sabe qual aba está ativa e a página calcula apenas
+# o conteúdo dela. Os resultados já calculados ficam no cache compartilhado
+# do processo (utils.memo), então voltar para uma aba não recalcula nada.
+
+
+class LazyTabs:
+
+    """ Abas da página. show( rótulo ) diz se o conteúdo da aba deve ser
+        calculado e desenhado neste rerun.
+    """
+
+    def __init__( self, labels, active, show_all=False ):
+        self.labels = labels
+        self.active = active
+        self.show_all = show_all
+
+
+    def show( self, label ):
+        return self.show_all or label == self.active
+
+
+
+def lazy_tabs( labels, key ):
+
+    """ Substitui st.tabs: seletor horizontal com os rótulos das abas.
+
+        Input: rótulos das abas e chave do widget (única por página)
+        Output: LazyTabs
+    """
+    active = st.radio( 'Aba', labels, horizontal=True, key=key, label_visibility='collapsed' )
+
+    # O pré-cálculo (python -m utils.precompute) precisa de todas as abas
+    return LazyTabs( labels, active, show_all=precompute.recording() )
+
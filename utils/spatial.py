@@ -0,0 +1,270 @@
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from utils.data import DATASET_PATH, load_data, load_derived
+from utils.geo import EARTH_RADIUS_KM, haversine_np
+from utils.timing import timer
+
+# ==========================================
+# Índice espacial de restaurantes e locais de entrega
+# ==========================================
+#
+# Os pontos ficam numa grade de células de CELL_KM (em graus de latitude; as
+# células são quadradas em graus). Os pontos são ordenados pela chave da
+# célula (linha da grade, coluna da grade): as células de uma mesma linha da
+# grade são contíguas, então a caixa que envolve um círculo vira uma busca
+# binária por linha da grade, e só os pontos dessas células passam pelo
+# cálculo exato da distância (haversine).
+#
+# Restaurantes não têm ID no dataset: cada par distinto de coordenadas do
+# restaurante é um restaurante, numerado na ordem (latitude, longitude).
+
+# Lado das células da grade (km ao longo de um meridiano)
+CELL_KM = 2.0
+
+KM_PER_DEGREE = EARTH_RADIUS_KM * np.pi / 180
+
+# Meia volta na Terra: nenhum ponto fica mais longe do que isso
+MAX_DISTANCE_KM = EARTH_RADIUS_KM * np.pi
+
+# Chave da célula: linha * _ROW_STRIDE + coluna + _COLUMN_OFFSET (int64)
+_ROW_STRIDE = 1 << 32
+_COLUMN_OFFSET = 1 << 31
+
+
+class GridIndex:
+
+    """ Grade sobre pontos (latitude, longitude) em graus.
+
+        within devolve os pontos a até R km de um ponto e nearest os k pontos
+        mais próximos, olhando apenas as células perto do ponto: o custo
+        depende do número de pontos próximos, não do total.
+    """
+
+    def __init__( self, lat, lon, cell_km=CELL_KM ):
+        self.lat = np.asarray( lat, dtype=np.float64 )
+        self.lon = np.asarray( lon, dtype=np.float64 )
+        self.cell_km = cell_km
+        self.cell_deg = cell_km / KM_PER_DEGREE
+
+        # Pontos sem coordenadas ficam fora da grade
+        valid = np.flatnonzero( ~( np.isnan( self.lat ) | np.isnan( self.lon ) ) )
+        keys = self._keys( self.lat[valid], self.lon[valid] )
+        order = np.argsort( keys, kind='stable' )
+        self.keys = keys[order]
+        # Posição original de cada ponto, na ordem das chaves
+        self.points = valid[order]
+
+
+    def __len__( self ):
+        return len( self.points )
+
+
+    def _cell( self, degrees ):
+        return np.floor( np.asarray( degrees ) / self.cell_deg ).astype( np.int64 )
+
+
+    def _keys( self, lat, lon ):
+        return self._cell( lat ) * _ROW_STRIDE + self._cell( lon ) + _COLUMN_OFFSET
+
+
+    def candidates( self, lat, lon, radius_km ):
+
+        """ Pontos das células que cobrem o círculo (um superconjunto dos
+            pontos a até radius_km do centro), sem ordem definida.
+        """
+        if len( self.keys ) == 0 or radius_km < 0:
+            return np.array( [], dtype=np.int64 )
+
+        # Caixa em graus que contém o círculo (latitude: ao longo do meridiano;
+        # longitude: maior abertura do círculo, na latitude do centro)
+        angle = min( radius_km / EARTH_RADIUS_KM, np.pi )
+        lat_lo = lat - np.degrees( angle )
+        lat_hi = lat + np.degrees( angle )
+        ratio = np.sin( angle ) / np.cos( np.radians( lat ) ) if abs( lat ) < 90 else np.inf
+
+        if lat_lo <= -90 or lat_hi >= 90 or ratio >= 1:
+            # Círculo passa por um polo: todas as longitudes
+            col_lo, col_hi = -_COLUMN_OFFSET, _COLUMN_OFFSET - 1
+        else:
+            dlon = np.degrees( np.arcsin( ratio ) )
+            if lon - dlon < -180 or lon + dlon > 180:
+                # Atravessa o antimeridiano: também todas as longitudes
+                col_lo, col_hi = -_COLUMN_OFFSET, _COLUMN_OFFSET - 1
+            else:
+                col_lo, col_hi = self._cell( lon - dlon ), self._cell( lon + dlon )
+
+        rows = np.arange( self._cell( max( lat_lo, -90.0 ) ), self._cell( min( lat_hi, 90.0 ) ) + 1, dtype=np.int64 )
+        starts = np.searchsorted( self.keys, rows * _ROW_STRIDE + col_lo + _COLUMN_OFFSET, side='left' )
+        ends = np.searchsorted( self.keys, rows * _ROW_STRIDE + col_hi + _COLUMN_OFFSET, side='right' )
+
+        return np.concatenate( [ self.points[start:end] for start, end in zip( starts, ends ) if end > start ]
+                               or [ np.array( [], dtype=np.int64 ) ] )
+
+
+    def within( self, lat, lon, radius_km ):
+
+        """ Pontos a até radius_km (inclusive) do ponto (lat, lon).
+
+            Output: (posições em ordem crescente, distâncias em km)
+        """
+        positions = np.sort( self.candidates( lat, lon, radius_km ) )
+        distances = haversine_np( lat, lon, self.lat[positions], self.lon[positions] )
+        keep = distances <= radius_km
+        return positions[keep], distances[keep]
+
+
+    def nearest( self, lat, lon, k ):
+
+        """ Os k pontos mais próximos do ponto (lat, lon); empates ficam na
+            ordem das posições.
+
+            O raio de busca começa numa célula e dobra até ter k pontos no
+            círculo: os k mais próximos estão todos dentro dele.
+
+            Output: (posições, distâncias em km), do mais próximo ao mais distante
+        """
+        k = min( k, len( self ) )
+        radius = self.cell_km
+        while True:
+            positions, distances = self.within( lat, lon, radius )
+            if len( positions ) >= k or radius >= MAX_DISTANCE_KM:
+                break
+            radius *= 2
+
+        order = np.lexsort( ( positions, distances ) )[:k]
+        return positions[order], distances[order]
+
+
+
+def restaurant_ids( lat, lon ):
+
+    """ Um ID por par distinto de coordenadas, numerados na ordem
+        (latitude, longitude); linhas sem coordenadas recebem -1.
+
+        Input: arrays de latitude e longitude dos restaurantes
+        Output: (ID de cada linha, array n x 2 com as coordenadas de cada ID)
+    """
+    # O par vira um número complexo (um só valor por linha para o factorize);
+    # números complexos são ordenados pela parte real e depois pela imaginária
+    pairs = np.asarray( lat, dtype=np.float64 ) + 1j * np.asarray( lon, dtype=np.float64 )
+    codes, uniques = pd.factorize( pairs )
+
+    order = np.argsort( uniques, kind='stable' )
+    rank = np.empty( len( order ) + 1, dtype=np.int64 )
+    rank[order] = np.arange( len( order ) )
+    rank[-1] = -1
+
+    uniques = uniques[order]
+    return rank[codes], np.column_stack( [ uniques.real, uniques.imag ] )
+
+
+
+class SpatialIndex:
+
+    """ Restaurantes e locais de entrega do dataset limpo.
+
+        - restaurant: ID do restaurante de cada pedido (restaurant_ids)
+        - restaurants: coordenadas de cada restaurante
+        - os pedidos de cada restaurante ficam agrupados (posições em ordem
+          crescente), para o detalhamento de um restaurante sem percorrer
+          os pedidos
+        - uma grade sobre os restaurantes e outra sobre os locais de entrega
+
+        As posições são as linhas do dataframe recebido (o de load_data, o
+        mesmo das seleções do OrderIndex).
+    """
+
+    def __init__( self, df1, cell_km=CELL_KM ):
+        self.frame = df1
+        self.restaurant, self.restaurants = restaurant_ids( df1['Restaurant_latitude'].values,
+                                                            df1['Restaurant_longitude'].values )
+
+        counts = np.bincount( self.restaurant[self.restaurant >= 0], minlength=len( self.restaurants ) )
+        self.orders = counts
+        self.starts = np.concatenate( [ [0], np.cumsum( counts ) ] ) + np.count_nonzero( self.restaurant < 0 )
+        self.by_restaurant = np.argsort( self.restaurant, kind='stable' )
+
+        self.restaurant_grid = GridIndex( self.restaurants[:, 0], self.restaurants[:, 1], cell_km )
+        self.delivery_grid = GridIndex( df1['Delivery_location_latitude'].values,
+                                        df1['Delivery_location_longitude'].values, cell_km )
+
+
+    def restaurant_orders( self, restaurant ):
+
+        """ Posições (em ordem crescente) dos pedidos de um restaurante. """
+        return self.by_restaurant[self.starts[restaurant]:self.starts[restaurant + 1]]
+
+
+    def orders_within( self, lat, lon, radius_km, by='delivery' ):
+
+        """ Pedidos a até radius_km do ponto (lat, lon).
+
+            Input: ponto, raio e qual coordenada do pedido é medida:
+                   'delivery' (local de entrega) ou 'restaurant'
+            Output: posições dos pedidos, em ordem crescente
+        """
+        if by == 'delivery':
+            return self.delivery_grid.within( lat, lon, radius_km )[0]
+        if by != 'restaurant':
+            raise ValueError( 'by deve ser "delivery" ou "restaurant": {!r}'.format( by ) )
+
+        restaurants = self.restaurant_grid.within( lat, lon, radius_km )[0]
+        positions = [ self.restaurant_orders( restaurant ) for restaurant in restaurants ]
+        return np.sort( np.concatenate( positions ) ) if positions else np.array( [], dtype=np.int64 )
+
+
+    def nearest_restaurants( self, lat, lon, k=5 ):
+
+        """ Os k restaurantes mais próximos do ponto (ex.: um local de entrega).
+
+            Output: Dataframe com restaurant, Restaurant_latitude,
+                    Restaurant_longitude, distance (km) e orders (pedidos do
+                    restaurante), do mais próximo ao mais distante
+        """
+        restaurants, distances = self.restaurant_grid.nearest( lat, lon, k )
+        return pd.DataFrame( { 'restaurant': restaurants,
+                               'Restaurant_latitude': self.restaurants[restaurants, 0],
+                               'Restaurant_longitude': self.restaurants[restaurants, 1],
+                               'distance': distances,
+                               'orders': self.orders[restaurants] } )
+
+
+    def restaurants_of( self, rows ):
+
+        """ IDs (em ordem crescente) dos restaurantes dos pedidos escolhidos.
+
+            Input: slice ou array de posições (ex.: Selection.rows)
+        """
+        codes = self.restaurant[rows]
+        seen = np.bincount( codes[codes >= 0], minlength=len( self.restaurants ) )
+        return np.flatnonzero( seen )
+
+
+
+def load_spatial( path=DATASET_PATH ):
+
+    """ Devolve o SpatialIndex do dataset limpo. Ele é montado uma vez por
+        processo e refeito apenas quando load_data devolver um dataframe novo.
+    """
+    return load_derived( 'spatial', SpatialIndex, path )
+
+
+
+def restaurant_points( df1, path=DATASET_PATH ):
+
+    """ Coordenadas dos restaurantes distintos das linhas filtradas, na
+        ordem (latitude, longitude), como np.unique( ..., axis=0 ).
+
+        Seleções do OrderIndex usam os IDs do índice espacial; outros
+        dataframes são agrupados pelas coordenadas.
+
+        Output: array n x 2 (latitude, longitude)
+    """
+    frame = getattr( df1, 'frame', None )
+    if frame is not None and frame is load_data( path ):
+        spatial = load_spatial( path )
+        return spatial.restaurants[spatial.restaurants_of( df1.rows )]
+
+    return np.unique( df1[['Restaurant_latitude', 'Restaurant_longitude']].values, axis=0 )
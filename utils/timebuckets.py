@@ -0,0 +1,194 @@
+# bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# Agrupamento por período (dia, semana, mês) e redução de pontos
+# ==========================================
+
+# Máximo de pontos de uma série enviada ao navegador (modo automático e
+# redução de pontos)
+MAX_POINTS = 400
+
+# Rótulos do seletor e granularidade correspondente
+GRANULARITIES = { 'Automático': 'auto', 'Dia': 'day', 'Semana': 'week', 'Semana (ISO)': 'iso_week', 'Mês': 'month' }
+
+# Do dia para o maior período, usada pelo modo automático
+ORDER = ['day', 'week', 'month']
+
+# Colunas de tempo do dataframe limpo (clean_code): nome -> (granularidade, tipo)
+TIME_KEYS = { 'order_day': ( 'day', 'int32' ),
+              'order_week': ( 'week', 'int16' ),
+              'order_week_iso': ( 'iso_week', 'int16' ),
+              'order_month': ( 'month', 'int16' ),
+              'order_weekday': ( 'weekday', 'int8' ) }
+
+
+def bucket_keys( dates, granularity ):
+
+    """ Chave inteira do período de cada data.
+
+        - day: dias desde 01/01/1970
+        - week: semanas começando no domingo (como o '%U' do strftime), contadas
+          desde 28/12/1969; 01/01/1970 foi uma quinta-feira
+        - iso_week: semanas começando na segunda-feira (como as semanas ISO),
+          contadas desde 29/12/1969
+        - month: meses desde 01/1970
+        - weekday: dia da semana, 0 = segunda-feira ... 6 = domingo (como o
+          dayofweek do pandas)
+
+        Input: datas e granularidade
+        Output: array de inteiros
+    """
+    if granularity == 'month':
+        return np.asarray( dates, dtype='datetime64[M]' ).astype( np.int64 )
+
+    days = np.asarray( dates, dtype='datetime64[D]' ).astype( np.int64 )
+    if granularity == 'week':
+        return ( days + 4 ) // 7
+    if granularity == 'iso_week':
+        return ( days + 3 ) // 7
+    if granularity == 'weekday':
+        return ( days + 3 ) % 7
+    return days
+
+
+
+def bucket_start( keys, granularity ):
+
+    """ Primeira data de cada período (inverso de bucket_keys). """
+    keys = np.asarray( keys, dtype=np.int64 )
+    if granularity == 'month':
+        return pd.to_datetime( keys.astype( 'datetime64[M]' ) )
+    if granularity == 'week':
+        return pd.to_datetime( ( keys * 7 - 4 ).astype( 'datetime64[D]' ) )
+    if granularity == 'iso_week':
+        return pd.to_datetime( ( keys * 7 - 3 ).astype( 'datetime64[D]' ) )
+    return pd.to_datetime( keys.astype( 'datetime64[D]' ) )
+
+
+
+def time_keys( dates ):
+
+    """ Colunas de TIME_KEYS para as datas (uma chave inteira por linha).
+
+        Calculadas uma vez no carregamento: os gráficos agrupam por essas
+        colunas em vez de formatar cada data (strftime) a cada execução.
+
+        Input: datas (ex.: a coluna Order_Date)
+        Output: dicionário {coluna: array}
+    """
+    return { col: bucket_keys( dates, granularity ).astype( dtype )
+             for col, ( granularity, dtype ) in TIME_KEYS.items() }
+
+
+
+def auto_granularity( dates, max_points=MAX_POINTS ):
+
+    """ Menor período em que o intervalo das datas cabe em max_points pontos. """
+    dates = np.asarray( dates, dtype='datetime64[D]' )
+    if len( dates ) == 0:
+        return ORDER[0]
+
+    first, last = dates.min(), dates.max()
+    for granularity in ORDER:
+        keys = bucket_keys( [first, last], granularity )
+        if keys[1] - keys[0] + 1 <= max_points:
+            return granularity
+
+    return ORDER[-1]
+
+
+
+def cap_granularity( dates, granularity, max_points=MAX_POINTS ):
+
+    """ Limita o número de barras de uma contagem por período: se o período
+        escolhido passa de max_points no intervalo das datas, usa o menor
+        período maior que cabe (auto_granularity). Em contagens as barras não
+        podem ser descartadas (lttb), ou os totais ficariam errados.
+
+        Input: datas, granularidade escolhida ('auto' fica como está) e o
+               número máximo de barras
+        Output: granularidade
+    """
+    dates = np.asarray( dates, dtype='datetime64[D]' )
+    if granularity == 'auto' or len( dates ) == 0:
+        return granularity
+
+    keys = bucket_keys( [dates.min(), dates.max()], granularity )
+    if keys[1] - keys[0] + 1 <= max_points:
+        return granularity
+
+    return auto_granularity( dates, max_points )
+
+
+
+def bucket_sum( dates, values, granularity, max_points=MAX_POINTS ):
+
+    """ Soma dos valores por período.
+
+        Input: datas, valores (ex.: número de pedidos por dia) e granularidade
+               ('auto' escolhe pelo intervalo das datas)
+        Output: Dataframe com a data de início do período (Order_Date) e a
+                soma (value), e a granularidade usada
+    """
+    if granularity == 'auto':
+        granularity = auto_granularity( dates, max_points )
+
+    keys = bucket_keys( dates, granularity )
+    sums = pd.Series( np.asarray( values ) ).groupby( keys ).sum()
+
+    df_aux = pd.DataFrame( { 'Order_Date': bucket_start( sums.index.values, granularity ), 'value': sums.values } )
+
+    return df_aux, granularity
+
+
+
+def lttb( x, y, threshold=MAX_POINTS ):
+
+    """ Redução de pontos que preserva o formato da série (Largest Triangle
+        Three Buckets): mantém o primeiro e o último ponto e, em cada faixa,
+        o ponto que forma o maior triângulo com os vizinhos escolhidos.
+
+        Input: x (numérico ou datas) e y da série, ordenados por x, e o
+               número máximo de pontos
+        Output: posições dos pontos mantidos
+    """
+    n = len( y )
+    if threshold >= n or threshold < 3:
+        return np.arange( n )
+
+    x = np.asarray( x )
+    if np.issubdtype( x.dtype, np.datetime64 ):
+        x = x.astype( 'datetime64[ns]' ).astype( np.int64 )
+    x = x.astype( np.float64 )
+    y = np.asarray( y, dtype=np.float64 )
+
+    # Faixas entre o primeiro e o último ponto
+    edges = np.linspace( 1, n - 1, threshold - 1 ).astype( np.int64 )
+    kept = np.empty( threshold, dtype=np.int64 )
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    a = 0
+    for i in range( threshold - 2 ):
+        start, end = edges[i], edges[i + 1]
+        # Média da faixa seguinte (o último ponto, na última faixa)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len( edges ) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs( ( x[a] - avg_x ) * ( y[start:end] - y[a] ) - ( x[a] - x[start:end] ) * ( avg_y - y[a] ) )
+        a = start + int( np.argmax( area ) )
+        kept[i + 1] = a
+
+    return kept
+
+
+
+def downsample( df, x, y, threshold=MAX_POINTS ):
+
+    """ Aplica o lttb às linhas do dataframe (ordenado por x). """
+    if len( df ) <= threshold:
+        return df
+    return df.iloc[lttb( df[x].values, df[y].values, threshold )]
@@ -0,0 +1,243 @@
+# Libraries
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+# bibliotecas necessárias
+import numpy as np
+
+# ==========================================
+# Tempos por etapa (carregamento, filtros, gráficos)
+# ==========================================
+#
+# Ligado pela variável de ambiente CURRY_TIMING=1 (lida ao iniciar o
+# processo). Desligado, timed devolve a própria função e os blocos "with"
+# não medem nada, então o custo é desprezível.
+
+ENABLED = os.environ.get( 'CURRY_TIMING', '' ) not in ( '', '0' )
+
+# Arquivo com as métricas no formato texto do Prometheus (node exporter
+# textfile collector ou qualquer coletor que leia o arquivo)
+METRICS_PATH = os.environ.get( 'CURRY_METRICS_FILE', r'metrics/timings.prom' )
+# Intervalo mínimo entre duas gravações do arquivo (segundos)
+METRICS_INTERVAL = 5.0
+
+# Amostras guardadas por etapa para os percentis (as mais recentes)
+SAMPLES = 2048
+QUANTILES = ( 0.5, 0.95, 0.99 )
+
+
+class StageTimings:
+
+    """ Tempos de cada etapa, compartilhados entre reruns e sessões do
+        processo: as últimas SAMPLES amostras (para p50/p95/p99) e o total de
+        chamadas e de segundos desde o início.
+    """
+
+    def __init__( self, samples=SAMPLES ):
+        self.samples = samples
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.written = 0.0
+
+
+    def add( self, stage, seconds ):
+        with self.lock:
+            entry = self.stages.get( stage )
+            if entry is None:
+                entry = self.stages[stage] = [deque( maxlen=self.samples ), 0, 0.0]
+            entry[0].append( seconds )
+            entry[1] += 1
+            entry[2] += seconds
+
+
+    def summary( self ):
+
+        """ Percentis por etapa.
+
+            Output: lista de dicionários (stage, count, p50, p95, p99, total),
+                    do maior p95 para o menor; tempos em milissegundos
+        """
+        with self.lock:
+            stages = { stage: ( np.array( entry[0] ), entry[1], entry[2] ) for stage, entry in self.stages.items() }
+
+        rows = []
+        for stage, ( values, count, total ) in stages.items():
+            p50, p95, p99 = np.quantile( values, QUANTILES ) * 1000
+            rows.append( { 'stage': stage, 'count': count, 'p50': p50, 'p95': p95, 'p99': p99, 'total': total } )
+
+        return sorted( rows, key=lambda row: -row['p95'] )
+
+
+    def export( self, path=METRICS_PATH ):
+
+        """ Grava as métricas em path (texto do Prometheus, tipo summary). """
+        lines = [ '# HELP curry_stage_seconds Tempo de cada etapa das páginas',
+                  '# TYPE curry_stage_seconds summary' ]
+        for row in self.summary():
+            label = row['stage'].replace( '\\', '\\\\' ).replace( '"', '\\"' )
+            for quantile, name in zip( QUANTILES, ( 'p50', 'p95', 'p99' ) ):
+                lines.append( 'curry_stage_seconds{{stage="{}",quantile="{}"}} {:.6f}'.format( label, quantile, row[name] / 1000 ) )
+            lines.append( 'curry_stage_seconds_sum{{stage="{}"}} {:.6f}'.format( label, row['total'] ) )
+            lines.append( 'curry_stage_seconds_count{{stage="{}"}} {}'.format( label, row['count'] ) )
+
+        directory = os.path.dirname( path )
+        if directory:
+            os.makedirs( directory, exist_ok=True )
+        tmp = '{}.{}.tmp'.format( path, os.getpid() )
+        with open( tmp, 'w', encoding='utf-8' ) as f:
+            f.write( '\n'.join( lines ) + '\n' )
+        os.replace( tmp, path )
+
+
+    def maybe_export( self, path=METRICS_PATH, interval=METRICS_INTERVAL ):
+        # Grava o arquivo no máximo uma vez a cada interval segundos
+        now = time.monotonic()
+        with self.lock:
+            if now - self.written < interval:
+                return
+            self.written = now
+        try:
+            self.export( path )
+        except OSError:
+            pass
+
+
+
+timings = StageTimings()
+
+
+class _Timer:
+
+    """ Bloco "with" que soma o tempo decorrido à etapa. """
+
+    __slots__ = ( 'stage', 'start' )
+
+    def __init__( self, stage ):
+        self.stage = stage
+
+    def __enter__( self ):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__( self, *exc ):
+        timings.add( self.stage, time.perf_counter() - self.start )
+        return False
+
+
+
+class _NoTimer:
+
+    """ Bloco "with" vazio, usado com a medição desligada. """
+
+    __slots__ = ()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *exc ):
+        return False
+
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timer( stage ):
+
+    """ Bloco "with" que mede uma etapa. Ex.: with timer( 'filtros' ): ... """
+    return _Timer( stage ) if ENABLED else _NO_TIMER
+
+
+
+def timed( stage ):
+
+    """ Decorador que mede cada chamada da função como a etapa `stage`.
+        Com a medição desligada devolve a própria função (sem custo).
+    """
+    def decorator( func ):
+        if not ENABLED:
+            return func
+
+        @functools.wraps( func )
+        def wrapper( *args, **kwargs ):
+            start = time.perf_counter()
+            try:
+                return func( *args, **kwargs )
+            finally:
+                timings.add( stage, time.perf_counter() - start )
+
+        return wrapper
+
+    return decorator
+
+
+
+def _instrument_streamlit():
+    # Mede o envio de gráficos, tabelas e html (serialização do plotly, do
+    # dataframe e do mapa) separado do cálculo de cada função
+    import streamlit as st
+    import streamlit.components.v1 as components
+
+    for module, name, stage in ( ( st, 'plotly_chart', 'st.plotly_chart' ), ( st, 'dataframe', 'st.dataframe' ),
+                                 ( components, 'html', 'components.html' ) ):
+        func = getattr( module, name )
+        if not getattr( func, '_curry_timed', False ):
+            wrapper = timed( stage )( func )
+            wrapper._curry_timed = True
+            setattr( module, name, wrapper )
+
+
+
+class PageRun:
+
+    """ Mede um rerun inteiro de uma página. finish() grava o tempo total,
+        atualiza o arquivo de métricas e mostra o painel na barra lateral.
+    """
+
+    def __init__( self, page ):
+        self.page = page
+        self.start = time.perf_counter()
+
+
+    def finish( self ):
+        timings.add( 'page.' + self.page, time.perf_counter() - self.start )
+        timings.maybe_export()
+        timing_panel()
+
+
+
+class _NoPageRun:
+
+    def finish( self ):
+        pass
+
+
+
+def page_run( page ):
+
+    """ Início da medição de um rerun da página (chamar no topo do script e
+        finish() no final).
+    """
+    if not ENABLED:
+        return _NoPageRun()
+    _instrument_streamlit()
+    return PageRun( page )
+
+
+
+def timing_panel():
+
+    """ Painel de depuração na barra lateral com os percentis de cada etapa. """
+    import pandas as pd
+    import streamlit as st
+
+    rows = timings.summary()
+    if not rows:
+        return
+
+    panel = st.sidebar.expander( 'Tempos por etapa (ms)' )
+    df_aux = pd.DataFrame( rows ).loc[:, ['stage', 'count', 'p50', 'p95', 'p99']].round( 1 )
+    panel.dataframe( df_aux )